@@ -3,6 +3,7 @@ from decouple import config
 from datetime import timedelta
 import os
 import dj_database_url
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -36,14 +37,24 @@ if not DEBUG:
 
 # Configure Database URL
 DATABASE_URL = config('DATABASE_URL', default=None)
+# Optional read replica for safe requests (transactions.routers); for a
+# local try-out point both URLs at SQLite files, e.g. a copy of db.sqlite3
+DATABASE_REPLICA_URL = config('DATABASE_REPLICA_URL', default=None)
+# Seconds a user's reads stay on the primary after they write
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int)
+
+
+def database_config(url):
+    return dj_database_url.parse(
+        url,
+        conn_max_age=600,
+        ssl_require=not url.startswith('sqlite')
+    )
+
 
 if DATABASE_URL:
     DATABASES = {
-        'default': dj_database_url.config(
-            default=DATABASE_URL,
-            conn_max_age=600,
-            ssl_require=True
-        )
+        'default': database_config(DATABASE_URL)
     }
 else:
     DATABASES = {
@@ -53,6 +64,40 @@ else:
         }
     }
 
+if DATABASE_REPLICA_URL:
+    DATABASES['replica'] = database_config(DATABASE_REPLICA_URL)
+    # Tests run against the primary only
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['transactions.routers.ReplicaRouter']
+
+# SQLite production profile: WAL lets readers run while a write commits,
+# synchronous=NORMAL is durable under WAL except on power loss, and the
+# page cache / mmap keep hot pages in memory. Writers take the lock up
+# front (BEGIN IMMEDIATE) and wait up to SQLITE_BUSY_TIMEOUT seconds;
+# write requests still locked out are retried (transactions.retries).
+SQLITE_PRODUCTION = config('SQLITE_PRODUCTION', default=False, cast=bool)
+SQLITE_BUSY_TIMEOUT = config('SQLITE_BUSY_TIMEOUT', default=5, cast=int)
+SQLITE_WRITE_RETRIES = config('SQLITE_WRITE_RETRIES', default=3, cast=int)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,  # KiB, i.e. 64 MB per connection
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+if SQLITE_PRODUCTION and DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    })
+    DATABASES['default'].setdefault('OPTIONS', {}).update({
+        'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': SQLITE_BUSY_TIMEOUT,
+    })
+
 # Application definitio
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -71,6 +116,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'transactions.metrics.MetricsMiddleware',
+    'transactions.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -102,14 +149,6 @@ TEMPLATES = [
 WSGI_APPLICATION = 'budgetTracker.wsgi.application'
 
 
-# Database
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
-
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -146,12 +185,12 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'transactions.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'transactions.pagination.StandardPageNumberPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -160,6 +199,59 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Cache lifetime for per-user aggregates (summary, by_category, dashboard).
+# Entries are keyed by the user's data version, so writes invalidate them.
+AGGREGATE_CACHE_TIMEOUT = config('AGGREGATE_CACHE_TIMEOUT', default=60 * 60 * 24, cast=int)
+
+# Threads (each with its own DB connection) the async dashboard and
+# by-category views use to run their independent queries concurrently
+ASYNC_QUERY_WORKERS = config('ASYNC_QUERY_WORKERS', default=4, cast=int)
+
+# Request metrics (transactions.metrics), served at /api/metrics/ to staff
+# users or with `Authorization: Bearer <METRICS_TOKEN>`. Requests slower
+# than SLOW_REQUEST_THRESHOLD_MS are logged with their slowest SQL (0: off).
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_TOKEN = config('METRICS_TOKEN', default=None)
+SLOW_REQUEST_THRESHOLD_MS = config('SLOW_REQUEST_THRESHOLD_MS', default=0, cast=int)
+
+# Cache backend. The default LocMemCache is private to each worker process:
+# fine for the aggregate caches, whose keys carry the user's data version
+# from the database, but not for the JWT user cache below. Multi-worker
+# deployments that want it need a shared backend, e.g.
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache with
+# CACHE_LOCATION=redis://127.0.0.1:6379 (requires the redis package).
+LOCMEM_CACHE_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+CACHE_BACKEND = config('CACHE_BACKEND', default=LOCMEM_CACHE_BACKEND)
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+
+# Seconds CachedJWTAuthentication keeps a token's user before reading it
+# again (0: read it on every request). Saving a User only clears the entry
+# in the cache it was saved through, so this is off unless CACHE_BACKEND
+# is shared between workers; otherwise other workers would keep serving a
+# deactivated user until the entry expired.
+JWT_USER_CACHE_TIMEOUT = config(
+    'JWT_USER_CACHE_TIMEOUT',
+    default=0 if CACHE_BACKEND == LOCMEM_CACHE_BACKEND else 60,
+    cast=int
+)
+
+# `manage.py archive_transactions` moves transactions dated before the
+# first of the month this many months ago into the archive table
+# (transactions.archive). Raising it later? Run the command with
+# --restore first so rows newer than the new horizon come back.
+ARCHIVE_AFTER_MONTHS = config('ARCHIVE_AFTER_MONTHS', default=24, cast=int)
+
+# Currency of transactions recorded without one and of users who have
+# not picked a base currency. Totals are converted to each user's base
+# currency in SQL, using the monthly rates `manage.py load_exchange_rates`
+# stores (transactions.fx); amounts in this currency need no rates.
+DEFAULT_CURRENCY = config('DEFAULT_CURRENCY', default='USD')
+
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
@@ -182,6 +274,9 @@ CSRF_TRUSTED_ORIGINS = config(
 ).split(',')
 
 CORS_ALLOW_CREDENTIALS = True
+# Conditional GET (transactions.conditional)
+CORS_ALLOW_HEADERS = (*default_headers, 'if-none-match')
+CORS_EXPOSE_HEADERS = ['ETag']
 
 # Manual Redirects
 LOGIN_REDIRECT_URL = '/api/'
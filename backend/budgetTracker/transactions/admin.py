@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Transaction, Budget
+from .models import ArchivedTransaction, Category, Transaction, Budget, MonthlyRollup, ExchangeRate, Profile
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -10,8 +10,8 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
-    list_display = ['date', 'type', 'category', 'amount', 'description', 'user']
-    list_filter = ['type', 'date', 'category']
+    list_display = ['date', 'type', 'category', 'amount', 'currency', 'description', 'user']
+    list_filter = ['type', 'currency', 'date', 'category']
     search_fields = ['description', 'user__username']
     date_hierarchy = 'date'
     ordering = ['-date']
@@ -21,10 +21,25 @@ class TransactionAdmin(admin.ModelAdmin):
             'fields': ('user', 'type', 'category')
         }),
         ('Transaction Details', {
-            'fields': ('amount', 'description', 'date')
+            'fields': ('amount', 'currency', 'description', 'date')
         }),
     )
 
+@admin.register(ArchivedTransaction)
+class ArchivedTransactionAdmin(admin.ModelAdmin):
+    list_display = ['date', 'type', 'category', 'amount', 'currency', 'description', 'user', 'archived_at']
+    list_filter = ['type', 'date']
+    search_fields = ['description', 'user__username']
+    date_hierarchy = 'date'
+    ordering = ['-date']
+    list_select_related = ['user', 'category']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
 @admin.register(Budget)
 class BudgetAdmin(admin.ModelAdmin):
     list_display = ['user', 'month', 'amount', 'get_actual_expenses', 'get_remaining']
@@ -34,6 +49,10 @@ class BudgetAdmin(admin.ModelAdmin):
     ordering = ['-month']
     
     readonly_fields = ['get_actual_expenses', 'get_remaining', 'get_percentage_used']
+    list_select_related = ['user']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_actual_expenses()
     
     def get_actual_expenses(self, obj):
         return f"${obj.get_actual_expenses()}"
@@ -41,4 +60,27 @@ class BudgetAdmin(admin.ModelAdmin):
     
     def get_remaining(self, obj):
         return f"${obj.get_remaining()}"
-    get_remaining.short_description = 'Remaining'
\ No newline at end of file
+    get_remaining.short_description = 'Remaining'
+
+@admin.register(MonthlyRollup)
+class MonthlyRollupAdmin(admin.ModelAdmin):
+    list_display = ['user', 'month', 'type', 'category', 'currency', 'total', 'count']
+    list_filter = ['type', 'currency', 'month']
+    search_fields = ['user__username']
+    date_hierarchy = 'month'
+    ordering = ['-month']
+    list_select_related = ['user', 'category']
+    readonly_fields = ['user', 'month', 'type', 'category', 'currency', 'total', 'count']
+
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ['currency', 'month', 'rate']
+    list_filter = ['currency']
+    date_hierarchy = 'month'
+    ordering = ['currency', '-month']
+
+@admin.register(Profile)
+class ProfileAdmin(admin.ModelAdmin):
+    list_display = ['user', 'base_currency']
+    search_fields = ['user__username']
+    list_select_related = ['user']
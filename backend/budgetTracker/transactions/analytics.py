@@ -0,0 +1,222 @@
+"""
+Income and expense time series, and budget reports
+
+Totals are grouped in the database by truncating the transaction date to
+a day, ISO week, month or year. Month and year series over whole months
+are read from the monthly rollups instead, which stay small however
+long the ledger gets. build_series() turns the grouped rows into a
+dense series (empty periods are zero-filled) and, when asked, one
+sparse series per category.
+
+budget_report() compares a range of monthly budgets with the spending
+recorded in the rollups using one UNION query: expense months with
+their budget, plus budgeted months that have no expenses.
+
+Totals are in the user's base currency, converted in the query
+(transactions.fx).
+"""
+from decimal import Decimal
+
+from django.db import models
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek, TruncYear
+from rest_framework import serializers
+
+from . import fx
+from .models import Budget, MonthlyRollup, Transaction
+from .periods import add_months, count_periods, period_starts, truncate
+
+# Budget amounts are rendered like BudgetSerializer.amount ("100.00")
+BUDGET_AMOUNT = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+TRUNCATE = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'year': TruncYear,
+}
+
+# Longest series one request may ask for (about three years of days)
+MAX_POINTS = 1100
+
+# Longest budget report (ten years of months)
+MAX_REPORT_MONTHS = 120
+
+ZERO = Decimal('0.00')
+
+
+def check_length(start, end, interval):
+    """Raise ValueError when start..end holds more than MAX_POINTS periods"""
+    if count_periods(start, end, interval) > MAX_POINTS:
+        raise ValueError(
+            f'Too many {interval} buckets in this range (at most {MAX_POINTS}); '
+            f'use a shorter range or a longer interval'
+        )
+
+
+def grouped_transactions(queryset, interval, base_currency, split=False):
+    """Per-period (and per-category) totals of a Transaction queryset"""
+    total = fx.converted_sum('amount', 'date', base_currency)
+    return _grouped(queryset, 'date', interval, total, Count('id'), split)
+
+
+def grouped_rollups(queryset, interval, base_currency, split=False):
+    """Per-period (and per-category) totals of a MonthlyRollup queryset"""
+    total = fx.converted_sum('total', 'month', base_currency)
+    return _grouped(queryset, 'month', interval, total, Sum('count'), split)
+
+
+def _grouped(queryset, field, interval, total, count, split):
+    fields = ['period', 'type']
+    if split:
+        fields += ['category_id', 'category__name']
+    # Dates are already days; grouping on the bare column lets the
+    # covering index supply the groups in order
+    period = F(field) if interval == 'day' else TRUNCATE[interval](field)
+    return (
+        queryset
+        .annotate(period=period)
+        .values(*fields)
+        .annotate(total=total, count=count)
+        .order_by('period')
+    )
+
+
+def build_series(rows, interval, start=None, end=None, split=False):
+    """
+    {'interval', 'start', 'end', 'series', 'categories'?} from grouped rows
+    `start`/`end` bound the zero-filled range; without them it spans the
+    first to the last period that has transactions. Rows may repeat a
+    period (live and archived halves of a UNION ALL); they are summed
+    """
+    totals = {}
+    categories = {}
+    for row in rows:
+        period = row['period']
+        bucket = totals.setdefault(period, {'income': ZERO, 'expenses': ZERO, 'count': 0})
+        key = 'income' if row['type'] == Transaction.INCOME else 'expenses'
+        bucket[key] += row['total'] or ZERO
+        bucket['count'] += row['count'] or 0
+
+        if split:
+            category = categories.setdefault((row['category_id'], row['type']), {
+                'category': row['category_id'],
+                'category_name': row['category__name'],
+                'type': row['type'],
+                'total': ZERO,
+                'points': {},
+            })
+            category['total'] += row['total'] or ZERO
+            point = category['points'].setdefault(period, {'period': period, 'total': ZERO, 'count': 0})
+            point['total'] += row['total'] or ZERO
+            point['count'] += row['count'] or 0
+
+    if totals:
+        start = start or min(totals)
+        end = end or max(totals)
+
+    series = []
+    if start is not None and end is not None:
+        check_length(start, end, interval)
+        for period in period_starts(start, end, interval):
+            bucket = totals.get(period, {'income': ZERO, 'expenses': ZERO, 'count': 0})
+            series.append({
+                'period': period,
+                'income': bucket['income'],
+                'expenses': bucket['expenses'],
+                'net': bucket['income'] - bucket['expenses'],
+                'count': bucket['count'],
+            })
+
+    data = {
+        'interval': interval,
+        'start': truncate(start, interval) if start else None,
+        'end': end,
+        'series': series,
+    }
+    if split:
+        for category in categories.values():
+            category['points'] = [category['points'][period] for period in sorted(category['points'])]
+        data['categories'] = sorted(
+            categories.values(),
+            key=lambda category: (category['type'], -category['total'])
+        )
+    return data
+
+
+def budget_report(user, start, end, base_currency):
+    """
+    Budget against actual expenses for every month from `start` through
+    `end` (both first days of months), with totals over the range;
+    `base_currency` as for fx.as_base()
+    """
+    if end < start:
+        raise ValueError('end must not be before start')
+    if count_periods(start, end, 'month') > MAX_REPORT_MONTHS:
+        raise ValueError(f'A budget report covers at most {MAX_REPORT_MONTHS} months')
+
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    months = {'month__gte': start, 'month__lt': add_months(end, 1)}
+    expenses = MonthlyRollup.objects.filter(user=user, type=Transaction.EXPENSE, **months)
+    budgets = Budget.objects.filter(user=user, **months)
+
+    spent = (
+        expenses
+        .values('month')
+        .annotate(
+            actual=fx.converted_sum('total', 'month', base_currency),
+            budget=Subquery(
+                budgets.filter(month=OuterRef('month')).order_by().values('amount')[:1],
+                output_field=amount
+            )
+        )
+        .order_by()
+    )
+    unspent = (
+        budgets
+        .exclude(month__in=expenses.order_by().values('month'))
+        .values('month')
+        .annotate(actual=Value(ZERO, output_field=amount), budget=F('amount'))
+        .order_by()
+    )
+    rows = {row['month']: row for row in spent.union(unspent, all=True)}
+
+    report = []
+    totals = {'budget': ZERO, 'actual_expenses': ZERO, 'remaining': ZERO, 'months_over': 0, 'months_under': 0}
+    for month in period_starts(start, end, 'month'):
+        row = rows.get(month, {})
+        budget = row.get('budget')
+        actual = row.get('actual') or ZERO
+        entry = {
+            'month': month,
+            'amount': BUDGET_AMOUNT.to_representation(budget) if budget is not None else None,
+            'actual_expenses': float(actual),
+            'remaining': None,
+            'percentage_used': None,
+            'over_budget': None,
+        }
+        if budget is not None:
+            entry.update(
+                remaining=float(budget - actual),
+                percentage_used=round(float(actual / budget * 100), 2) if budget > 0 else 0.0,
+                over_budget=actual > budget,
+            )
+            totals['budget'] += budget
+            totals['remaining'] += budget - actual
+            totals['months_over' if actual > budget else 'months_under'] += 1
+        totals['actual_expenses'] += actual
+        report.append(entry)
+
+    return {
+        'start': start,
+        'end': end,
+        'months': report,
+        'totals': {
+            'amount': BUDGET_AMOUNT.to_representation(totals['budget']),
+            'actual_expenses': float(totals['actual_expenses']),
+            # Over the budgeted months only
+            'remaining': float(totals['remaining']),
+            'months_over': totals['months_over'],
+            'months_under': totals['months_under'],
+        },
+    }
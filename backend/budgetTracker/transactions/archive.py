@@ -0,0 +1,130 @@
+"""
+Cold storage for old transactions
+
+archive_user() moves a user's transactions dated before the archive
+horizon (the first day of the month ARCHIVE_AFTER_MONTHS ago) from the
+Transaction table into ArchivedTransaction, one bounded batch per
+database transaction so concurrent writers never wait long. The move
+bypasses model signals on purpose: archived rows stay counted in
+MonthlyRollup, so every rollup-backed total (summary, by category,
+dashboard, budgets) is unchanged, and rollups.rebuild() reads both
+tables.
+
+Aggregates that need row-level data (exact dates or amounts) combine
+the two tables with a UNION ALL. A range starting on or after the
+horizon cannot contain archived rows and reads the Transaction table
+alone.
+"""
+import time
+from datetime import date
+
+from django.conf import settings
+from django.db import connections, router
+from django.utils import timezone
+
+from .caching import bump_data_version
+from .models import ArchivedTransaction, Transaction
+from .periods import add_months
+from .retries import run_write
+
+# Columns the two tables share
+FIELDS = (
+    'id', 'user_id', 'category_id', 'type', 'amount', 'currency',
+    'description', 'date', 'created_at', 'updated_at'
+)
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def horizon(today=None):
+    """First day of the oldest month kept in the Transaction table"""
+    today = today or date.today()
+    return add_months(today.replace(day=1), -settings.ARCHIVE_AFTER_MONTHS)
+
+
+def reaches_archive(start):
+    """True unless a range starting at `start` lies entirely after the horizon"""
+    return start is None or start < horizon()
+
+
+def combine(hot, archived):
+    """
+    UNION ALL of two grouped querysets over the same columns, or `hot`
+    alone when `archived` is None. Orderings are dropped: a compound
+    query cannot have them, and a model's default ordering would split
+    the groups
+    """
+    if archived is None:
+        return hot.order_by()
+    return hot.order_by().union(archived.order_by(), all=True)
+
+
+def merge_totals(rows, key):
+    """
+    Sum the 'total' of rows sharing `key`, as the two halves of a UNION
+    ALL return them, largest total first
+    """
+    merged = {}
+    for row in rows:
+        item = merged.get(row[key])
+        if item is None:
+            merged[row[key]] = {key: row[key], 'total': row['total']}
+        else:
+            item['total'] += row['total']
+    return sorted(merged.values(), key=lambda item: -item['total'])
+
+
+def archive_user(user, before=None, batch_size=DEFAULT_BATCH_SIZE, pause=0):
+    """
+    Move the user's transactions dated before `before` (default: the
+    horizon) into the archive; returns how many were moved
+    """
+    queryset = Transaction.objects.filter(user=user, date__lt=before or horizon())
+    return _drain(queryset, ArchivedTransaction, batch_size, pause)
+
+
+def restore_user(user, since=None, batch_size=DEFAULT_BATCH_SIZE, pause=0):
+    """
+    Move the user's archived transactions dated on or after `since`
+    (default: the horizon) back; returns how many were moved
+    """
+    queryset = ArchivedTransaction.objects.filter(user=user, date__gte=since or horizon())
+    return _drain(queryset, Transaction, batch_size, pause)
+
+
+def _drain(queryset, target, batch_size, pause):
+    moved = 0
+    while True:
+        count = run_write(_move_batch, queryset, target, batch_size)
+        if not count:
+            return moved
+        moved += count
+        if pause:
+            time.sleep(pause)
+
+
+def _move_batch(queryset, target, batch_size):
+    rows = list(
+        queryset
+        .select_for_update()
+        .order_by('date', 'id')
+        .values(*FIELDS)[:batch_size]
+    )
+    if not rows:
+        return 0
+
+    extra = {'archived_at': timezone.now()} if target is ArchivedTransaction else {}
+    objs = [target(**row, **extra) for row in rows]
+    # A raw insert keeps created_at / updated_at as they were instead
+    # of letting auto_now(_add) stamp them with the time of the move
+    fields = target._meta.concrete_fields
+    db = router.db_for_write(target)
+    step = connections[db].ops.bulk_batch_size(fields, objs) or len(objs)
+    for index in range(0, len(objs), step):
+        target._base_manager._insert(objs[index:index + step], fields=fields, raw=True, using=db)
+
+    # Signals are skipped deliberately: the rows stay in the rollups
+    moved = queryset.model.objects.filter(pk__in=[row['id'] for row in rows])
+    moved._raw_delete(moved.db)
+    bump_data_version(rows[0]['user_id'])
+    return len(rows)
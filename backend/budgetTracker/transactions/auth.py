@@ -6,7 +6,7 @@ from rest_framework.permissions import AllowAny
 from django.contrib.auth.models import User
 from django.db import transaction as db_transaction
 from .serializers import UserSerializer
-from .models import Category
+from .category_templates import DEFAULT_TEMPLATE, get_template, seed_categories
 from rest_framework_simplejwt.tokens import RefreshToken
 
 logger = logging.getLogger(__name__)
@@ -30,6 +30,15 @@ def register_user(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        category_template = request.data.get('category_template') or DEFAULT_TEMPLATE
+        try:
+            get_template(category_template)
+        except ValueError:
+            return Response(
+                {'category_template': f"Unknown category template '{category_template}'."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
         serializer = UserSerializer(data=request.data)
         
         if not serializer.is_valid():
@@ -50,30 +59,7 @@ def register_user(request):
             
             logger.info(f"User created successfully: {user.username}")
             
-            default_categories = [
-                {'name': 'Salary', 'type': 'INCOME'},
-                {'name': 'Freelance', 'type': 'INCOME'},
-                {'name': 'Investment', 'type': 'INCOME'},
-                {'name': 'Other Income', 'type': 'INCOME'},
-                {'name': 'Groceries', 'type': 'EXPENSE'},
-                {'name': 'Rent', 'type': 'EXPENSE'},
-                {'name': 'Utilities', 'type': 'EXPENSE'},
-                {'name': 'Transportation', 'type': 'EXPENSE'},
-                {'name': 'Entertainment', 'type': 'EXPENSE'},
-                {'name': 'Healthcare', 'type': 'EXPENSE'},
-                {'name': 'Shopping', 'type': 'EXPENSE'},
-                {'name': 'Other Expense', 'type': 'EXPENSE'},
-            ]
-            
-            for cat_data in default_categories:
-                try:
-                    Category.objects.get_or_create(
-                        user=user,
-                        name=cat_data['name'],
-                        defaults={'type': cat_data['type']}
-                    )
-                except Exception as e:
-                    logger.error(f"Error creating category {cat_data['name']}: {str(e)}")
+            seed_categories(user, category_template, new_user=True)
             
             logger.info(f"Default categories created for user: {user.username}")
             
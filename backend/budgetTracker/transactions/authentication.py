@@ -0,0 +1,60 @@
+"""
+JWT authentication with a short-lived per-user cache
+
+simplejwt's JWTAuthentication loads the User row on every request.
+CachedJWTAuthentication keeps the user in the cache for
+JWT_USER_CACHE_TIMEOUT seconds; saving or deleting a User drops the
+entry (see signals), so with a cache shared by all workers deactivation
+and password changes take effect on the next request. A per-process
+cache only drops it in the process that saved the user, which is why
+the timeout defaults to 0 (no caching) there. Bulk QuerySet.update() on
+users bypasses the signals and is only picked up once the entry expires.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+def user_cache_key(user_id):
+    return f'jwt_user:{user_id}'
+
+
+def forget_user(user_id):
+    """Drop a cached user so the next request reads it again"""
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+
+    def get_user(self, validated_token):
+        if not settings.JWT_USER_CACHE_TIMEOUT:
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            cache.set(key, user, settings.JWT_USER_CACHE_TIMEOUT)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
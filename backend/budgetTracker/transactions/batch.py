@@ -0,0 +1,224 @@
+"""
+Batched create / update / delete of transactions
+
+TransactionBatch validates every operation with TransactionSerializer
+against one prefetch of the user's categories and one fetch of the
+transactions being changed, then writes them with bulk_create,
+bulk_update and a single DELETE inside one database transaction. A
+batch is all or nothing: when any operation is invalid nothing is
+written and the per-item results carry the errors.
+"""
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from .models import Category, Transaction
+from .serializers import TransactionSerializer
+from . import fx, rollups
+from .caching import bump_data_version
+
+OPERATIONS = ('create', 'update', 'delete')
+
+MAX_OPERATIONS = 1000
+
+
+class BatchError(ValueError):
+    """The request body is not a usable list of operations"""
+
+
+class BatchResult:
+
+    def __init__(self):
+        self.applied = False
+        self.counts = {operation: 0 for operation in OPERATIONS}
+        self.results = []
+
+    @property
+    def error_count(self):
+        return sum(1 for item in self.results if item['status'] == 'invalid')
+
+    def as_dict(self):
+        return {
+            'applied': self.applied,
+            'created': self.counts['create'],
+            'updated': self.counts['update'],
+            'deleted': self.counts['delete'],
+            'error_count': self.error_count,
+            'results': self.results,
+        }
+
+
+class TransactionBatch:
+    """
+    Apply a list of operations for one user
+
+    Operations look like {"op": "create", "data": {...}},
+    {"op": "update", "id": 1, "data": {...}} (a partial update) or
+    {"op": "delete", "id": 2}.
+    """
+
+    def __init__(self, user, context, batch_size=500, max_operations=MAX_OPERATIONS):
+        self.user = user
+        self.context = context
+        self.batch_size = batch_size
+        self.max_operations = max_operations
+
+    def run(self, operations):
+        if not isinstance(operations, list) or not operations:
+            raise BatchError('operations must be a non-empty list')
+        if len(operations) > self.max_operations:
+            raise BatchError(f'A batch holds at most {self.max_operations} operations')
+
+        categories = Category.objects.filter(user=self.user).order_by().in_bulk()
+        context = {**self.context, 'categories': categories}
+        existing = (
+            Transaction.objects
+            .filter(user=self.user, pk__in=self.target_ids(operations))
+            .select_related('category')
+            .order_by()
+            .in_bulk()
+        )
+
+        result = BatchResult()
+        planned = []
+        seen = set()
+        for index, operation in enumerate(operations):
+            op, target, errors = self.validate(operation, context, existing, seen)
+            item = {'index': index, 'op': op}
+            if errors:
+                item.update(status='invalid', errors=errors)
+            else:
+                item['status'] = 'valid'
+                planned.append((item, op, target))
+            result.results.append(item)
+
+        if result.error_count:
+            return result
+
+        with db_transaction.atomic():
+            self.apply(planned, result)
+        result.applied = True
+        return result
+
+    def target_ids(self, operations):
+        ids = set()
+        for operation in operations:
+            if isinstance(operation, dict) and operation.get('op') in ('update', 'delete'):
+                pk = parse_id(operation.get('id'))
+                if pk is not None:
+                    ids.add(pk)
+        return ids
+
+    def validate(self, operation, context, existing, seen):
+        """Return (op, target, errors); target is validated data or an instance"""
+        if not isinstance(operation, dict):
+            return None, None, {'non_field_errors': ['Expected an object.']}
+
+        op = operation.get('op')
+        if op not in OPERATIONS:
+            return op, None, {'op': [f"Unknown operation '{op}'."]}
+
+        if op == 'create':
+            serializer = TransactionSerializer(data=operation.get('data'), context=context)
+            if not serializer.is_valid():
+                return op, None, serializer.errors
+            return op, serializer.validated_data, None
+
+        pk = parse_id(operation.get('id'))
+        instance = existing.get(pk)
+        if instance is None:
+            return op, None, {'id': ['Not found.']}
+        if pk in seen:
+            return op, None, {'id': ['Transaction appears in more than one operation.']}
+        seen.add(pk)
+
+        if op == 'delete':
+            return op, instance, None
+
+        serializer = TransactionSerializer(
+            instance, data=operation.get('data'), partial=True, context=context
+        )
+        if not serializer.is_valid():
+            return op, None, serializer.errors
+        return op, (instance, serializer.validated_data), None
+
+    def apply(self, planned, result):
+        deltas = rollups.BucketDeltas()
+        created, updated, deleted = [], [], []
+        update_fields = {'updated_at'}
+        now = timezone.now()
+
+        currency = None
+        for item, op, target in planned:
+            if op == 'create':
+                if 'currency' not in target:
+                    currency = currency or fx.base_currency_of(self.user)
+                    target = {**target, 'currency': currency}
+                instance = Transaction(user=self.user, **target)
+                created.append((item, instance))
+            elif op == 'update':
+                instance, validated_data = target
+                deltas.add(rollup_values(instance), sign=-1)
+                for field, value in validated_data.items():
+                    setattr(instance, field, value)
+                instance.updated_at = now
+                update_fields.update(validated_data)
+                deltas.add(rollup_values(instance))
+                updated.append((item, instance))
+            else:
+                deltas.add(rollup_values(target), sign=-1)
+                deleted.append((item, target))
+
+        if created:
+            Transaction.objects.bulk_create(
+                [instance for _, instance in created], batch_size=self.batch_size
+            )
+            for _, instance in created:
+                deltas.add(rollup_values(instance))
+        if updated:
+            Transaction.objects.bulk_update(
+                [instance for _, instance in updated],
+                sorted(update_fields),
+                batch_size=self.batch_size
+            )
+        if deleted:
+            # A raw DELETE skips the per-row delete signals; the rollup
+            # deltas and the version bump below do their work once
+            queryset = Transaction.objects.filter(pk__in=[instance.pk for _, instance in deleted])
+            queryset._raw_delete(queryset.db)
+
+        deltas.apply()
+        bump_data_version(self.user.id)
+
+        for status, items in (('created', created), ('updated', updated)):
+            for item, instance in items:
+                item.update(
+                    status=status,
+                    id=instance.pk,
+                    data=TransactionSerializer(instance, context=self.context).data
+                )
+        for item, instance in deleted:
+            item.update(status='deleted', id=instance.pk)
+
+        result.counts['create'] = len(created)
+        result.counts['update'] = len(updated)
+        result.counts['delete'] = len(deleted)
+
+
+def parse_id(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def rollup_values(instance):
+    return {
+        'user_id': instance.user_id,
+        'date': instance.date,
+        'type': instance.type,
+        'category_id': instance.category_id,
+        'currency': instance.currency,
+        'amount': instance.amount,
+    }
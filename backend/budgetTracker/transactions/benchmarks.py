@@ -0,0 +1,217 @@
+"""
+Endpoint catalogue and query budgets for transactions/urls.py
+
+Every endpoint has a maximum number of database queries per request,
+independent of the ledger size. QueryBudgetTests enforces the budgets
+on a small ledger in the normal test run; `manage.py benchmark_endpoints`
+enforces them and records latency on ledgers of several sizes.
+
+Budgets count queries on every connection, including the pool threads
+the async views query from, and assume a cold aggregate cache. Write
+endpoints run in one transaction (transactions.retries), so their
+budgets include its BEGIN and the savepoints of nested atomic blocks.
+Detail writes act on the ledger's first object, except deletes, which
+remove a fresh object created for each request.
+"""
+import threading
+import uuid
+from collections import namedtuple
+from datetime import date
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import override_settings
+from django.urls import reverse
+
+from .models import Budget, Category, Transaction
+
+Endpoint = namedtuple('Endpoint', 'name method url_name detail params max_queries')
+
+DETAIL_MODELS = {
+    'category': Category,
+    'transaction': Transaction,
+    'budget': Budget,
+}
+
+ENDPOINTS = [
+    Endpoint('category list', 'get', 'category-list', None, {}, 3),
+    Endpoint('category detail', 'get', 'category-detail', 'category', {}, 2),
+    Endpoint('category create', 'post', 'category-list', None, {'name': 'Benchmark', 'type': 'EXPENSE'}, 7),
+    Endpoint('category update', 'patch', 'category-detail', 'category', {'name': 'Benchmark renamed'}, 4),
+    Endpoint('category delete', 'delete', 'category-detail', 'category', {}, 12),
+    Endpoint('category defaults', 'post', 'category-create-defaults', None, {}, 7),
+    Endpoint('category defaults (template)', 'post', 'category-create-defaults', None, {'template': 'student'}, 7),
+    Endpoint('category templates', 'get', 'category-templates', None, {}, 1),
+    Endpoint('transaction list', 'get', 'transaction-list', None, {}, 3),
+    Endpoint('transaction list (cursor)', 'get', 'transaction-list', None, {'pagination': 'cursor'}, 2),
+    Endpoint('transaction list (search)', 'get', 'transaction-list', None, {'search': 'coffee'}, 3),
+    Endpoint('transaction list (expand)', 'get', 'transaction-list', None, {'expand': 'category'}, 4),
+    Endpoint('transaction list (month)', 'get', 'transaction-list', None, {'month': 1, 'year': date.today().year}, 3),
+    Endpoint('transaction detail', 'get', 'transaction-detail', 'transaction', {}, 2),
+    Endpoint('transaction create', 'post', 'transaction-list', None, 'transaction', 9),
+    Endpoint('transaction update', 'put', 'transaction-detail', 'transaction', 'transaction', 9),
+    Endpoint('transaction partial update', 'patch', 'transaction-detail', 'transaction', {'amount': '15.00'}, 6),
+    Endpoint('transaction delete', 'delete', 'transaction-detail', 'transaction', {}, 6),
+    Endpoint('transaction summary', 'get', 'transaction-summary', None, {}, 2),
+    Endpoint('transaction summary (rows)', 'get', 'transaction-summary', None, {'amount_min': '1'}, 2),
+    Endpoint('transaction by_category', 'get', 'transaction-by-category', None, {}, 3),
+    Endpoint('transaction by_category async', 'get', 'transaction-by-category-async', None, {}, 3),
+    Endpoint('transaction timeseries', 'get', 'transaction-timeseries', None, {'split': 'category'}, 2),
+    Endpoint('transaction timeseries (day)', 'get', 'transaction-timeseries', None, {'interval': 'day'}, 2),
+    Endpoint('transaction export', 'get', 'transaction-export', None, {}, 2),
+    Endpoint('transaction import', 'post', 'transaction-import', None, 'import', 11),
+    Endpoint('transaction batch', 'post', 'transaction-batch', None, 'batch', 8),
+    Endpoint('budget list', 'get', 'budget-list', None, {}, 3),
+    Endpoint('budget detail', 'get', 'budget-detail', 'budget', {}, 2),
+    Endpoint('budget update', 'patch', 'budget-detail', 'budget', {'amount': '1500.00'}, 4),
+    Endpoint('budget delete', 'delete', 'budget-detail', 'budget', {}, 4),
+    Endpoint('budget current', 'get', 'budget-current', None, {}, 2),
+    Endpoint('budget report', 'get', 'budget-report', None, {}, 2),
+    Endpoint('budget set_current', 'post', 'budget-set-current', None, {'amount': '2500.00'}, 7),
+    Endpoint('dashboard', 'get', 'dashboard', None, {}, 3),
+    Endpoint('dashboard async', 'get', 'dashboard-async', None, {}, 3),
+    Endpoint('user profile', 'get', 'user-profile', None, {}, 1),
+    Endpoint('user currency', 'get', 'user-currency', None, {}, 2),
+    Endpoint('user currency update', 'put', 'user-currency', None, {'base_currency': 'USD'}, 6),
+    Endpoint('metrics', 'get', 'metrics', None, 'scrape', 0),
+]
+
+IMPORT_ROWS = 50
+BATCH_OPERATIONS = 50
+SCRAPE_TOKEN = 'benchmark-scrape-token'
+
+
+def request_data(endpoint, user):
+    """The query params or body for an endpoint"""
+    if endpoint.params == 'transaction':
+        category = Category.objects.filter(user=user, type=Transaction.EXPENSE).first()
+        return {
+            'type': Transaction.EXPENSE,
+            'amount': '12.34',
+            'date': '2024-01-15',
+            'description': 'Benchmark purchase',
+            'category': category.pk,
+        }
+    if endpoint.params == 'batch':
+        category = Category.objects.filter(user=user, type=Transaction.EXPENSE).first()
+        return {'operations': [
+            {'op': 'create', 'data': {
+                'type': Transaction.EXPENSE,
+                'amount': f'{index + 1}.25',
+                'date': '2024-01-15',
+                'description': f'Benchmark batch {index}',
+                'category': category.pk,
+            }}
+            for index in range(BATCH_OPERATIONS)
+        ]}
+    if endpoint.params == 'import':
+        rows = ''.join(
+            f'2024-01-{day % 28 + 1:02d},-{day}.50,Benchmark import {day},Groceries\n'
+            for day in range(IMPORT_ROWS)
+        )
+        upload = SimpleUploadedFile(
+            'statement.csv', f'date,amount,description,category\n{rows}'.encode(), 'text/csv'
+        )
+        return {'file': upload}
+    if endpoint.params == 'scrape':
+        return {}
+    return endpoint.params
+
+
+def endpoint_url(endpoint, user):
+    """The URL for one request; deletes get a fresh object each time"""
+    if endpoint.detail is None:
+        return reverse(endpoint.url_name)
+    if endpoint.method == 'delete':
+        pk = create_disposable(endpoint.detail, user).pk
+    else:
+        model = DETAIL_MODELS[endpoint.detail]
+        pk = model.objects.filter(user=user).values_list('pk', flat=True).first()
+    return reverse(endpoint.url_name, args=[pk])
+
+
+def create_disposable(detail, user):
+    """
+    An object for a delete endpoint to remove; the category holds a
+    transaction so its delete moves rollups like a real one
+    """
+    if detail == 'budget':
+        budget, _ = Budget.objects.get_or_create(
+            user=user, month=date(2000, 1, 1), defaults={'amount': '100.00'}
+        )
+        return budget
+    category = None
+    if detail == 'category':
+        category = Category.objects.create(
+            user=user, name=f'Disposable {uuid.uuid4().hex[:8]}', type=Transaction.EXPENSE
+        )
+    transaction = Transaction.objects.create(
+        user=user,
+        type=Transaction.EXPENSE,
+        amount='9.99',
+        date=date(2024, 1, 15),
+        description='Benchmark disposable',
+        category=category,
+    )
+    return category or transaction
+
+
+def call(client, endpoint, url, data):
+    """Issue the request and consume streaming bodies"""
+    if endpoint.params == 'scrape':
+        # Scrapers send METRICS_TOKEN instead of acting as the ledger's user
+        with override_settings(METRICS_TOKEN=SCRAPE_TOKEN):
+            response = type(client)().get(url, HTTP_AUTHORIZATION=f'Bearer {SCRAPE_TOKEN}')
+    elif endpoint.method == 'get':
+        response = client.get(url, data)
+    elif endpoint.params == 'import':
+        response = client.post(url, data, format='multipart')
+    else:
+        response = getattr(client, endpoint.method)(url, data, format='json')
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+_active_counters = []
+_counters_lock = threading.Lock()
+
+
+def _count_query(execute, sql, params, many, context):
+    if _active_counters:
+        with _counters_lock:
+            for counter in _active_counters:
+                counter.count += 1
+    return execute(sql, params, many, context)
+
+
+def _instrument(sender=None, connection=None, **kwargs):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+class QueryCounter:
+    """
+    Counts queries on every database connection while active, including
+    connections of other threads (the async views' query pool)
+
+    Connections are instrumented when they open, so a pool thread's
+    connection is only seen if it opened after the first QueryCounter
+    was entered; with CONN_MAX_AGE = 0 every query opens a new one.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __enter__(self):
+        connection_created.connect(_instrument, dispatch_uid='transactions.benchmarks')
+        for connection in connections.all(initialized_only=True):
+            _instrument(connection=connection)
+        with _counters_lock:
+            _active_counters.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        with _counters_lock:
+            _active_counters.remove(self)
@@ -0,0 +1,127 @@
+"""
+Versioned caching for per-user aggregate responses
+
+Every write to a user's categories, transactions or budgets bumps their
+DataVersion. Cache keys embed that version together with the normalized
+request filters, so entries can live for a long time and still never be
+served once the underlying data has changed.
+"""
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import DataVersion, Profile
+from .metrics import record_cache
+
+
+def get_data_state(user_id):
+    """
+    Return (version, updated_at, base currency) for a user
+    (0, None, DEFAULT_CURRENCY) before their first write; setting a
+    base currency is a write, so it rides along with the version
+    """
+    profile = Profile.objects.filter(user_id=OuterRef('user_id')).values('base_currency')
+    state = (
+        DataVersion.objects.filter(user_id=user_id)
+        .annotate(base_currency=Subquery(profile[:1]))
+        .values_list('version', 'updated_at', 'base_currency')
+        .first()
+    )
+    if state is None:
+        return 0, None, settings.DEFAULT_CURRENCY
+    version, updated_at, base_currency = state
+    return version, updated_at, base_currency or settings.DEFAULT_CURRENCY
+
+
+def get_data_version(user_id):
+    """Return the current data version for a user (0 before any write)"""
+    return get_data_state(user_id)[0]
+
+
+def bump_data_version(user_id):
+    """Invalidate every cached aggregate for a user"""
+    updated = DataVersion.objects.filter(user_id=user_id).update(
+        version=F('version') + 1,
+        updated_at=timezone.now()
+    )
+    if updated:
+        return
+
+    try:
+        with db_transaction.atomic():
+            DataVersion.objects.create(user_id=user_id)
+    except IntegrityError:
+        DataVersion.objects.filter(user_id=user_id).update(
+            version=F('version') + 1,
+            updated_at=timezone.now()
+        )
+
+
+def bump_all_data_versions():
+    """Invalidate every user's cached aggregates (e.g. new exchange rates)"""
+    DataVersion.objects.update(
+        version=F('version') + 1,
+        updated_at=timezone.now()
+    )
+
+
+def normalize_params(params, allowed):
+    """Keep only the allowed, non-empty params in a stable order"""
+    normalized = []
+    for name in sorted(allowed):
+        value = params.get(name)
+        if value is None:
+            continue
+        value = str(value).strip()
+        if value:
+            normalized.append((name, value))
+    return normalized
+
+
+def build_cache_key(prefix, user_id, version, params=()):
+    digest = hashlib.md5(urlencode(list(params)).encode()).hexdigest()
+    return f'{prefix}:{user_id}:v{version}:{digest}'
+
+
+def get_or_set(prefix, user_id, params, compute, timeout=None, version=None):
+    """
+    Return the cached value for (user, data version, params) or compute
+    and store it
+    Pass `version` when the caller has already read it for this request
+    """
+    if timeout is None:
+        timeout = settings.AGGREGATE_CACHE_TIMEOUT
+
+    if version is None:
+        version = get_data_version(user_id)
+    key = build_cache_key(prefix, user_id, version, params)
+
+    data = cache.get(key)
+    record_cache(prefix, data is not None)
+    if data is None:
+        data = compute()
+        cache.set(key, data, timeout)
+    return data
+
+
+async def aget_or_set(prefix, user_id, params, compute, version, timeout=None):
+    """
+    get_or_set() for async views: `compute` is a coroutine function and
+    `version` must already have been read for the request
+    """
+    if timeout is None:
+        timeout = settings.AGGREGATE_CACHE_TIMEOUT
+
+    key = build_cache_key(prefix, user_id, version, params)
+
+    data = await cache.aget(key)
+    record_cache(prefix, data is not None)
+    if data is None:
+        data = await compute()
+        await cache.aset(key, data, timeout)
+    return data
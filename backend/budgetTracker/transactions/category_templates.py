@@ -0,0 +1,162 @@
+"""
+Starter category sets
+
+A template is a named list of (name, type) pairs that seeds a new
+user's categories at registration or through
+POST /api/categories/create_defaults/. seed_categories() inserts the
+missing ones with a single bulk_create that ignores conflicts on the
+(user, name, type) unique constraint, so concurrent or repeated seeding
+is safe and costs the same few queries whatever the template size.
+"""
+from django.db import transaction as db_transaction
+
+from .models import Category
+from .caching import bump_data_version
+
+INCOME = Category.INCOME
+EXPENSE = Category.EXPENSE
+
+DEFAULT_TEMPLATE = 'default'
+
+TEMPLATES = {
+    'default': {
+        'label': 'Everyday budget',
+        'categories': [
+            ('Salary', INCOME),
+            ('Freelance', INCOME),
+            ('Investment', INCOME),
+            ('Other Income', INCOME),
+            ('Groceries', EXPENSE),
+            ('Rent', EXPENSE),
+            ('Utilities', EXPENSE),
+            ('Transportation', EXPENSE),
+            ('Entertainment', EXPENSE),
+            ('Healthcare', EXPENSE),
+            ('Shopping', EXPENSE),
+            ('Other Expense', EXPENSE),
+        ],
+    },
+    'student': {
+        'label': 'Student',
+        'categories': [
+            ('Allowance', INCOME),
+            ('Part-time Job', INCOME),
+            ('Scholarship', INCOME),
+            ('Other Income', INCOME),
+            ('Tuition', EXPENSE),
+            ('Books & Supplies', EXPENSE),
+            ('Rent', EXPENSE),
+            ('Groceries', EXPENSE),
+            ('Dining Out', EXPENSE),
+            ('Transportation', EXPENSE),
+            ('Phone & Internet', EXPENSE),
+            ('Entertainment', EXPENSE),
+            ('Other Expense', EXPENSE),
+        ],
+    },
+    'freelancer': {
+        'label': 'Freelancer',
+        'categories': [
+            ('Client Payments', INCOME),
+            ('Royalties', INCOME),
+            ('Investment', INCOME),
+            ('Other Income', INCOME),
+            ('Software & Tools', EXPENSE),
+            ('Equipment', EXPENSE),
+            ('Coworking', EXPENSE),
+            ('Taxes', EXPENSE),
+            ('Insurance', EXPENSE),
+            ('Rent', EXPENSE),
+            ('Groceries', EXPENSE),
+            ('Utilities', EXPENSE),
+            ('Other Expense', EXPENSE),
+        ],
+    },
+    'family': {
+        'label': 'Family household',
+        'categories': [
+            ('Salary', INCOME),
+            ('Child Benefit', INCOME),
+            ('Other Income', INCOME),
+            ('Mortgage', EXPENSE),
+            ('Groceries', EXPENSE),
+            ('Childcare', EXPENSE),
+            ('School', EXPENSE),
+            ('Utilities', EXPENSE),
+            ('Healthcare', EXPENSE),
+            ('Insurance', EXPENSE),
+            ('Transportation', EXPENSE),
+            ('Holidays', EXPENSE),
+            ('Other Expense', EXPENSE),
+        ],
+    },
+}
+
+
+def get_template(name):
+    """
+    Return a template's categories; raises ValueError for unknown names
+    and for anything but a string, e.g. a list or object from JSON
+    """
+    template = TEMPLATES.get(name or DEFAULT_TEMPLATE) if isinstance(name or '', str) else None
+    if template is None:
+        raise ValueError(
+            f"Unknown category template '{name}'. Choose one of: {', '.join(sorted(TEMPLATES))}"
+        )
+    return validate_categories(template['categories'])
+
+
+def validate_categories(categories):
+    """
+    Return `categories` if each is a (name, type) pair of strings with a
+    known type, so they can serve as conflict keys; else raise ValueError
+    """
+    types = {value for value, _ in Category.TYPE_CHOICES}
+    for entry in categories:
+        if not (
+            isinstance(entry, (list, tuple)) and len(entry) == 2
+            and isinstance(entry[0], str) and entry[0].strip()
+            and isinstance(entry[1], str) and entry[1] in types
+        ):
+            raise ValueError(f'Invalid template category {entry!r}: expected a (name, type) pair')
+    return categories
+
+
+def describe_templates():
+    return [
+        {
+            'name': name,
+            'label': template['label'],
+            'categories': [
+                {'name': category_name, 'type': category_type}
+                for category_name, category_type in template['categories']
+            ],
+        }
+        for name, template in TEMPLATES.items()
+    ]
+
+
+def seed_categories(user, template=DEFAULT_TEMPLATE, new_user=False):
+    """
+    Give `user` the template's categories they do not have yet and
+    return how many were missing
+    `new_user` skips the lookup of existing categories
+    """
+    categories = get_template(template)
+
+    existing = set()
+    if not new_user:
+        existing = set(Category.objects.filter(user=user).values_list('name', 'type'))
+    missing = [
+        Category(user=user, name=name, type=category_type)
+        for name, category_type in categories
+        if (name, category_type) not in existing
+    ]
+    if not missing:
+        return 0
+
+    with db_transaction.atomic():
+        # bulk_create skips post_save, so bump the data version here
+        Category.objects.bulk_create(missing, ignore_conflicts=True)
+        bump_data_version(user.id)
+    return len(missing)
@@ -0,0 +1,43 @@
+"""
+Running independent ORM queries concurrently from async views
+
+Django's async ORM API sends every query to the one thread-sensitive
+executor, so awaiting two querysets still runs them back to back.
+run_concurrently() hands each callable to a small dedicated pool
+instead. Each pool thread keeps its own database connection, recycled
+by close_old_connections() according to CONN_MAX_AGE like a request
+thread's.
+
+Pool threads use their own connections and transactions: they never
+see uncommitted writes of the calling thread, so only use this for
+read-only work outside atomic blocks.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_QUERY_WORKERS,
+    thread_name_prefix='orm-query'
+)
+
+
+def _with_connection(func):
+    def run():
+        close_old_connections()
+        try:
+            return func()
+        finally:
+            close_old_connections()
+    return run
+
+
+async def run_concurrently(*funcs):
+    """Call each sync function on the query pool; return results in order"""
+    return await asyncio.gather(*(
+        sync_to_async(_with_connection(func), thread_sensitive=False, executor=executor)()
+        for func in funcs
+    ))
@@ -0,0 +1,121 @@
+"""
+Conditional GET for the per-user read endpoints
+
+Responses carry an ETag derived from the user's DataVersion, so a
+repeat request with If-None-Match is answered with 304 after one indexed
+lookup, before any queryset, aggregate or serializer runs. There is no
+Last-Modified: HTTP dates have one-second precision, so If-Modified-Since
+would answer 304 for data changed within the second of a response.
+"""
+import hashlib
+from functools import wraps
+
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from .caching import get_data_state
+from .routers import route_reads
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+class NotModified(APIException):
+    status_code = status.HTTP_304_NOT_MODIFIED
+    default_detail = 'Not modified'
+
+
+def get_etag(request, version):
+    """
+    Return the ETag for a request
+
+    It covers the user's data version, the full URL and the Accept
+    header (JSON vs the browsable API). Today's date is part of it too
+    since the dashboard and current budget depend on it.
+    """
+    key = '|'.join([
+        str(request.user.pk),
+        str(version),
+        timezone.localdate().isoformat(),
+        request.get_full_path(),
+        request.META.get('HTTP_ACCEPT', ''),
+    ])
+    return f'"{hashlib.md5(key.encode()).hexdigest()}"'
+
+
+def evaluate(request):
+    """
+    Read the user's data version (and base currency) for a GET request
+    and pick the database for its remaining reads (see routers)
+    Returns (etag, not_modified); etag is None for other methods
+    """
+    if request.method not in SAFE_METHODS:
+        return None, False
+
+    version, updated_at, base_currency = get_data_state(request.user.pk)
+    request.data_version = version
+    request.base_currency = base_currency
+    route_reads(updated_at)
+    etag = get_etag(request, version)
+
+    django_request = getattr(request, '_request', request)
+    not_modified = get_conditional_response(django_request, etag=etag) is not None
+    return etag, not_modified
+
+
+def set_headers(response, etag):
+    if etag is None:
+        return response
+    if response.status_code not in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+        return response
+
+    response['ETag'] = etag
+    # Always revalidate, and never store one user's data in shared caches
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def not_modified_response():
+    return Response(status=status.HTTP_304_NOT_MODIFIED)
+
+
+class ConditionalGetMixin:
+    """
+    Adds an ETag to GET responses of a viewset and answers
+    matching conditional requests with 304 right after authentication
+    """
+
+    def initial(self, request, *args, **kwargs):
+        self.etag = None
+        super().initial(request, *args, **kwargs)
+        self.etag, not_modified = evaluate(request)
+        if not_modified:
+            raise NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return not_modified_response()
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        return set_headers(response, getattr(self, 'etag', None))
+
+
+def conditional_get(view):
+    """
+    Same as ConditionalGetMixin for function views; goes below @api_view
+    and @permission_classes so it runs after authentication
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        etag, not_modified = evaluate(request)
+        if not_modified:
+            response = not_modified_response()
+        else:
+            response = view(request, *args, **kwargs)
+        return set_headers(response, etag)
+    return wrapper
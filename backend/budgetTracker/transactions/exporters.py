@@ -0,0 +1,67 @@
+"""
+Streaming CSV / NDJSON export of transactions
+
+Rows arrive as plain tuples from a .values_list().iterator() cursor and
+are formatted directly, skipping model instantiation and DRF
+serialization, so memory use stays flat regardless of ledger size.
+"""
+import csv
+import json
+
+EXPORT_FIELDS = [
+    'id', 'date', 'type', 'amount', 'currency', 'category__name', 'description', 'created_at'
+]
+
+EXPORT_HEADER = [
+    'id', 'date', 'type', 'amount', 'currency', 'category', 'description', 'created_at'
+]
+
+# output name -> (content type, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+
+class Echo:
+    """File-like object whose write() hands the line back to csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_HEADER)
+    for pk, row_date, row_type, amount, currency, category, description, created_at in rows:
+        yield writer.writerow([
+            pk,
+            row_date.isoformat(),
+            row_type,
+            str(amount),
+            currency,
+            category or '',
+            description,
+            created_at.isoformat(),
+        ])
+
+
+def _ndjson_lines(rows):
+    dumps = json.JSONEncoder(ensure_ascii=False).encode
+    for pk, row_date, row_type, amount, currency, category, description, created_at in rows:
+        yield dumps({
+            'id': pk,
+            'date': row_date.isoformat(),
+            'type': row_type,
+            'amount': str(amount),
+            'currency': currency,
+            'category': category,
+            'description': description,
+            'created_at': created_at.isoformat(),
+        }) + '\n'
+
+
+def stream_export(rows, output):
+    if output == 'ndjson':
+        return _ndjson_lines(rows)
+    return _csv_lines(rows)
@@ -0,0 +1,236 @@
+"""
+Read-only fast path for list endpoints
+
+ValuesRepresentation compiles a serializer's readable fields once into
+(key, getter) pairs over the columns of queryset.values(), then builds
+each row's output from those dicts: no model instances, no attribute
+lookups through `source`, no per-field to_representation() calls. The
+output is the serializer's own for the field types it knows (plain,
+choice, decimal, date and datetime fields, primary-key relations and
+nested serializers over a foreign key); anything else (method fields,
+custom fields, non-ISO formats) raises Unsupported and the caller uses
+the serializer instead.
+"""
+import decimal
+from operator import itemgetter
+
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.fields import empty
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .metrics import timed_serialization
+
+# Marks a field the serializer would leave out of its output
+SKIP = object()
+
+
+class Unsupported(Exception):
+    """The serializer has a field the fast path cannot reproduce"""
+
+
+def _identity(value):
+    return value
+
+
+def _decimal_mapper(field):
+    if field.normalize_output or field.localize:
+        raise Unsupported(field.field_name)
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if field.decimal_places is None:
+        quantize = _identity
+    else:
+        exponent = decimal.Decimal('.1') ** field.decimal_places
+        context = decimal.getcontext().copy()
+        if field.max_digits is not None:
+            context.prec = field.max_digits
+        rounding = field.rounding
+
+        def quantize(value):
+            return value.quantize(exponent, rounding=rounding, context=context)
+
+    if not coerce_to_string:
+        return quantize
+    return lambda value: f'{quantize(value):f}'
+
+
+def _date_mapper(field):
+    if getattr(field, 'format', api_settings.DATE_FORMAT).lower() != ISO_8601:
+        raise Unsupported(field.field_name)
+    return lambda value: value.isoformat()
+
+
+def _datetime_mapper(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601:
+        raise Unsupported(field.field_name)
+
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+
+    def to_representation(value):
+        if field_timezone is not None and timezone.is_aware(value):
+            value = value.astimezone(field_timezone)
+        else:
+            value = field.enforce_timezone(value)
+        value = value.isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+    return to_representation
+
+
+# Mappers by the class whose to_representation() a field uses, so a
+# subclass that overrides it is never mistaken for its parent
+MAPPERS = {
+    serializers.CharField.to_representation: lambda field: _identity,
+    serializers.ChoiceField.to_representation: lambda field: _identity,
+    serializers.IntegerField.to_representation: lambda field: _identity,
+    serializers.BooleanField.to_representation: lambda field: _identity,
+    serializers.ReadOnlyField.to_representation: lambda field: _identity,
+    serializers.DecimalField.to_representation: _decimal_mapper,
+    serializers.DateField.to_representation: _date_mapper,
+    serializers.DateTimeField.to_representation: _datetime_mapper,
+}
+
+
+class ValuesRepresentation:
+    """
+    A serializer's output built from .values() rows
+
+    `paths` are the columns to select; values() selects them and
+    to_representation() turns the rows into the serializer's output.
+    """
+
+    def __init__(self, serializer, extra_paths=()):
+        self.paths = []
+        self.entries = self.compile(serializer, '')
+        for path in extra_paths:
+            self.add_path(path)
+
+    def add_path(self, path):
+        if path not in self.paths:
+            self.paths.append(path)
+        return path
+
+    def values(self, queryset):
+        return queryset.select_related(None).prefetch_related(None).values(*self.paths)
+
+    def to_representation(self, rows):
+        with timed_serialization():
+            return [build(row, self.entries) for row in rows]
+
+    def compile(self, serializer, prefix):
+        model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+        if model is None:
+            raise Unsupported(type(serializer).__name__)
+        entries = []
+        for field in serializer._readable_fields:
+            entries.append((field.field_name, self.getter(field, model, prefix)))
+        return entries
+
+    def getter(self, field, model, prefix):
+        if field.source == '*' or not field.source_attrs:
+            raise Unsupported(field.field_name)
+        relation, column = resolve(model, field.source_attrs, field.field_name)
+        path = self.add_path(prefix + '__'.join(field.source_attrs))
+
+        if isinstance(field, serializers.BaseSerializer):
+            if isinstance(field, serializers.ListSerializer) or relation or not column.many_to_one:
+                raise Unsupported(field.field_name)
+            entries = self.compile(field, path + '__')
+            return lambda row: None if row[path] is None else build(row, entries)
+
+        if isinstance(field, serializers.PrimaryKeyRelatedField):
+            if field.pk_field is not None or not column.many_to_one:
+                raise Unsupported(field.field_name)
+            mapper = _identity
+        else:
+            factory = MAPPERS.get(type(field).to_representation)
+            if factory is None:
+                raise Unsupported(field.field_name)
+            mapper = factory(field)
+
+        if relation is None:
+            if mapper is _identity:
+                return itemgetter(path)
+            return lambda row: None if row[path] is None else mapper(row[path])
+
+        # A source through a null relation: Field.get_attribute() gives
+        # the default, None for allow_null fields, or leaves the key out
+        if field.default is not empty:
+            raise Unsupported(field.field_name)
+        missing = None if field.allow_null else SKIP
+        relation = self.add_path(prefix + relation)
+
+        def get(row):
+            if row[relation] is None:
+                return missing
+            value = row[path]
+            return None if value is None else mapper(value)
+
+        return get
+
+
+def resolve(model, attrs, name):
+    """
+    Check that `attrs` follow model fields; returns (the path of the
+    first relation crossed on the way, or None, and the final field)
+    """
+    relation = None
+    field = None
+    for index, attr in enumerate(attrs):
+        if model is None:
+            raise Unsupported(name)
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            raise Unsupported(name)
+        if field.many_to_many or field.one_to_many:
+            raise Unsupported(name)
+        if field.is_relation and index < len(attrs) - 1 and relation is None:
+            relation = '__'.join(attrs[:index + 1])
+        model = field.related_model
+    return relation, field
+
+
+def build(row, entries):
+    data = {}
+    for key, get in entries:
+        value = get(row)
+        if value is not SKIP:
+            data[key] = value
+    return data
+
+
+class ValuesListMixin:
+    """
+    list() through ValuesRepresentation when the serializer allows it
+    Set values_list = False on a viewset to always use the serializer
+    """
+    values_list = True
+
+    def get_values_representation(self):
+        if not self.values_list:
+            return None
+        ordering = getattr(self.paginator, 'ordering', ())
+        try:
+            return ValuesRepresentation(
+                self.get_serializer(),
+                extra_paths=[field.lstrip('-') for field in ordering]
+            )
+        except Unsupported:
+            return None
+
+    def list(self, request, *args, **kwargs):
+        representation = self.get_values_representation()
+        if representation is None:
+            return super().list(request, *args, **kwargs)
+
+        rows = representation.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(representation.to_representation(page))
+        return Response(representation.to_representation(rows))
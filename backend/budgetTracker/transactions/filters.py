@@ -1,5 +1,8 @@
 import django_filters
+from rest_framework import filters
+from rest_framework.settings import api_settings
 from .models import Transaction
+from . import search
 
 class TransactionFilter(django_filters.FilterSet):
     """
@@ -25,4 +28,34 @@ class TransactionFilter(django_filters.FilterSet):
             'type', 'category', 'date_from', 'date_to',
             'amount_min', 'amount_max', 'description',
             'month', 'year'
-        ]
\ No newline at end of file
+        ]
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    ?search= backed by the full-text transaction index
+
+    Each term must match a description word prefix or the name of one of
+    the user's categories, mirroring SearchFilter semantics. Unless the
+    client passes ?ordering=, results are ordered by relevance. Falls
+    back to SearchFilter when the index is not installed, and for the
+    archived transactions, which the index does not cover.
+    """
+    
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        
+        if queryset.model is not Transaction or not search.is_available():
+            return super().filter_queryset(request, queryset, view)
+        
+        token_groups = [tokens for tokens in map(search.tokenize, terms) if tokens]
+        if not token_groups:
+            return queryset
+        
+        rank = not request.query_params.get(api_settings.ORDERING_PARAM)
+        queryset = search.filter_queryset(queryset, request.user, token_groups, rank=rank)
+        if rank:
+            queryset = queryset.order_by('search_rank', *queryset.query.order_by)
+        return queryset
@@ -0,0 +1,294 @@
+"""
+Currency conversion inside aggregate queries
+
+Amounts are stored in the currency they were recorded in and totals are
+reported in the user's base currency (Profile.base_currency, else
+DEFAULT_CURRENCY), which GET requests read along with the data version.
+ExchangeRate holds one average rate per currency and month against a
+common reference currency, loaded from a file with
+`manage.py load_exchange_rates`; nothing is fetched over the network.
+
+converted_sum() is the SQL for a total in the base currency: amounts
+already in it are summed exactly, the others are scaled by rate(base) /
+rate(currency) for their month, each rate a correlated subquery seeking
+the (currency, month) index. A multi-currency total is therefore the
+same single query over the same rows (a handful of rollup buckets for
+most endpoints) as a single-currency one, and no amount is converted in
+Python. A month
+without a rate uses the latest earlier one, or the earliest rate known
+for months before the file starts. A currency with no rates at all has
+a NULL rate, so writes, base currency changes and rate reloads are
+checked (check_convertible()) to never leave amounts unconvertible.
+
+Budgets have no currency of their own: they are in the base currency,
+so changing it converts them (convert_budgets()) at their month's rates.
+"""
+import csv
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import (
+    CharField, DecimalField, F, FloatField, Func, OuterRef, Q, Subquery, Sum, Value
+)
+from django.db.models.functions import Cast, Coalesce, Round
+
+from .caching import bump_all_data_versions
+from .models import Budget, ExchangeRate, MonthlyRollup, Profile
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def base_currency(user):
+    """
+    SQL for a user's base currency; `user` is an id (the subquery is
+    then evaluated once per statement) or an OuterRef
+    """
+    return Coalesce(
+        Subquery(Profile.objects.filter(user_id=user).values('base_currency')[:1]),
+        Value(settings.DEFAULT_CURRENCY),
+        output_field=CharField()
+    )
+
+
+def request_base_currency(request):
+    """
+    The base currency conditional GET read along with the data version,
+    or SQL for it on other requests
+    """
+    return getattr(request, 'base_currency', None) or base_currency(request.user.id)
+
+
+class Rate(Func):
+    """
+    SQL for the rate of a currency for the month of a date: the latest at
+    or before that month, else the earliest known. Written out rather than
+    as two ORM subqueries, which cost more to build and compile than the
+    rollup aggregates they sit in take to run
+    """
+    arity = 2
+    output_field = FloatField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        (currency, currency_params), (on, on_params) = (
+            compiler.compile(expression) for expression in self.get_source_expressions()
+        )
+        qn = connection.ops.quote_name
+        opts = ExchangeRate._meta
+        table, alias = qn(opts.db_table), qn('fx_rate')
+        code_column, month_column, rate_column = (
+            f'{alias}.{qn(opts.get_field(name).column)}' for name in ('currency', 'month', 'rate')
+        )
+        rates = f'SELECT {rate_column} FROM {table} {alias} WHERE {code_column} = {currency}'
+        sql = (
+            f'COALESCE(({rates} AND {month_column} <= {on} ORDER BY {month_column} DESC LIMIT 1), '
+            f'({rates} ORDER BY {month_column} LIMIT 1))'
+        )
+        return sql, (*currency_params, *on_params, *currency_params)
+
+
+def converted(amount, on, base, currency='currency'):
+    """
+    SQL for the `amount` column converted to `base` (SQL for a currency
+    code, see as_base()) at the rates of the month of the `on` column (a
+    date or a month), as a float
+    """
+    factor = Rate(base, F(on)) / Rate(F(currency), F(on))
+    return Cast(amount, FloatField()) * factor
+
+
+def as_base(base):
+    """
+    SQL for a base currency: `base` is a currency code or uncorrelated
+    SQL for one (request_base_currency()); None is the base currency of
+    each row's own user
+    """
+    if base is None:
+        return base_currency(OuterRef('user'))
+    if isinstance(base, str):
+        return Value(base)
+    return base
+
+
+def convert_budgets(user, old, new):
+    """Re-express a user's budgets, held in `old`, in `new` in one UPDATE"""
+    if old == new:
+        return
+    factor = Rate(Value(new), F('month')) / Rate(Value(old), F('month'))
+    Budget.objects.filter(user=user).update(
+        amount=Cast(Round(Cast('amount', FloatField()) * factor, 2), MONEY)
+    )
+
+
+def converted_sum(amount, on, base=None, filter=None):
+    """
+    Total of the `amount` column in `base` (see as_base()) over the rows
+    matching `filter`, as for Sum()
+    Amounts already in the base currency are summed as exact decimals;
+    only the others go through converted(), cast back to money once per
+    group rather than per row
+    """
+    base = as_base(base)
+    in_base = Q(currency=base)
+    foreign = ~Q(currency=base)
+    if filter is not None:
+        in_base &= filter
+        foreign &= filter
+    zero = Value(Decimal('0.00'), output_field=MONEY)
+    return Coalesce(Sum(amount, filter=in_base), zero) + Coalesce(
+        Cast(Sum(converted(amount, on, base), filter=foreign), MONEY), zero
+    )
+
+
+def base_currency_of(user):
+    """The user's base currency, for defaults on write paths"""
+    profile = Profile.objects.filter(user=user).values_list('base_currency', flat=True).first()
+    return profile or settings.DEFAULT_CURRENCY
+
+
+def missing_rates(codes):
+    """The currencies among `codes` that have no exchange rates"""
+    codes = set(codes)
+    return codes - set(
+        ExchangeRate.objects.filter(currency__in=codes)
+        .order_by().values_list('currency', flat=True).distinct()
+    )
+
+
+def check_convertible(currencies, base):
+    """
+    Raise ValueError unless amounts in each of `currencies` can be
+    reported in `base`: Rate is NULL for a currency without rates, and
+    Sum() would silently leave those amounts out of every total
+    """
+    foreign = set(currencies) - {base}
+    if not foreign:
+        return
+    missing = missing_rates(foreign | {base})
+    if missing:
+        raise ValueError(f"No exchange rates for {', '.join(sorted(missing))}")
+
+
+def held_currencies(user):
+    """The currencies a user has transactions in (live or archived)"""
+    return set(
+        MonthlyRollup.objects.filter(user=user)
+        .order_by().values_list('currency', flat=True).distinct()
+    )
+
+
+def convertible_currencies():
+    """Every currency that amounts are held or reported in and must convert"""
+    bases = dict(Profile.objects.values_list('user_id', 'base_currency'))
+    needed = set()
+    held = MonthlyRollup.objects.order_by().values_list('user_id', 'currency').distinct()
+    for user_id, currency in held:
+        base = bases.get(user_id, settings.DEFAULT_CURRENCY)
+        if currency != base:
+            needed.update((currency, base))
+    return needed
+
+
+def known_currencies():
+    codes = set(ExchangeRate.objects.order_by().values_list('currency', flat=True).distinct())
+    codes.add(settings.DEFAULT_CURRENCY)
+    return sorted(codes)
+
+
+def normalize_code(value):
+    """Upper-cased ISO 4217 code; raises ValueError for anything else"""
+    code = (value or '').strip().upper()
+    if len(code) != 3 or not code.isalpha() or not code.isascii():
+        raise ValueError(f"'{value}' is not a three-letter currency code")
+    return code
+
+
+def read_rates(lines, reference):
+    """
+    Monthly average rates from a CSV file of daily (or any) rates
+    against `reference`, as {(currency, month): rate}
+
+    Two layouts are read: long, with date, currency and rate columns,
+    and wide, a date column followed by one column per currency (the
+    ECB's eurofxref-hist.csv). Empty and N/A cells are skipped.
+    """
+    reader = csv.reader(lines)
+    header = [name.strip().lower() for name in next(reader, [])]
+    if not header or header[0] != 'date':
+        raise ValueError("The first column must be 'date'")
+
+    if header[1:3] == ['currency', 'rate']:
+        def cells(row):
+            yield row[1], row[2]
+    else:
+        codes = header[1:]
+
+        def cells(row):
+            yield from zip(codes, row[1:])
+
+    sums = defaultdict(float)
+    counts = defaultdict(int)
+    for line_no, row in enumerate(reader, start=2):
+        if not row or not row[0].strip():
+            continue
+        try:
+            month = date.fromisoformat(row[0].strip()).replace(day=1)
+        except ValueError:
+            raise ValueError(f"Line {line_no}: invalid date '{row[0]}'")
+        for code, value in cells(row):
+            value = value.strip()
+            if not code.strip() or not value or value.upper() == 'N/A':
+                continue
+            try:
+                key = (normalize_code(code), month)
+                value = float(value)
+            except ValueError as e:
+                raise ValueError(f'Line {line_no}: {e}')
+            if value <= 0:
+                raise ValueError(f'Line {line_no}: rates must be greater than 0')
+            sums[key] += value
+            counts[key] += 1
+
+    rates = {key: total / counts[key] for key, total in sums.items()}
+    for month in {month for _, month in rates}:
+        rates[(reference, month)] = 1.0
+    return rates
+
+
+@db_transaction.atomic
+def load_rates(rates, reference, replace=False):
+    """
+    Store rates from read_rates(), replacing those of the same currency
+    and month (every rate when `replace`); returns how many were stored
+    """
+    if replace:
+        missing = convertible_currencies() - {code for code, _ in rates}
+        if missing:
+            raise ValueError(
+                f"Transactions still need rates for {', '.join(sorted(missing))}; "
+                f'include them in the file'
+            )
+        ExchangeRate.objects.all().delete()
+    elif (
+        ExchangeRate.objects.exists()
+        and not ExchangeRate.objects.filter(currency=reference, rate=1).exists()
+    ):
+        raise ValueError(
+            f'The stored rates are not against {reference}; '
+            f'load every currency again with replace'
+        )
+
+    for month in {month for _, month in rates}:
+        ExchangeRate.objects.filter(
+            month=month,
+            currency__in=[code for code, rate_month in rates if rate_month == month]
+        ).delete()
+    created = ExchangeRate.objects.bulk_create(
+        ExchangeRate(currency=code, month=month, rate=value)
+        for (code, month), value in sorted(rates.items())
+    )
+    # Cached totals were converted at the old rates
+    bump_all_data_versions()
+    return len(created)
@@ -0,0 +1,376 @@
+"""
+Streaming import of bank statement files (CSV, OFX, QIF)
+
+Parsers yield one (line number, raw row) pair at a time so files of any
+size are processed with bounded memory. TransactionImporter validates
+rows, resolves categories from an in-memory per-user lookup and inserts
+them with batched bulk_create inside one database transaction.
+"""
+import csv
+import re
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction as db_transaction
+
+from .models import Category, Transaction
+from . import fx, rollups
+from .caching import bump_data_version
+
+FORMATS = ['csv', 'ofx', 'qif']
+
+IMPORT_FIELDS = ['type', 'amount', 'date', 'description', 'category', 'currency']
+
+TYPE_ALIASES = {
+    'INCOME': Transaction.INCOME,
+    'CREDIT': Transaction.INCOME,
+    'DEP': Transaction.INCOME,
+    'DEPOSIT': Transaction.INCOME,
+    'EXPENSE': Transaction.EXPENSE,
+    'DEBIT': Transaction.EXPENSE,
+    'PAYMENT': Transaction.EXPENSE,
+}
+
+# Commas are only accepted as thousands separators; '12,50' or '1.234,56'
+# (decimal commas) are rejected rather than imported with the wrong value
+THOUSANDS_RE = re.compile(r'[-+]?\d{1,3}(,\d{3})+(\.\d*)?')
+
+MAX_AMOUNT = Decimal('9999999999.99')
+TWO_PLACES = Decimal('0.01')
+
+
+class ImportFileError(Exception):
+    """Raised when a file cannot be parsed at all (bad format, header...)"""
+
+
+def guess_format(filename):
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension in FORMATS:
+        return extension
+    if extension == 'qfx':
+        return 'ofx'
+    raise ImportFileError(f"Cannot guess file format from '{filename}'")
+
+
+def parse_csv(stream, mapping=None):
+    """
+    Yield rows from a CSV file with a header line
+    `mapping` maps import fields to column headers, e.g. {'amount': 'Debit'};
+    unmapped fields are looked up by their own name (case-insensitive)
+    """
+    reader = _csv_records(csv.reader(stream))
+    try:
+        header = next(reader)
+    except StopIteration:
+        return
+
+    positions = {name.strip().lower(): index for index, name in enumerate(header)}
+    mapping = mapping or {}
+    columns = {}
+    for field in IMPORT_FIELDS:
+        column = mapping.get(field, field).strip().lower()
+        if column in positions:
+            columns[field] = positions[column]
+        elif field in mapping:
+            raise ImportFileError(f"Column '{mapping[field]}' not found in CSV header")
+
+    for field in ('amount', 'date'):
+        if field not in columns:
+            raise ImportFileError(f"CSV file has no '{field}' column")
+
+    for line_no, record in enumerate(reader, start=2):
+        if not any(value.strip() for value in record):
+            continue
+        yield line_no, {
+            field: record[index] if index < len(record) else ''
+            for field, index in columns.items()
+        }
+
+
+def _csv_records(reader):
+    """Records of a csv.reader, raising ImportFileError for malformed CSV"""
+    try:
+        yield from reader
+    except csv.Error as e:
+        raise ImportFileError(f'Line {reader.line_num}: {e}')
+
+
+OFX_TAG_RE = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+
+def parse_ofx(stream):
+    """Yield <STMTTRN> records from an OFX 1.x (SGML) or 2.x (XML) file"""
+    current = None
+    start_line = None
+    for line_no, line in enumerate(stream, start=1):
+        for closing, tag, text in OFX_TAG_RE.findall(line):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if closing and current is not None:
+                    yield start_line, _ofx_row(current)
+                    current = None
+                elif not closing:
+                    current = {}
+                    start_line = line_no
+            elif current is not None and not closing:
+                current[tag] = text.strip()
+
+
+def _ofx_row(record):
+    # TRNAMT is signed, so the type comes from its sign; TRNTYPE has many
+    # values (POS, ATM, XFER, DIRECTDEP...) that say nothing about direction
+    description = ' - '.join(
+        value for value in (record.get('NAME'), record.get('MEMO')) if value
+    )
+    return {
+        'amount': record.get('TRNAMT', ''),
+        'date': record.get('DTPOSTED', '')[:8],
+        'description': description,
+    }
+
+
+def parse_qif(stream):
+    """Yield records from a QIF file ('^' terminates each record)"""
+    current = {}
+    start_line = None
+    for line_no, line in enumerate(stream, start=1):
+        line = line.rstrip('\r\n')
+        if not line or line.startswith('!'):
+            continue
+        code, value = line[0], line[1:].strip()
+        if code == '^':
+            if current:
+                yield start_line, current
+            current = {}
+            continue
+        if not current:
+            start_line = line_no
+        if code == 'D':
+            current['date'] = value
+        elif code in ('T', 'U'):
+            current['amount'] = value
+        elif code == 'P':
+            current['description'] = value
+        elif code == 'M':
+            current.setdefault('memo', value)
+        elif code == 'L' and not value.startswith('['):
+            current['category'] = value
+    if current:
+        yield start_line, current
+
+
+PARSERS = {
+    'csv': parse_csv,
+    'ofx': parse_ofx,
+    'qif': parse_qif,
+}
+
+
+def parse(stream, file_format, mapping=None):
+    if file_format not in PARSERS:
+        raise ImportFileError(f"Unsupported format '{file_format}'")
+    if file_format == 'csv':
+        return parse_csv(stream, mapping)
+    return PARSERS[file_format](stream)
+
+
+class ImportResult:
+
+    def __init__(self, max_errors):
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def add_error(self, line_no, errors):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line_no, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
+
+
+class TransactionImporter:
+    """
+    Validate and insert parsed rows for one user
+
+    Rows missing a type take it from the sign of the amount. Category
+    names are matched case-insensitively against the user's categories;
+    unknown names are created when `create_categories` is set. Rows
+    without a currency are in the user's base currency.
+    """
+
+    QIF_DATE_FORMATS = ['%m/%d/%Y', "%m/%d'%y", '%m/%d/%y', '%d/%m/%Y', '%Y-%m-%d']
+
+    def __init__(self, user, batch_size=1000, date_format=None,
+                 create_categories=True, max_errors=100):
+        self.user = user
+        self.batch_size = batch_size
+        self.date_format = date_format
+        self.create_categories = create_categories
+        self.max_errors = max_errors
+        self.categories = {
+            (name.lower(), category_type): pk
+            for pk, name, category_type in Category.objects.filter(
+                user=user
+            ).values_list('id', 'name', 'type')
+        }
+        self.currency = fx.base_currency_of(user)
+        self.currencies = {self.currency}
+
+    def run(self, rows):
+        result = ImportResult(self.max_errors)
+        deltas = rollups.BucketDeltas()
+        batch = []
+
+        with db_transaction.atomic():
+            for line_no, raw in rows:
+                values, errors = self.clean(raw)
+                if errors:
+                    result.add_error(line_no, errors)
+                    continue
+
+                batch.append(Transaction(user=self.user, **values))
+                if len(batch) >= self.batch_size:
+                    result.created += self.flush(batch, deltas)
+                    batch = []
+
+            if batch:
+                result.created += self.flush(batch, deltas)
+
+            if result.created:
+                deltas.apply()
+                bump_data_version(self.user.id)
+
+        return result
+
+    def flush(self, batch, deltas):
+        Transaction.objects.bulk_create(batch, batch_size=self.batch_size)
+        for transaction in batch:
+            deltas.add({
+                'user_id': self.user.id,
+                'date': transaction.date,
+                'type': transaction.type,
+                'category_id': transaction.category_id,
+                'currency': transaction.currency,
+                'amount': transaction.amount,
+            })
+        return len(batch)
+
+    def clean(self, raw):
+        errors = {}
+
+        amount = None
+        try:
+            amount = self.parse_amount(raw.get('amount', ''))
+        except (InvalidOperation, ValueError):
+            errors['amount'] = 'A valid number is required.'
+
+        transaction_type = (raw.get('type') or '').strip().upper()
+        if transaction_type:
+            transaction_type = TYPE_ALIASES.get(transaction_type)
+            if transaction_type is None:
+                errors['type'] = f"Unknown transaction type '{raw.get('type')}'."
+        if not transaction_type and amount is not None:
+            transaction_type = Transaction.INCOME if amount > 0 else Transaction.EXPENSE
+
+        if amount is not None:
+            amount = abs(amount)
+            if amount < TWO_PLACES:
+                errors['amount'] = 'Amount must be greater than 0'
+            elif amount > MAX_AMOUNT:
+                errors['amount'] = 'Amount is too large.'
+
+        try:
+            row_date = self.parse_date(raw.get('date', ''))
+        except ValueError:
+            errors['date'] = f"Invalid date '{raw.get('date', '')}'."
+
+        description = raw.get('description') or ''
+        memo = raw.get('memo')
+        if memo:
+            description = f'{description} - {memo}' if description else memo
+
+        category_id = None
+        category_name = (raw.get('category') or '').strip()
+        if category_name and transaction_type and not errors:
+            category_id = self.resolve_category(category_name, transaction_type)
+            if category_id is None:
+                errors['category'] = f"Unknown category '{category_name}'."
+
+        currency = self.currency
+        if (raw.get('currency') or '').strip():
+            try:
+                currency = self.resolve_currency(raw['currency'])
+            except ValueError as e:
+                errors['currency'] = str(e)
+
+        if errors:
+            return None, errors
+
+        return {
+            'type': transaction_type,
+            'amount': amount,
+            'date': row_date,
+            'description': description.strip(),
+            'category_id': category_id,
+            'currency': currency,
+        }, None
+
+    def parse_amount(self, value):
+        value = value.strip().replace('$', '')
+        if value.startswith('(') and value.endswith(')'):
+            value = '-' + value[1:-1]
+        if ',' in value:
+            if not THOUSANDS_RE.fullmatch(value):
+                raise ValueError(f"Amount '{value}' has no clear decimal separator")
+            value = value.replace(',', '')
+        amount = Decimal(value)
+        if not amount.is_finite():
+            raise ValueError(f"Amount '{value}' is not a finite number")
+        # Raises InvalidOperation for exponents too large to hold two places
+        return amount.quantize(TWO_PLACES)
+
+    def parse_date(self, value):
+        value = value.strip()
+        if self.date_format:
+            return datetime.strptime(value, self.date_format).date()
+        if len(value) == 8 and value.isdigit():
+            return datetime.strptime(value, '%Y%m%d').date()
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            pass
+        for date_format in self.QIF_DATE_FORMATS:
+            try:
+                return datetime.strptime(value.replace(' ', '0'), date_format).date()
+            except ValueError:
+                continue
+        raise ValueError(value)
+
+    def resolve_currency(self, value):
+        code = fx.normalize_code(value)
+        if code not in self.currencies:
+            fx.check_convertible([code], self.currency)
+            self.currencies.add(code)
+        return code
+
+    def resolve_category(self, name, transaction_type):
+        key = (name.lower(), transaction_type)
+        if key in self.categories:
+            return self.categories[key]
+        if not self.create_categories:
+            return None
+        category, _ = Category.objects.get_or_create(
+            user=self.user,
+            name=name,
+            type=transaction_type
+        )
+        self.categories[key] = category.id
+        return category.id
+
@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions import archive
+from transactions.models import ArchivedTransaction, Transaction
+
+
+class Command(BaseCommand):
+    help = (
+        'Move transactions older than ARCHIVE_AFTER_MONTHS into the archive '
+        'table in short batches; --restore moves archived rows on or after '
+        'the horizon back'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            action='append',
+            dest='usernames',
+            help='Only archive transactions of this username (repeatable)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=archive.DEFAULT_BATCH_SIZE,
+            help='Transactions moved per database transaction'
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0,
+            help='Seconds to sleep between batches'
+        )
+        parser.add_argument(
+            '--restore',
+            action='store_true',
+            help='Move archived transactions newer than the horizon back'
+        )
+
+    def handle(self, *args, **options):
+        if settings.ARCHIVE_AFTER_MONTHS < 1:
+            raise CommandError('ARCHIVE_AFTER_MONTHS must be at least 1')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        horizon = archive.horizon()
+        if options['restore']:
+            move, source, lookup, verb = archive.restore_user, ArchivedTransaction, 'date__gte', 'Restored'
+        else:
+            move, source, lookup, verb = archive.archive_user, Transaction, 'date__lt', 'Archived'
+
+        users = User.objects.filter(
+            pk__in=source.objects.filter(**{lookup: horizon}).values('user_id')
+        ).order_by('pk')
+        usernames = options['usernames']
+        if usernames:
+            known = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+            missing = set(usernames) - known
+            if missing:
+                raise CommandError(f"Unknown users: {', '.join(sorted(missing))}")
+            users = users.filter(username__in=usernames)
+
+        total = 0
+        for user in users.iterator():
+            moved = move(user, horizon, batch_size=options['batch_size'], pause=options['pause'])
+            total += moved
+            self.stdout.write(f'{user.username}: {moved}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {total} transactions (horizon {horizon.isoformat()})'
+        ))
@@ -0,0 +1,77 @@
+import asyncio
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, override_settings
+from django.urls import reverse
+
+ENDPOINTS = [
+    ('dashboard', 'dashboard', 'dashboard-async'),
+    ('by_category', 'transaction-by-category', 'transaction-by-category-async'),
+    ('by_category (rows)', 'transaction-by-category', 'transaction-by-category-async'),
+]
+
+ROW_LEVEL_PARAMS = {'amount_min': '0.01'}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare wall-clock latency of the sync dashboard/by_category views '
+        'with their async variants, both served through the ASGI handler'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('user', help='Username whose ledger is queried')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per view')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"Unknown user '{options['user']}'")
+
+        settings_dict = connection.settings_dict
+        self.stdout.write(f"Database: {connection.vendor} {settings_dict['NAME']}")
+
+        # Every request must reach the database
+        dummy_cache = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with override_settings(CACHES=dummy_cache, ALLOWED_HOSTS=['*']):
+            results = asyncio.run(self.run_benchmark(user, options['repeat']))
+
+        self.stdout.write(f"{'endpoint':<22}{'view':<8}{'median ms':>12}{'p95 ms':>10}")
+        for name, timings in results:
+            for view, samples in timings:
+                samples = sorted(samples)
+                p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+                self.stdout.write(
+                    f'{name:<22}{view:<8}{statistics.median(samples):>12.1f}{p95:>10.1f}'
+                )
+
+    async def run_benchmark(self, user, repeat):
+        client = AsyncClient()
+        await client.aforce_login(user)
+
+        results = []
+        for name, sync_url, async_url in ENDPOINTS:
+            params = ROW_LEVEL_PARAMS if name.endswith('(rows)') else {}
+            timings = []
+            for view, url_name in (('sync', sync_url), ('async', async_url)):
+                url = reverse(url_name)
+                await self.request(client, url, params)  # warm up connections
+                samples = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    await self.request(client, url, params)
+                    samples.append((time.perf_counter() - started) * 1000)
+                timings.append((view, samples))
+            results.append((name, timings))
+        return results
+
+    async def request(self, client, url, params):
+        response = await client.get(url, params)
+        if response.status_code != 200:
+            raise CommandError(f'{url} returned {response.status_code}')
+        return response
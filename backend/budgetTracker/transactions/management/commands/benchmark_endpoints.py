@@ -0,0 +1,121 @@
+import json
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from transactions.benchmarks import ENDPOINTS, QueryCounter, call, endpoint_url, request_data
+from transactions.synthetic import generate_ledger
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every transactions endpoint on synthetic ledgers of several '
+        'sizes; fails when an endpoint exceeds its query budget'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default='1000,10000,100000',
+            help='Comma-separated transactions per generated ledger'
+        )
+        parser.add_argument('--repeat', type=int, default=5, help='Timed requests per endpoint')
+        parser.add_argument('--only', help='Only endpoints whose name contains this text')
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this file')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated users')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('--sizes must be a comma-separated list of integers')
+
+        endpoints = [
+            endpoint for endpoint in ENDPOINTS
+            if not options['only'] or options['only'] in endpoint.name
+        ]
+        self.stdout.write(f"Database: {connection.vendor} {connection.settings_dict['NAME']}")
+
+        results = []
+        # Measure the uncached path; the aggregate cache would hide it
+        dummy_cache = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with override_settings(CACHES=dummy_cache, ALLOWED_HOSTS=['*']):
+            for size in sizes:
+                results.extend(self.benchmark_size(size, endpoints, options))
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as output:
+                json.dump(results, output, indent=2)
+
+        over_budget = [result for result in results if result['queries'] > result['max_queries']]
+        if over_budget:
+            lines = [
+                f"  {result['endpoint']} ({result['size']} rows): "
+                f"{result['queries']} queries, budget {result['max_queries']}"
+                for result in over_budget
+            ]
+            raise CommandError('Query budgets exceeded:\n' + '\n'.join(lines))
+        self.stdout.write(self.style.SUCCESS('All endpoints within their query budgets'))
+
+    def benchmark_size(self, size, endpoints, options):
+        username = f'benchmark-endpoints-{size}-{int(time.time())}'
+        self.stdout.write(f'\nGenerating {size} transactions for {username}...')
+        started = time.perf_counter()
+        user = generate_ledger(username, transactions=size, seed=size)
+        self.stdout.write(f'  done in {time.perf_counter() - started:.1f}s')
+
+        client = APIClient()
+        client.force_authenticate(user)
+
+        self.stdout.write(
+            f"{'endpoint':<34}{'status':>7}{'queries':>9}{'budget':>8}{'median ms':>11}{'p95 ms':>9}"
+        )
+        results = []
+        try:
+            for endpoint in endpoints:
+                results.append(self.benchmark_endpoint(client, endpoint, user, size, options['repeat']))
+        finally:
+            if not options['keep']:
+                user.delete()
+                cache.clear()
+        return results
+
+    def benchmark_endpoint(self, client, endpoint, user, size, repeat):
+        # The first request warms connections and per-connection caches
+        # (e.g. the full-text index check); it is neither timed nor counted
+        call(client, endpoint, endpoint_url(endpoint, user), request_data(endpoint, user))
+
+        timings = []
+        queries = 0
+        status_code = None
+        for _ in range(repeat):
+            url = endpoint_url(endpoint, user)
+            data = request_data(endpoint, user)
+            with QueryCounter() as counter:
+                started = time.perf_counter()
+                response = call(client, endpoint, url, data)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries = max(queries, counter.count)
+            status_code = response.status_code
+
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        median = statistics.median(timings)
+        flag = '' if queries <= endpoint.max_queries else '  OVER BUDGET'
+        self.stdout.write(
+            f'{endpoint.name:<34}{status_code:>7}{queries:>9}{endpoint.max_queries:>8}'
+            f'{median:>11.1f}{p95:>9.1f}{flag}'
+        )
+        return {
+            'endpoint': endpoint.name,
+            'size': size,
+            'status': status_code,
+            'queries': queries,
+            'max_queries': endpoint.max_queries,
+            'median_ms': round(median, 2),
+            'p95_ms': round(p95, 2),
+        }
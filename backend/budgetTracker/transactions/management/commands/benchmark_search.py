@@ -0,0 +1,91 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from transactions import search
+from transactions.filters import FullTextSearchFilter
+from transactions.models import Transaction
+from transactions.synthetic import generate_ledger
+
+TERMS = ['coffee', 'grocery mart', 'refund', 'stream', 'xyz-no-match', 'gift card']
+
+
+class Command(BaseCommand):
+    help = 'Compare ?search= latency of the full-text index against icontains scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='Synthetic transactions to create')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per search term')
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark user afterwards')
+        parser.add_argument('--user', help='Benchmark an existing user\'s ledger instead of generating one')
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            self.stderr.write('Full-text index is not installed on this database; only icontains will run')
+
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"Unknown user '{options['user']}'")
+            self.run_benchmark(user, options['repeat'], options['page_size'])
+            return
+        
+        user = self.create_ledger(options['rows'])
+        try:
+            self.run_benchmark(user, options['repeat'], options['page_size'])
+        finally:
+            if not options['keep']:
+                self.stdout.write('Removing benchmark user...')
+                user.delete()
+
+    def create_ledger(self, rows):
+        username = f'benchmark-search-{int(time.time())}'
+        self.stdout.write(f'Creating {rows} transactions for {username}...')
+        started = time.perf_counter()
+        user = generate_ledger(username, transactions=rows, months=120, seed=42)
+        self.stdout.write(f'  done in {time.perf_counter() - started:.1f}s')
+        return user
+
+    def run_benchmark(self, user, repeat, page_size):
+        factory = APIRequestFactory()
+        base = Transaction.objects.filter(user=user).select_related('category')
+        ordering = ('-date', '-created_at', '-id')
+
+        def icontains(term):
+            queryset = base
+            for part in term.split():
+                queryset = queryset.filter(
+                    Q(description__icontains=part) | Q(category__name__icontains=part)
+                )
+            return queryset.order_by(*ordering)
+
+        def fulltext(term):
+            request = Request(factory.get('/', {'search': term}))
+            request.user = user
+            return FullTextSearchFilter().filter_queryset(request, base.order_by(*ordering), None)
+
+        backends = [('icontains', icontains)]
+        if search.is_available():
+            backends.append(('fulltext', fulltext))
+
+        self.stdout.write(f"{'term':<16}{'backend':<12}{'matches':>10}{'median ms':>12}{'max ms':>10}")
+        for term in TERMS:
+            for name, build in backends:
+                timings = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    queryset = build(term)
+                    count = queryset.count()
+                    list(queryset[:page_size])
+                    timings.append((time.perf_counter() - started) * 1000)
+                self.stdout.write(
+                    f'{term:<16}{name:<12}{count:>10}'
+                    f'{statistics.median(timings):>12.1f}{max(timings):>10.1f}'
+                )
@@ -0,0 +1,78 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from transactions.fastpath import ValuesRepresentation
+from transactions.models import Transaction
+from transactions.renderers import ORJSONRenderer, orjson
+from transactions.serializers import TransactionSerializer
+
+RENDERERS = [
+    ('json', JSONRenderer()),
+    ('orjson', ORJSONRenderer()),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare building and rendering transaction pages through '
+        'TransactionSerializer with the values() fast path, each rendered '
+        'by JSONRenderer and by ORJSONRenderer'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('user', help='Username whose transactions are serialized')
+        parser.add_argument('--page-size', type=int, default=1000, help='Rows per page')
+        parser.add_argument('--pages', type=int, default=10, help='Pages per path')
+        parser.add_argument('--repeat', type=int, default=3, help='Rounds over the pages')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"Unknown user '{options['user']}'")
+        if orjson is None:
+            self.stderr.write('orjson is not installed; ORJSONRenderer falls back to JSONRenderer')
+
+        queryset = Transaction.objects.filter(user=user).order_by('-date', '-created_at', '-id')
+        size = options['page_size']
+        pages = [(index * size, (index + 1) * size) for index in range(options['pages'])]
+        representation = ValuesRepresentation(TransactionSerializer())
+
+        def serializer_page(start, stop):
+            page = list(queryset.select_related('category')[start:stop])
+            return TransactionSerializer(page, many=True).data
+
+        def values_page(start, stop):
+            return representation.to_representation(representation.values(queryset)[start:stop])
+
+        self.stdout.write(
+            f"{'path':<12}{'renderer':<10}{'build ms':>10}{'render ms':>11}"
+            f"{'total ms':>10}{'rows/s':>10}{'bytes':>10}"
+        )
+        for path, build in (('serializer', serializer_page), ('values', values_page)):
+            for name, renderer in RENDERERS:
+                build_times, render_times, rows, size_bytes = [], [], 0, 0
+                for _ in range(options['repeat']):
+                    for start, stop in pages:
+                        started = time.perf_counter()
+                        data = build(start, stop)
+                        built = time.perf_counter()
+                        content = renderer.render(data)
+                        build_times.append(built - started)
+                        render_times.append(time.perf_counter() - built)
+                        rows += len(data)
+                        size_bytes = max(size_bytes, len(content))
+                if not rows:
+                    raise CommandError('The user has no transactions')
+
+                build_ms = statistics.median(build_times) * 1000
+                render_ms = statistics.median(render_times) * 1000
+                throughput = rows / (sum(build_times) + sum(render_times))
+                self.stdout.write(
+                    f'{path:<12}{name:<10}{build_ms:>10.1f}{render_ms:>11.1f}'
+                    f'{build_ms + render_ms:>10.1f}{throughput:>10.0f}{size_bytes:>10}'
+                )
@@ -0,0 +1,142 @@
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.models import Count, Sum
+
+from transactions.models import Transaction
+from transactions.periods import add_months
+from transactions.retries import is_locked_error, run_write
+from transactions.synthetic import generate_ledger
+from transactions.views import _build_dashboard
+
+# Per-connection settings of each profile; journal_mode is per database
+# file and is switched once before a phase starts
+PROFILES = [
+    ('rollback journal', {'journal_mode': 'DELETE', 'synchronous': 'FULL'}, None),
+    ('production', settings.SQLITE_PRAGMAS, 'IMMEDIATE'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Run concurrent readers (dashboard and month summary) and writers '
+        '(transaction creates) against the SQLite database, first in '
+        'rollback-journal mode and then with the production profile'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000, help='Transactions in the generated ledger')
+        parser.add_argument('--readers', type=int, default=4, help='Reader threads')
+        parser.add_argument('--writers', type=int, default=2, help='Writer threads')
+        parser.add_argument('--seconds', type=float, default=10, help='Duration of each phase')
+
+    def handle(self, *args, **options):
+        name = str(connection.settings_dict['NAME'])
+        if connection.vendor != 'sqlite' or name == ':memory:' or 'mode=memory' in name:
+            raise CommandError('benchmark_sqlite needs a file-based SQLite database')
+        self.stdout.write(f'Database: {name}')
+
+        original_mode = self.pragma(connection, 'journal_mode')
+        user = generate_ledger(f'benchmark-sqlite-{int(time.time())}', transactions=options['rows'], seed=1)
+        try:
+            self.stdout.write(
+                f"{'profile':<18}{'reads/s':>9}{'writes/s':>10}{'read p95 ms':>13}"
+                f"{'write p95 ms':>14}{'locked':>8}"
+            )
+            for profile in PROFILES:
+                self.run_phase(user, profile, options)
+        finally:
+            connection.close()
+            self.pragma(connection, 'journal_mode', original_mode)
+            user.delete()
+
+    def pragma(self, conn, name, value=None):
+        with conn.cursor() as cursor:
+            if value is None:
+                cursor.execute(f'PRAGMA {name}')
+            else:
+                cursor.execute(f'PRAGMA {name}={value}')
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def run_phase(self, user, profile, options):
+        label, pragmas, transaction_mode = profile
+        connection.close()
+        self.pragma(connection, 'journal_mode', pragmas['journal_mode'])
+        connection.close()
+
+        stats = {'reads': [], 'writes': [], 'locked': 0}
+        lock = threading.Lock()
+        stop = time.perf_counter() + options['seconds']
+
+        def worker(operation):
+            for pragma, value in pragmas.items():
+                if pragma != 'journal_mode':
+                    self.pragma(connection, pragma, value)
+            connection.transaction_mode = transaction_mode
+            try:
+                while time.perf_counter() < stop:
+                    started = time.perf_counter()
+                    try:
+                        kind = operation()
+                    except OperationalError as e:
+                        if not is_locked_error(e):
+                            raise
+                        with lock:
+                            stats['locked'] += 1
+                        continue
+                    with lock:
+                        stats[kind].append((time.perf_counter() - started) * 1000)
+            finally:
+                connection.close()
+
+        sequence = iter(range(10 ** 9))
+
+        def read():
+            today = date.today()
+            month = today.replace(day=1)
+            _build_dashboard(user, month)
+            list(
+                Transaction.objects
+                .filter(user=user, date__gte=month, date__lt=add_months(month, 1))
+                .values('type')
+                .annotate(total=Sum('amount'), count=Count('id'))
+                .order_by()
+            )
+            return 'reads'
+
+        def write():
+            run_write(
+                Transaction.objects.create,
+                user=user,
+                type=Transaction.EXPENSE,
+                amount=Decimal('9.99'),
+                date=date.today(),
+                description=f'Concurrent write {next(sequence)}'
+            )
+            return 'writes'
+
+        threads = [threading.Thread(target=worker, args=(read,)) for _ in range(options['readers'])]
+        threads += [threading.Thread(target=worker, args=(write,)) for _ in range(options['writers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.stdout.write(
+            f"{label:<18}{len(stats['reads']) / options['seconds']:>9.1f}"
+            f"{len(stats['writes']) / options['seconds']:>10.1f}"
+            f"{self.p95(stats['reads']):>13.1f}{self.p95(stats['writes']):>14.1f}"
+            f"{stats['locked']:>8}"
+        )
+
+    def p95(self, samples):
+        if not samples:
+            return 0.0
+        samples = sorted(samples)
+        return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
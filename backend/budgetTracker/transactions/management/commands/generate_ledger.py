@@ -0,0 +1,48 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions.synthetic import generate_ledger
+
+
+class Command(BaseCommand):
+    help = 'Create users with synthetic categories, budgets and transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1, help='Number of users to create')
+        parser.add_argument('--prefix', default='ledger', help='Usernames are <prefix>-<n>')
+        parser.add_argument('--transactions', type=int, default=10000, help='Transactions per user')
+        parser.add_argument('--categories', type=int, default=12, help='Categories per user')
+        parser.add_argument('--budgets', type=int, default=12, help='Monthly budgets per user (most recent months)')
+        parser.add_argument('--months', type=int, default=24, help='Months of history, ending today')
+        parser.add_argument('--seed', type=int, help='Random seed for reproducible ledgers')
+        parser.add_argument('--replace', action='store_true', help='Delete existing users with the same names first')
+
+    def handle(self, *args, **options):
+        if options['months'] < 1 or options['categories'] < 2:
+            raise CommandError('Need at least one month and two categories')
+
+        usernames = [f"{options['prefix']}-{index + 1}" for index in range(options['users'])]
+        existing = User.objects.filter(username__in=usernames)
+        if existing.exists():
+            if not options['replace']:
+                names = ', '.join(existing.values_list('username', flat=True))
+                raise CommandError(f'Users already exist: {names} (use --replace)')
+            existing.delete()
+
+        for index, username in enumerate(usernames):
+            started = time.perf_counter()
+            seed = None if options['seed'] is None else options['seed'] + index
+            generate_ledger(
+                username,
+                transactions=options['transactions'],
+                categories=options['categories'],
+                budgets=options['budgets'],
+                months=options['months'],
+                seed=seed
+            )
+            self.stdout.write(
+                f"Created {username}: {options['transactions']} transactions "
+                f'in {time.perf_counter() - started:.1f}s'
+            )
@@ -0,0 +1,65 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions.importers import (
+    FORMATS, IMPORT_FIELDS, ImportFileError, TransactionImporter, guess_format, parse
+)
+
+
+class Command(BaseCommand):
+    help = 'Import a CSV, OFX or QIF bank statement into a user\'s transactions'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Statement file to import')
+        parser.add_argument('--user', required=True, help='Username to import into')
+        parser.add_argument('--format', choices=FORMATS, help='File format (default: from extension)')
+        parser.add_argument(
+            '--map',
+            action='append',
+            default=[],
+            metavar='FIELD=COLUMN',
+            help=f"CSV column for a field ({', '.join(IMPORT_FIELDS)}), repeatable"
+        )
+        parser.add_argument('--date-format', help='strptime format for dates, e.g. %%d/%%m/%%Y')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--no-create-categories',
+            action='store_true',
+            help='Reject rows whose category does not exist instead of creating it'
+        )
+    
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"Unknown user '{options['user']}'")
+        
+        mapping = {}
+        for item in options['map']:
+            field, sep, column = item.partition('=')
+            if not sep or field not in IMPORT_FIELDS:
+                raise CommandError(f"Invalid --map '{item}'")
+            mapping[field] = column
+        
+        importer = TransactionImporter(
+            user,
+            batch_size=options['batch_size'],
+            date_format=options['date_format'],
+            create_categories=not options['no_create_categories']
+        )
+        
+        try:
+            file_format = options['format'] or guess_format(options['path'])
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                result = importer.run(parse(stream, file_format, mapping))
+        except (ImportFileError, OSError) as e:
+            raise CommandError(str(e))
+        
+        for error in result.errors:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        if result.error_count > len(result.errors):
+            self.stderr.write(f'... {result.error_count - len(result.errors)} more errors')
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.created} transactions ({result.error_count} rows rejected)'
+        ))
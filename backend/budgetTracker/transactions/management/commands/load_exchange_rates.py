@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions import fx
+
+
+class Command(BaseCommand):
+    help = (
+        'Load exchange rates from a CSV file (date,currency,rate rows, or a '
+        'date column followed by one column per currency as in the ECB\'s '
+        'eurofxref-hist.csv) and store their monthly averages'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file of rates against the reference currency')
+        parser.add_argument(
+            '--reference',
+            default='EUR',
+            help='Currency the rates in the file are quoted against'
+        )
+        parser.add_argument(
+            '--replace',
+            action='store_true',
+            help='Delete every stored rate first (required to change the reference)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            reference = fx.normalize_code(options['reference'])
+            with open(options['path'], newline='', encoding='utf-8-sig') as stream:
+                rates = fx.read_rates(stream, reference)
+        except OSError as e:
+            raise CommandError(f"Cannot read {options['path']}: {e.strerror}")
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if not rates:
+            raise CommandError('The file holds no rates')
+
+        try:
+            stored = fx.load_rates(rates, reference, replace=options['replace'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        currencies = len({code for code, _ in rates})
+        months = len({month for _, month in rates})
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {stored} monthly rates for {currencies} currencies over {months} months'
+        ))
@@ -0,0 +1,328 @@
+"""
+Request metrics in the Prometheus text format
+
+MetricsMiddleware records, per route (URL name), the request latency,
+the number of database queries and their total time, and the time
+spent in serializers' to_representation. caching.get_or_set() counts
+aggregate cache hits and misses. /api/metrics/ renders everything.
+
+Queries are attributed to the request through a context variable, so
+queries that async views run on other threads are counted as well.
+The registry lives in process memory: with several server workers each
+scrape sees the worker that answered it.
+"""
+import contextvars
+import hmac
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'budgettracker'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+# Statements kept per request for the slow-request log
+MAX_RECORDED_QUERIES = 200
+SLOW_LOG_QUERIES = 5
+
+# request.auth for requests authenticated with METRICS_TOKEN
+SCRAPER_AUTH = 'metrics-token'
+
+current_request = contextvars.ContextVar('transactions_metrics_request', default=None)
+
+
+class Histogram:
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.samples = {}
+
+    def observe(self, labels, value):
+        sample = self.samples.get(labels)
+        if sample is None:
+            sample = self.samples[labels] = [[0] * len(self.buckets), 0.0, 0]
+        counts = sample[0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+        sample[1] += value
+        sample[2] += 1
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} histogram',
+        ]
+        for labels, (counts, total, count) in sorted(self.samples.items()):
+            label_text = _labels(self.labelnames, labels)
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {count}')
+        return lines
+
+
+class Counter:
+
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.samples = {}
+
+    def inc(self, labels, amount=1):
+        self.samples[labels] = self.samples.get(labels, 0) + amount
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} counter',
+        ]
+        for labels, value in sorted(self.samples.items()):
+            lines.append(f'{self.name}{{{_labels(self.labelnames, labels)}}} {value}')
+        return lines
+
+
+def _labels(names, values):
+    return ','.join(
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values)
+    )
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Registry:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        route = ('route', 'method')
+        self.request_duration = Histogram(
+            f'{PREFIX}_http_request_duration_seconds',
+            'Request latency by route',
+            ('route', 'method', 'status'),
+            LATENCY_BUCKETS
+        )
+        self.db_queries = Histogram(
+            f'{PREFIX}_http_request_db_queries',
+            'Database queries per request',
+            route,
+            QUERY_COUNT_BUCKETS
+        )
+        self.db_time = Histogram(
+            f'{PREFIX}_http_request_db_seconds',
+            'Time spent in database queries per request',
+            route,
+            LATENCY_BUCKETS
+        )
+        self.serializer_time = Histogram(
+            f'{PREFIX}_http_request_serializer_seconds',
+            'Time spent serializing responses per request',
+            route,
+            LATENCY_BUCKETS
+        )
+        self.cache_requests = Counter(
+            f'{PREFIX}_aggregate_cache_requests_total',
+            'Aggregate cache lookups by cache key prefix and result',
+            ('prefix', 'result')
+        )
+
+    def observe_request(self, route, method, status, duration, stats):
+        with self.lock:
+            self.request_duration.observe((route, method, str(status)), duration)
+            self.db_queries.observe((route, method), stats.queries)
+            self.db_time.observe((route, method), stats.db_time)
+            self.serializer_time.observe((route, method), stats.serializer_time)
+
+    def record_cache(self, prefix, hit):
+        with self.lock:
+            self.cache_requests.inc((prefix, 'hit' if hit else 'miss'))
+
+    def render(self):
+        with self.lock:
+            lines = []
+            for metric in (self.request_duration, self.db_queries, self.db_time,
+                           self.serializer_time, self.cache_requests):
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class RequestStats:
+    """Per-request counters, shared by every thread working on the request"""
+
+    def __init__(self, record_sql=False):
+        self.lock = threading.Lock()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+        self.record_sql = record_sql
+        self.statements = []
+
+    def add_query(self, sql, duration):
+        with self.lock:
+            self.queries += 1
+            self.db_time += duration
+            if self.record_sql and len(self.statements) < MAX_RECORDED_QUERIES:
+                self.statements.append((duration, sql))
+
+
+def record_cache(prefix, hit):
+    if current_request.get() is not None:
+        REGISTRY.record_cache(prefix, hit)
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add_query(sql, time.perf_counter() - started)
+
+
+def _instrument(sender=None, connection=None, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def instrument_connections():
+    """Wrap every current and future database connection"""
+    connection_created.connect(_instrument, dispatch_uid='transactions.metrics')
+    for connection in connections.all(initialized_only=True):
+        _instrument(connection=connection)
+
+
+@contextmanager
+def timed_serialization():
+    """
+    Adds the time spent in the block to the request stats, for output
+    built without a serializer (transactions.fastpath)
+    """
+    stats = current_request.get()
+    if stats is None or stats.serializing:
+        yield
+        return
+
+    stats.serializing = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serializing = False
+        stats.serializer_time += time.perf_counter() - started
+
+
+class TimedSerializerMixin:
+    """Adds the outermost to_representation() time to the request stats"""
+
+    def to_representation(self, instance):
+        stats = current_request.get()
+        if stats is None or stats.serializing:
+            return super().to_representation(instance)
+
+        stats.serializing = True
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            stats.serializing = False
+            stats.serializer_time += time.perf_counter() - started
+
+
+def route_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+class MetricsMiddleware:
+    """
+    Records latency, query count, DB time and serializer time per route
+    Requests slower than SLOW_REQUEST_THRESHOLD_MS are logged with their
+    slowest SQL statements
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        instrument_connections()
+
+    def __call__(self, request):
+        threshold = settings.SLOW_REQUEST_THRESHOLD_MS
+        stats = RequestStats(record_sql=bool(threshold))
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        duration = time.perf_counter() - started
+
+        route = route_label(request)
+        REGISTRY.observe_request(route, request.method, response.status_code, duration, stats)
+        if threshold and duration * 1000 >= threshold:
+            self.log_slow_request(request, route, response, duration, stats)
+        return response
+
+    def log_slow_request(self, request, route, response, duration, stats):
+        slowest = sorted(stats.statements, key=lambda statement: statement[0], reverse=True)
+        statements = '\n'.join(
+            f'  {query_time * 1000:.1f} ms: {sql}'
+            for query_time, sql in slowest[:SLOW_LOG_QUERIES]
+        )
+        logger.warning(
+            'Slow request %s %s (%s) -> %s in %.1f ms: %d queries, %.1f ms in the database, '
+            '%.1f ms serializing\n%s',
+            request.method, request.get_full_path(), route, response.status_code,
+            duration * 1000, stats.queries, stats.db_time * 1000,
+            stats.serializer_time * 1000, statements
+        )
+
+
+class MetricsTokenAuthentication(BaseAuthentication):
+    """
+    Accepts `Authorization: Bearer <METRICS_TOKEN>` for scrapers
+    request.auth is then SCRAPER_AUTH and request.user anonymous; any
+    other header is left to the next authentication class
+    """
+
+    def authenticate(self, request):
+        token = settings.METRICS_TOKEN
+        if not token:
+            return None
+        header = get_authorization_header(request).split()
+        if len(header) != 2 or header[0].lower() != b'bearer':
+            return None
+        if not hmac.compare_digest(header[1], token.encode()):
+            return None
+        return AnonymousUser(), SCRAPER_AUTH
+
+    def authenticate_header(self, request):
+        return 'Bearer realm="metrics"'
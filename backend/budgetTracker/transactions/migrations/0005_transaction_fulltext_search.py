@@ -0,0 +1,115 @@
+from django.db import migrations
+
+SQLITE_SCHEMA = [
+    """CREATE VIRTUAL TABLE transactions_transaction_fts USING fts5(
+        user_key,
+        description,
+        category,
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )""",
+    """CREATE TRIGGER transactions_transaction_fts_ai
+        AFTER INSERT ON transactions_transaction BEGIN
+            INSERT INTO transactions_transaction_fts(rowid, user_key, description, category)
+            VALUES (
+                new.id, 'u' || new.user_id, new.description,
+                (SELECT name FROM transactions_category WHERE id = new.category_id)
+            );
+        END""",
+    """CREATE TRIGGER transactions_transaction_fts_ad
+        AFTER DELETE ON transactions_transaction BEGIN
+            DELETE FROM transactions_transaction_fts WHERE rowid = old.id;
+        END""",
+    """CREATE TRIGGER transactions_transaction_fts_au
+        AFTER UPDATE OF user_id, description, category_id ON transactions_transaction BEGIN
+            DELETE FROM transactions_transaction_fts WHERE rowid = old.id;
+            INSERT INTO transactions_transaction_fts(rowid, user_key, description, category)
+            VALUES (
+                new.id, 'u' || new.user_id, new.description,
+                (SELECT name FROM transactions_category WHERE id = new.category_id)
+            );
+        END""",
+    """CREATE TRIGGER transactions_category_fts_au
+        AFTER UPDATE OF name ON transactions_category BEGIN
+            UPDATE transactions_transaction_fts SET category = new.name
+            WHERE rowid IN (
+                SELECT id FROM transactions_transaction WHERE category_id = new.id
+            );
+        END""",
+    """INSERT INTO transactions_transaction_fts(rowid, user_key, description, category)
+        SELECT t.id, 'u' || t.user_id, t.description, c.name
+        FROM transactions_transaction t
+        LEFT JOIN transactions_category c ON c.id = t.category_id""",
+]
+
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS transactions_transaction_fts_ai',
+    'DROP TRIGGER IF EXISTS transactions_transaction_fts_ad',
+    'DROP TRIGGER IF EXISTS transactions_transaction_fts_au',
+    'DROP TRIGGER IF EXISTS transactions_category_fts_au',
+    'DROP TABLE IF EXISTS transactions_transaction_fts',
+]
+
+POSTGRES_SCHEMA = [
+    """ALTER TABLE transactions_transaction
+        ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('simple', coalesce(description, ''))) STORED""",
+    """CREATE INDEX IF NOT EXISTS transaction_search_vector_gin
+        ON transactions_transaction USING GIN (search_vector)""",
+]
+
+POSTGRES_DROP = [
+    'DROP INDEX IF EXISTS transaction_search_vector_gin',
+    'ALTER TABLE transactions_transaction DROP COLUMN IF EXISTS search_vector',
+]
+
+
+def sqlite_has_fts5(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        enabled = cursor.fetchone()[0]
+    if enabled:
+        return True
+    # Loadable builds report 0 but still ship the module
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pragma_module_list WHERE name = 'fts5'")
+        return cursor.fetchone() is not None
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        if not sqlite_has_fts5(connection):
+            return
+        statements = SQLITE_SCHEMA
+    elif connection.vendor == 'postgresql':
+        statements = POSTGRES_SCHEMA
+    else:
+        return
+
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        statements = SQLITE_DROP
+    elif connection.vendor == 'postgresql':
+        statements = POSTGRES_DROP
+    else:
+        return
+
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0004_transaction_keyset_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
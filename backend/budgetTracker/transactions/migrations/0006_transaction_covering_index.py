@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0005_transaction_fulltext_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='transaction_user_id_8af7f1_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='transaction_user_id_4685bf_idx',
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'date', 'type', 'category', 'amount'], name='transaction_user_date_cov_idx'),
+        ),
+    ]
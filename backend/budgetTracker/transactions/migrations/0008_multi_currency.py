@@ -0,0 +1,127 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:55
+
+import importlib
+
+import django.db.models.deletion
+import transactions.models
+from django.conf import settings
+from django.db import migrations, models
+
+search = importlib.import_module('transactions.migrations.0005_transaction_fulltext_search')
+
+# SQLite rebuilds transactions_transaction to add a NOT NULL column,
+# which the full-text search triggers on it (or reading it) would block
+SEARCH_TRIGGERS = [
+    statement for statement in search.SQLITE_SCHEMA
+    if statement.startswith('CREATE TRIGGER')
+]
+DROP_SEARCH_TRIGGERS = [
+    statement for statement in search.SQLITE_DROP
+    if statement.startswith('DROP TRIGGER')
+]
+
+
+def has_search_index(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transactions_transaction_fts'"
+        )
+        return cursor.fetchone() is not None
+
+
+def drop_search_triggers(apps, schema_editor):
+    if has_search_index(schema_editor.connection):
+        for statement in DROP_SEARCH_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+def restore_search_triggers(apps, schema_editor):
+    if has_search_index(schema_editor.connection):
+        for statement in SEARCH_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('transactions', '0007_archivedtransaction'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_search_triggers, restore_search_triggers),
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3)),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('rate', models.FloatField()),
+            ],
+            options={
+                'ordering': ['currency', '-month'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='profile', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('base_currency', models.CharField(default=transactions.models.default_currency, help_text='Currency totals and budgets are reported in', max_length=3)),
+            ],
+        ),
+        migrations.RemoveConstraint(
+            model_name='monthlyrollup',
+            name='unique_rollup_with_category',
+        ),
+        migrations.RemoveConstraint(
+            model_name='monthlyrollup',
+            name='unique_rollup_without_category',
+        ),
+        migrations.RemoveIndex(
+            model_name='archivedtransaction',
+            name='archived_user_date_cov_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='transaction_user_date_cov_idx',
+        ),
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='currency',
+            field=models.CharField(default=transactions.models.default_currency, max_length=3),
+        ),
+        migrations.AddField(
+            model_name='monthlyrollup',
+            name='currency',
+            field=models.CharField(default=transactions.models.default_currency, max_length=3),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='currency',
+            field=models.CharField(default=transactions.models.default_currency, help_text='ISO 4217 code of the amount', max_length=3),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtransaction',
+            index=models.Index(fields=['user', 'date', 'type', 'category', 'amount', 'currency'], name='archived_user_date_cov_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'date', 'type', 'category', 'amount', 'currency'], name='transaction_user_date_cov_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='monthlyrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('category__isnull', False)), fields=('user', 'month', 'type', 'category', 'currency'), name='unique_rollup_with_category'),
+        ),
+        migrations.AddConstraint(
+            model_name='monthlyrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('user', 'month', 'type', 'currency'), name='unique_rollup_without_category'),
+        ),
+        migrations.AddConstraint(
+            model_name='exchangerate',
+            constraint=models.UniqueConstraint(fields=('currency', 'month'), name='unique_exchange_rate'),
+        ),
+        migrations.RunPython(restore_search_triggers, drop_search_triggers),
+    ]
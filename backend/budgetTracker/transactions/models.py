@@ -1,8 +1,38 @@
 from django.db import models
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 
+def default_currency():
+    return settings.DEFAULT_CURRENCY
+
+
+class CategoryQuerySet(models.QuerySet):
+    
+    def with_transaction_count(self):
+        """
+        Annotate each category with its number of transactions, archived
+        ones included (two counting subqueries: joining both tables would
+        multiply the rows)
+        """
+        from django.db.models import Count, OuterRef, Subquery
+        from django.db.models.functions import Coalesce
+        
+        def count(model):
+            return Coalesce(Subquery(
+                model.objects.filter(category=OuterRef('pk'))
+                .order_by()
+                .values('category')
+                .annotate(count=Count('id'))
+                .values('count')
+            ), 0)
+        
+        return self.annotate(
+            annotated_transaction_count=count(Transaction) + count(ArchivedTransaction)
+        )
+
+
 class Category(models.Model):
     """
     Categories for income and expenses
@@ -28,6 +58,8 @@ class Category(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = CategoryQuerySet.as_manager()
+    
     class Meta:
         verbose_name_plural = 'Categories'
         ordering = ['name']
@@ -69,26 +101,125 @@ class Transaction(models.Model):
         decimal_places=2,
         validators=[MinValueValidator(Decimal('0.01'))]
     )
+    currency = models.CharField(
+        max_length=3,
+        default=default_currency,
+        help_text="ISO 4217 code of the amount"
+    )
     description = models.TextField(blank=True)
     date = models.DateField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
-        ordering = ['-date', '-created_at']
+        ordering = ['-date', '-created_at', '-id']
         indexes = [
-            models.Index(fields=['user', 'date']),
-            models.Index(fields=['user', 'type']),
+            # Covering index for the row-level aggregates: every column the
+            # summary and by-category queries read is in the index, so
+            # date-range sums never touch the table itself. It also serves
+            # type filters, which is why there is no separate (user, type)
+            models.Index(
+                fields=['user', 'date', 'type', 'category', 'amount', 'currency'],
+                name='transaction_user_date_cov_idx'
+            ),
             models.Index(fields=['user', 'category']),
+            models.Index(
+                fields=['user', '-date', '-created_at', '-id'],
+                name='transaction_user_keyset_idx'
+            ),
         ]
     
     def __str__(self):
         return f"{self.type}: {self.amount} - {self.description[:30]}"
 
 
+class ArchivedTransaction(models.Model):
+    """
+    Transactions moved out of the Transaction table by
+    `manage.py archive_transactions`
+    Rows keep their original id; their totals stay in MonthlyRollup
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_transactions'
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='archived_transactions'
+    )
+    type = models.CharField(
+        max_length=10,
+        choices=Transaction.TYPE_CHOICES
+    )
+    amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2
+    )
+    currency = models.CharField(max_length=3, default=default_currency)
+    description = models.TextField(blank=True)
+    date = models.DateField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-date', '-created_at', '-id']
+        indexes = [
+            models.Index(
+                fields=['user', 'date', 'type', 'category', 'amount', 'currency'],
+                name='archived_user_date_cov_idx'
+            ),
+            models.Index(
+                fields=['user', '-date', '-created_at', '-id'],
+                name='archived_user_keyset_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.type}: {self.amount} - {self.description[:30]} (archived)"
+
+
+class BudgetQuerySet(models.QuerySet):
+    
+    def with_actual_expenses(self, base_currency=None):
+        """
+        Annotate each budget with its month's expenses in the same query
+        so get_actual_expenses() and friends need no extra round trips
+        Pass the user's base currency when every budget is theirs (see
+        fx.as_base()); otherwise each budget's own user's is looked up
+        """
+        from django.db.models import OuterRef, Subquery, Value
+        from django.db.models.functions import Coalesce
+        from .fx import converted_sum
+        
+        expenses = (
+            MonthlyRollup.objects
+            .filter(
+                user=OuterRef('user'),
+                month=OuterRef('month'),
+                type=Transaction.EXPENSE
+            )
+            .order_by()
+            .values('user')
+            .annotate(total=converted_sum('total', 'month', base_currency))
+            .values('total')
+        )
+        return self.annotate(
+            annotated_actual_expenses=Coalesce(
+                Subquery(expenses, output_field=models.DecimalField(max_digits=14, decimal_places=2)),
+                Value(Decimal('0.00')),
+                output_field=models.DecimalField(max_digits=14, decimal_places=2)
+            )
+        )
+
+
 class Budget(models.Model):
     """
-    Monthly budget for users
+    Monthly budget for users, in their base currency
     """
     user = models.ForeignKey(
         User,
@@ -106,6 +237,8 @@ class Budget(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = BudgetQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-month']
         unique_together = ['user', 'month']
@@ -114,17 +247,23 @@ class Budget(models.Model):
         return f"Budget for {self.month.strftime('%B %Y')}: ${self.amount}"
     
     def get_actual_expenses(self):
-        """Calculate actual expenses for this budget month"""
-        from django.db.models import Sum
+        """
+        Calculate actual expenses for this budget month, in the user's
+        base currency
+        Uses the with_actual_expenses() annotation when present; otherwise
+        the result of the first lookup is kept on the instance
+        """
+        from .fx import base_currency, converted_sum
         
-        expenses = Transaction.objects.filter(
-            user=self.user,
-            type=Transaction.EXPENSE,
-            date__year=self.month.year,
-            date__month=self.month.month
-        ).aggregate(total=Sum('amount'))
+        if getattr(self, 'annotated_actual_expenses', None) is None:
+            expenses = MonthlyRollup.objects.filter(
+                user_id=self.user_id,
+                type=Transaction.EXPENSE,
+                month=self.month.replace(day=1)
+            ).aggregate(total=converted_sum('total', 'month', base_currency(self.user_id)))
+            self.annotated_actual_expenses = expenses['total'] or Decimal('0.00')
         
-        return expenses['total'] or Decimal('0.00')
+        return self.annotated_actual_expenses
     
     def get_remaining(self):
         """Calculate remaining budget"""
@@ -135,4 +274,124 @@ class Budget(models.Model):
         actual = self.get_actual_expenses()
         if self.amount > 0:
             return float((actual / self.amount) * 100)
-        return 0.0
\ No newline at end of file
+        return 0.0
+
+
+class MonthlyRollup(models.Model):
+    """
+    Pre-aggregated transaction totals per user, month, type, category
+    and currency; `total` is in that currency
+    Kept up to date by the signal handlers in transactions.signals
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='monthly_rollups'
+    )
+    month = models.DateField(
+        help_text="First day of the month"
+    )
+    type = models.CharField(
+        max_length=10,
+        choices=Transaction.TYPE_CHOICES
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='monthly_rollups'
+    )
+    currency = models.CharField(max_length=3, default=default_currency)
+    total = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00')
+    )
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-month', 'type']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'month', 'type', 'category', 'currency'],
+                condition=models.Q(category__isnull=False),
+                name='unique_rollup_with_category'
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'month', 'type', 'currency'],
+                condition=models.Q(category__isnull=True),
+                name='unique_rollup_without_category'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'month']),
+        ]
+    
+    def __str__(self):
+        return f"{self.type} {self.month.strftime('%B %Y')}: {self.total} ({self.count})"
+
+
+
+class DataVersion(models.Model):
+    """
+    Per-user counter bumped on every Category, Transaction or Budget write
+    Cache keys embed it so cached aggregates never outlive the data
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='data_version'
+    )
+    version = models.PositiveBigIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Data version {self.version} for {self.user}"
+
+
+class ExchangeRate(models.Model):
+    """
+    Monthly average exchange rates, loaded from a file by
+    `manage.py load_exchange_rates`
+    `rate` is units of `currency` per unit of the file's reference
+    currency, which is stored with a rate of 1
+    """
+    currency = models.CharField(max_length=3)
+    month = models.DateField(
+        help_text="First day of the month"
+    )
+    rate = models.FloatField()
+    
+    class Meta:
+        ordering = ['currency', '-month']
+        constraints = [
+            # Also the index the conversion subqueries seek on
+            models.UniqueConstraint(
+                fields=['currency', 'month'],
+                name='unique_exchange_rate'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.currency} {self.month.strftime('%B %Y')}: {self.rate}"
+
+
+class Profile(models.Model):
+    """
+    Per-user preferences; users without a row get the defaults
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='profile'
+    )
+    base_currency = models.CharField(
+        max_length=3,
+        default=default_currency,
+        help_text="Currency totals and budgets are reported in"
+    )
+    
+    def __str__(self):
+        return f"Profile of {self.user}"
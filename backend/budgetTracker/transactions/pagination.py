@@ -0,0 +1,162 @@
+import base64
+import json
+from datetime import date, datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class StandardPageNumberPagination(PageNumberPagination):
+    """Page-number pagination with a client-selectable page size"""
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class TransactionCursorPagination(BasePagination):
+    """
+    Keyset pagination over (-date, -created_at, -id)
+
+    Each cursor stores the sort key of the row it starts after, so pages
+    are fetched with an index range scan instead of OFFSET, there is no
+    COUNT(*), and rows inserted while a client is paging never shift or
+    duplicate the results of later pages.
+
+    The keyset only works for that one order, so an ?ordering= other than
+    it (or a prefix of it) is rejected with a 400 rather than ignored.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-date', '-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.check_ordering(request)
+
+        reverse, position = self.decode_cursor(request)
+        self.reverse = reverse
+        self.position = position
+
+        if reverse:
+            queryset = queryset.order_by(*[field.lstrip('-') for field in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if position is not None:
+            queryset = queryset.filter(self.keyset_filter(position, reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        self.has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        if reverse:
+            self.has_next = position is not None
+            self.has_previous = self.has_more
+        else:
+            self.has_next = self.has_more
+            self.has_previous = position is not None
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def check_ordering(self, request):
+        param = request.query_params.get(api_settings.ORDERING_PARAM)
+        if not param:
+            return
+        fields = tuple(field.strip() for field in param.split(',') if field.strip())
+        if fields and fields != self.ordering[:len(fields)]:
+            raise ValidationError({
+                'error': f"Cursor pagination only supports ordering={','.join(self.ordering)}; "
+                         f"use page-number pagination for other orders"
+            })
+
+    def keyset_filter(self, position, reverse):
+        """Rows strictly after `position` in the (possibly reversed) ordering"""
+        row_date, created_at, pk = position
+        op = 'gt' if reverse else 'lt'
+        return (
+            Q(**{f'date__{op}': row_date})
+            | Q(date=row_date, **{f'created_at__{op}': created_at})
+            | Q(date=row_date, created_at=created_at, **{f'id__{op}': pk})
+        )
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return False, None
+
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            reverse = bool(payload['r'])
+            position = (
+                date.fromisoformat(payload['d']),
+                datetime.fromisoformat(payload['c']),
+                int(payload['i']),
+            )
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        return reverse, position
+
+    def encode_cursor(self, instance, reverse):
+        # Rows are model instances, or dicts on the values() fast path
+        if isinstance(instance, dict):
+            row_date, created_at, pk = instance['date'], instance['created_at'], instance['id']
+        else:
+            row_date, created_at, pk = instance.date, instance.created_at, instance.pk
+        payload = {
+            'r': int(reverse),
+            'd': row_date.isoformat(),
+            'c': created_at.isoformat(),
+            'i': pk,
+        }
+        encoded = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,114 @@
+"""
+Month/year query params as half-open date ranges
+
+Filtering with date__year / date__month wraps the column in a function,
+so the database cannot use the (user, date, ...) indexes. A calendar
+period is instead turned into `start <= date < end`.
+"""
+from datetime import date, timedelta
+
+
+def add_months(value, months):
+    """First day of the month `months` after the month of `value`"""
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def parse_period(month=None, year=None):
+    """
+    Validate the month/year query params
+    Returns (month, year) as ints or None; raises ValueError when invalid
+    """
+    month = _to_int('month', month, 1, 12)
+    year = _to_int('year', year, 1, 9998)
+    return month, year
+
+
+def _to_int(name, value, lowest, highest):
+    if not value:
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a number')
+    if not lowest <= value <= highest:
+        raise ValueError(f'{name} must be between {lowest} and {highest}')
+    return value
+
+
+def period_range(month=None, year=None):
+    """
+    (start, end) covering a month of a year or a whole year, end exclusive
+    None when there is no year; a month on its own spans every year and
+    has no single range
+    """
+    if year is None:
+        return None
+    if month is None:
+        return date(year, 1, 1), date(year + 1, 1, 1)
+    start = date(year, month, 1)
+    return start, add_months(start, 1)
+
+
+def filter_period(queryset, field, month=None, year=None):
+    """Restrict `field` to the given month/year"""
+    bounds = period_range(month, year)
+    if bounds is not None:
+        return queryset.filter(**{f'{field}__gte': bounds[0], f'{field}__lt': bounds[1]})
+    if month is not None:
+        return queryset.filter(**{f'{field}__month': month})
+    return queryset
+
+
+INTERVALS = ['day', 'week', 'month', 'year']
+
+
+def truncate(value, interval):
+    """Start of the day / ISO week / month / year containing `value`"""
+    if interval == 'week':
+        return value - timedelta(days=value.weekday())
+    if interval == 'month':
+        return value.replace(day=1)
+    if interval == 'year':
+        return value.replace(month=1, day=1)
+    return value
+
+
+def next_period(value, interval):
+    """Start of the period after the one starting at `value`"""
+    if interval == 'day':
+        return value + timedelta(days=1)
+    if interval == 'week':
+        return value + timedelta(weeks=1)
+    if interval == 'month':
+        return add_months(value, 1)
+    return value.replace(year=value.year + 1)
+
+
+def count_periods(start, end, interval):
+    """Number of periods from the one containing `start` to the one containing `end`"""
+    start, end = truncate(start, interval), truncate(end, interval)
+    if interval == 'day':
+        return (end - start).days + 1
+    if interval == 'week':
+        return (end - start).days // 7 + 1
+    if interval == 'month':
+        return (end.year - start.year) * 12 + end.month - start.month + 1
+    return end.year - start.year + 1
+
+
+def period_starts(start, end, interval):
+    """Every period start from the one containing `start` through `end`"""
+    current = truncate(start, interval)
+    while current <= end:
+        yield current
+        current = next_period(current, interval)
+
+
+def parse_month(name, value):
+    """First day of a 'YYYY-MM' (or 'YYYY-MM-DD') param; raises ValueError"""
+    try:
+        year, month = (int(part) for part in value.split('-')[:2])
+        return date(year, month, 1)
+    except (AttributeError, TypeError, ValueError):
+        raise ValueError(f'{name} must be a month like 2024-01')
@@ -1,13 +1,15 @@
 from rest_framework import permissions
 
+from .metrics import SCRAPER_AUTH
+
 class IsOwner(permissions.BasePermission):
     """
     Custom permission to only allow owners of an object to access it.
     """
     
     def has_object_permission(self, request, view, obj):
-        if hasattr(obj, 'user'):
-            return obj.user == request.user
+        if hasattr(obj, 'user_id'):
+            return obj.user_id == request.user.id
         return False
 
 
@@ -20,6 +22,17 @@ class IsAuthenticatedAndOwner(permissions.BasePermission):
         return request.user and request.user.is_authenticated
     
     def has_object_permission(self, request, view, obj):
-        if hasattr(obj, 'user'):
-            return obj.user == request.user
-        return False
\ No newline at end of file
+        if hasattr(obj, 'user_id'):
+            return obj.user_id == request.user.id
+        return False
+
+
+class IsMetricsScraper(permissions.BasePermission):
+    """
+    Metrics are readable with METRICS_TOKEN or by staff users
+    """
+
+    def has_permission(self, request, view):
+        if request.auth == SCRAPER_AUTH:
+            return True
+        return bool(request.user and request.user.is_staff)
@@ -0,0 +1,40 @@
+"""
+JSON rendering with orjson
+
+ORJSONRenderer writes the same documents as DRF's JSONRenderer: orjson
+encodes dicts, lists, strings and numbers in C, and hands everything
+else (Decimal, dates and datetimes, lazy strings) to DRF's own encoder
+so their representation does not change. Indented output (the
+browsable API, ?indent=), ASCII-only output (UNICODE_JSON = False) and
+anything orjson rejects go through JSONRenderer, as does everything
+when orjson is not installed.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+class ORJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Same escaping as JSONRenderer: both are valid JSON but not JavaScript
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
@@ -0,0 +1,61 @@
+"""
+Retries for write requests that find SQLite locked
+
+SQLite allows one writer at a time. With the production profile
+(SQLITE_PRODUCTION) each write transaction starts with BEGIN IMMEDIATE
+and waits SQLITE_BUSY_TIMEOUT seconds for the lock; a request that
+still cannot get it fails with "database is locked". WriteRetryMixin
+runs each write handler in one transaction and, when the lock is the
+reason it failed, rolls it back and runs it again, up to
+SQLITE_WRITE_RETRIES more times.
+"""
+import random
+import time
+from functools import partial
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction as db_transaction
+
+SAFE_METHODS = ('get', 'head', 'options')
+
+# Seconds before the first retry; doubled (with jitter) for each next one
+RETRY_BACKOFF = 0.05
+
+LOCKED_MESSAGES = ('database is locked', 'database table is locked')
+
+
+def is_locked_error(error):
+    return isinstance(error, OperationalError) and any(
+        message in str(error) for message in LOCKED_MESSAGES
+    )
+
+
+def run_write(func, *args, **kwargs):
+    """
+    Call `func` in a transaction, retrying while the database is locked
+    Inside an outer atomic block it runs once, since only the outermost
+    transaction can be retried
+    """
+    retries = settings.SQLITE_WRITE_RETRIES
+    if connection.in_atomic_block:
+        retries = 0
+
+    for attempt in range(retries + 1):
+        try:
+            with db_transaction.atomic():
+                return func(*args, **kwargs)
+        except OperationalError as e:
+            if attempt == retries or not is_locked_error(e):
+                raise
+        time.sleep(RETRY_BACKOFF * 2 ** attempt * random.uniform(1, 1.5))
+
+
+class WriteRetryMixin:
+    """Runs a viewset's unsafe-method handlers through run_write()"""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        method = request.method.lower()
+        handler = getattr(self, method, None)
+        if method not in SAFE_METHODS and handler is not None:
+            setattr(self, method, partial(run_write, handler))
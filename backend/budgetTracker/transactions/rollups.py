@@ -0,0 +1,175 @@
+"""
+Helpers for maintaining MonthlyRollup rows
+
+Rollups hold the running Sum/Count of a user's transactions per
+(month, type, category, currency) so the dashboard and summary endpoints can read
+a handful of pre-aggregated rows instead of scanning the full ledger.
+"""
+from datetime import date
+
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+
+from .caching import bump_all_data_versions, bump_data_version
+from .models import ArchivedTransaction, MonthlyRollup, Transaction
+
+
+def month_start(value):
+    """Return the first day of the month for a date or ISO date string"""
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    return value.replace(day=1)
+
+
+def apply_delta(user_id, month, transaction_type, category_id, currency, amount, count):
+    """
+    Add amount/count to a single rollup bucket
+
+    Creates the bucket when it does not exist yet and removes it again
+    once its last transaction has been subtracted.
+    """
+    bucket = MonthlyRollup.objects.filter(
+        user_id=user_id,
+        month=month,
+        type=transaction_type,
+        category_id=category_id,
+        currency=currency
+    )
+    updated = bucket.update(
+        total=F('total') + amount,
+        count=F('count') + count
+    )
+
+    if updated:
+        if count < 0:
+            bucket.filter(count__lte=0).delete()
+        return
+
+    if count <= 0:
+        return
+
+    try:
+        with db_transaction.atomic():
+            MonthlyRollup.objects.create(
+                user_id=user_id,
+                month=month,
+                type=transaction_type,
+                category_id=category_id,
+                currency=currency,
+                total=amount,
+                count=count
+            )
+    except IntegrityError:
+        # Another request created the bucket in the meantime
+        bucket.update(
+            total=F('total') + amount,
+            count=F('count') + count
+        )
+
+
+def add_transaction(values, sign=1):
+    """
+    Apply a transaction to its rollup bucket
+    `values` is a dict with user_id, date, type, category_id, currency
+    and amount
+    """
+    apply_delta(
+        values['user_id'],
+        month_start(values['date']),
+        values['type'],
+        values['category_id'],
+        values['currency'],
+        values['amount'] * sign,
+        sign
+    )
+
+
+class BucketDeltas:
+    """
+    Accumulates per-bucket totals so bulk write paths, which bypass model
+    signals, touch each rollup bucket once instead of once per row
+    """
+
+    def __init__(self):
+        self.buckets = {}
+
+    def add(self, values, sign=1):
+        key = (
+            values['user_id'],
+            month_start(values['date']),
+            values['type'],
+            values['category_id'],
+            values['currency'],
+        )
+        total, count = self.buckets.get(key, (0, 0))
+        self.buckets[key] = (total + values['amount'] * sign, count + sign)
+
+    def apply(self):
+        for key, (total, count) in self.buckets.items():
+            if total or count:
+                apply_delta(*key, total, count)
+        self.buckets = {}
+
+
+def add_transactions(rows, sign=1):
+    """Apply many transactions at once, one update per touched bucket"""
+    deltas = BucketDeltas()
+    for values in rows:
+        deltas.add(values, sign)
+    deltas.apply()
+
+
+def fold_category(category):
+    """
+    Move a category's rollups into the uncategorised bucket
+    Mirrors the SET_NULL applied to its transactions when it is deleted
+    """
+    for rollup in MonthlyRollup.objects.filter(category=category):
+        apply_delta(
+            rollup.user_id, rollup.month, rollup.type, None,
+            rollup.currency, rollup.total, rollup.count
+        )
+
+
+def rebuild(users=None, batch_size=1000):
+    """
+    Recompute rollups from the Transaction and ArchivedTransaction tables
+    Rebuilds every user when `users` is None; the rebuilt users' cached
+    aggregates are invalidated, as they were computed from the old rows
+    """
+    rollups = MonthlyRollup.objects.all()
+    sources = [Transaction.objects.all(), ArchivedTransaction.objects.all()]
+    if users is not None:
+        rollups = rollups.filter(user__in=users)
+        sources = [source.filter(user__in=users) for source in sources]
+
+    totals = [
+        source
+        .annotate(month=TruncMonth('date'))
+        .values('user_id', 'month', 'type', 'category_id', 'currency')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+        for source in sources
+    ]
+
+    buckets = {}
+    for row in totals[0].union(totals[1], all=True).iterator():
+        key = (row['user_id'], row['month'], row['type'], row['category_id'], row['currency'])
+        if key in buckets:
+            buckets[key].total += row['total']
+            buckets[key].count += row['count']
+        else:
+            buckets[key] = MonthlyRollup(**row)
+
+    with db_transaction.atomic():
+        rollups.delete()
+        created = MonthlyRollup.objects.bulk_create(buckets.values(), batch_size=batch_size)
+
+        if users is None:
+            bump_all_data_versions()
+        else:
+            for user in users:
+                bump_data_version(user.pk)
+
+    return len(created)
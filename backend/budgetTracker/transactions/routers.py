@@ -0,0 +1,87 @@
+"""
+Read-replica routing
+
+With a `replica` database configured (DATABASE_REPLICA_URL), reads made
+while answering a safe request go to the replica once the user is
+known; everything else, including authentication and every write,
+uses `default`.
+
+conditional.evaluate() reads the user's DataVersion from the primary
+and calls route_reads(): a user who wrote within the last
+REPLICA_PIN_SECONDS stays on the primary for the rest of the request,
+so they read their own writes while the replica catches up. The pin
+window should exceed the usual replication lag, since aggregates read
+from the replica are cached under the primary's data version.
+
+ReplicaRoutingMiddleware resets the decision for every request. Bodies
+streamed after the middleware returns (exports) read from the primary.
+"""
+import contextvars
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+REPLICA = 'replica'
+PRIMARY = 'default'
+
+# Models whose reads must see the latest writes
+PRIMARY_ONLY_MODELS = {'transactions.dataversion'}
+
+_replica_reads = contextvars.ContextVar('transactions_replica_reads', default=False)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+def route_reads(updated_at):
+    """
+    Send the rest of this request's reads to the replica unless the
+    user's data changed (`updated_at`) within the pin window
+    """
+    if not replica_configured():
+        return False
+    pinned_since = timezone.now() - timedelta(seconds=settings.REPLICA_PIN_SECONDS)
+    use_replica = updated_at is None or updated_at < pinned_since
+    _replica_reads.set(use_replica)
+    return use_replica
+
+
+def reading_from_replica():
+    return _replica_reads.get()
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower in PRIMARY_ONLY_MODELS:
+            return PRIMARY
+        if _replica_reads.get() and replica_configured():
+            return REPLICA
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives the schema through replication
+        return db == PRIMARY
+
+
+class ReplicaRoutingMiddleware:
+    """Starts every request on the primary"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _replica_reads.set(False)
+        try:
+            return self.get_response(request)
+        finally:
+            _replica_reads.reset(token)
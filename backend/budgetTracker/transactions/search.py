@@ -0,0 +1,117 @@
+"""
+Full-text search over transactions
+
+SQLite keeps an FTS5 table (owner key, description, category name) in
+sync with triggers; PostgreSQL uses a generated tsvector column on the
+description with a GIN index. Both are installed by migration 0005.
+Other backends, or SQLite builds without FTS5, fall back to the plain
+icontains search.
+"""
+import re
+from sqlite3 import sqlite_version_info
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Transaction
+
+FTS_TABLE = 'transactions_transaction_fts'
+SEARCH_VECTOR_COLUMN = 'search_vector'
+TS_CONFIG = 'simple'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def is_available(conn=connection):
+    """True when this database has the full-text index installed"""
+    cached = getattr(conn, '_transaction_fts_available', None)
+    if cached is not None:
+        return cached
+
+    available = False
+    if conn.vendor == 'sqlite':
+        available = FTS_TABLE in conn.introspection.table_names()
+    elif conn.vendor == 'postgresql':
+        with conn.cursor() as cursor:
+            columns = conn.introspection.get_table_description(cursor, Transaction._meta.db_table)
+        available = any(column.name == SEARCH_VECTOR_COLUMN for column in columns)
+
+    conn._transaction_fts_available = available
+    return available
+
+
+def tokenize(term):
+    """Split a user search term into index tokens (drops FTS syntax characters)"""
+    return TOKEN_RE.findall(term.lower())
+
+
+def filter_queryset(queryset, user, token_groups, rank=True, conn=connection):
+    """
+    Keep transactions where every token group prefix-matches the
+    description or the category name; annotate `search_rank` (lower is
+    more relevant) when `rank` is set
+    """
+    if conn.vendor == 'postgresql':
+        return _filter_postgres(queryset, user, token_groups, rank)
+    return _filter_sqlite(queryset, user, token_groups, rank)
+
+
+def _filter_sqlite(queryset, user, token_groups, rank):
+    table = Transaction._meta.db_table
+    clauses = [f'user_key : "u{user.pk}"']
+    for tokens in token_groups:
+        phrase = ' AND '.join(f'"{token}"*' for token in tokens)
+        clauses.append(f'{{description category}} : ({phrase})')
+    match = ' AND '.join(clauses)
+
+    # MATCH runs once to fill the IN list. bm25() can only be read in the
+    # query that runs MATCH, so the rank comes from a materialized CTE
+    # (one more MATCH for the whole statement) looked up by rowid; probing
+    # the FTS table per row with rowid = ? AND MATCH would redo the
+    # prefix expansion for every transaction
+    queryset = queryset.filter(RawSQL(
+        f'{table}.id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)',
+        [match],
+        output_field=BooleanField()
+    ))
+    if rank:
+        # MATERIALIZED needs SQLite 3.35; without it the CTE may be
+        # flattened into the per-row probe, slower but the same result
+        materialized = 'MATERIALIZED ' if sqlite_version_info >= (3, 35) else ''
+        queryset = queryset.annotate(search_rank=RawSQL(
+            f'(WITH hits AS {materialized}('
+            f'SELECT rowid, bm25({FTS_TABLE}, 0.0, 1.0, 0.5) AS rank '
+            f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+            f') SELECT rank FROM hits WHERE hits.rowid = {table}.id)',
+            [match],
+            output_field=FloatField()
+        ))
+    return queryset
+
+
+def _filter_postgres(queryset, user, token_groups, rank):
+    table = Transaction._meta.db_table
+    all_tokens = [token for tokens in token_groups for token in tokens]
+
+    for index, tokens in enumerate(token_groups):
+        hit = f'search_hit_{index}'
+        queryset = queryset.annotate(**{hit: RawSQL(
+            f"{table}.{SEARCH_VECTOR_COLUMN} @@ to_tsquery('{TS_CONFIG}', %s)",
+            [_tsquery(tokens)],
+            output_field=BooleanField()
+        )}).filter(
+            Q(**{hit: True}) | Q(category__name__icontains=' '.join(tokens))
+        )
+
+    if rank:
+        queryset = queryset.annotate(search_rank=RawSQL(
+            f"-ts_rank({table}.{SEARCH_VECTOR_COLUMN}, to_tsquery('{TS_CONFIG}', %s))",
+            [' | '.join(f'{token}:*' for token in all_tokens)],
+            output_field=FloatField()
+        ))
+    return queryset
+
+
+def _tsquery(tokens):
+    return ' & '.join(f'{token}:*' for token in tokens)
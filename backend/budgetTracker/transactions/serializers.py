@@ -1,9 +1,13 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Category, Transaction, Budget
+from django.db import transaction as db_transaction
+from .models import Category, Transaction, Budget, Profile
+from .metrics import TimedSerializerMixin
+from . import fx
+from .sparse import SparseFieldsMixin
 from decimal import Decimal
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, min_length=6)
     
     class Meta:
@@ -18,7 +22,7 @@ class UserSerializer(serializers.ModelSerializer):
         }
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     transaction_count = serializers.SerializerMethodField()
     
     class Meta:
@@ -27,7 +31,12 @@ class CategorySerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
     
     def get_transaction_count(self, obj):
-        return obj.transactions.count()
+        count = getattr(obj, 'annotated_transaction_count', None)
+        if count is None:
+            count = Category.objects.filter(pk=obj.pk).with_transaction_count().values_list(
+                'annotated_transaction_count', flat=True
+            ).get()
+        return count
     
     def validate(self, data):
         request = self.context.get('request')
@@ -49,33 +58,92 @@ class CategorySerializer(serializers.ModelSerializer):
         return category
 
 
-class TransactionSerializer(serializers.ModelSerializer):
+class CategorySummarySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Lightweight nested category for transactions (no per-row queries)"""
+    
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'type']
+        read_only_fields = fields
+
+
+def expand_category(request):
+    """True when the client asked for full category details (?expand=category)"""
+    if request is None:
+        return False
+    expand = request.query_params.get('expand', '')
+    return 'category' in [part.strip() for part in expand.split(',')]
+
+
+class CategoryField(serializers.PrimaryKeyRelatedField):
+    """
+    Category by id; batch writes put the user's categories (by id) in
+    context['categories'] so items resolve them without a query each
+    """
+
+    def to_internal_value(self, data):
+        categories = self.context.get('categories')
+        if categories is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            category = categories.get(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if category is None:
+            raise serializers.ValidationError("Invalid category")
+        return category
+
+
+class TransactionSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    category = CategoryField(queryset=Category.objects.all(), allow_null=True, required=False)
     category_name = serializers.CharField(source='category.name', read_only=True)
-    category_details = CategorySerializer(source='category', read_only=True)
+    category_details = CategorySummarySerializer(source='category', read_only=True)
     
     class Meta:
         model = Transaction
         fields = [
-            'id', 'type', 'amount', 'description', 'date',
+            'id', 'type', 'amount', 'currency', 'description', 'date',
             'category', 'category_name', 'category_details',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
     
+    def get_fields(self):
+        fields = super().get_fields()
+        if 'category_details' in fields and expand_category(self.context.get('request')):
+            fields['category_details'] = CategorySerializer(source='category', read_only=True)
+        return fields
+    
     def validate_amount(self, value):
         if value <= 0:
             raise serializers.ValidationError("Amount must be greater than 0")
         return value
     
+    def validate_currency(self, value):
+        # Batches validate many rows with one context: check each code once
+        known = self.context.setdefault('known_currencies', set())
+        if value not in known:
+            value = validate_currency_code(value)
+            check_convertible([value], self.get_base_currency())
+            known.add(value)
+        return value
+    
+    def get_base_currency(self):
+        if 'base_currency' not in self.context:
+            self.context['base_currency'] = fx.base_currency_of(self.context['request'].user)
+        return self.context['base_currency']
+    
     def validate_category(self, value):
         request = self.context.get('request')
-        if value and value.user != request.user:
+        if value and value.user_id != request.user.id:
             raise serializers.ValidationError("Invalid category")
         return value
     
     def validate(self, data):
         category = data.get('category')
-        transaction_type = data.get('type')
+        transaction_type = data.get('type', getattr(self.instance, 'type', None))
         
         if category and category.type != transaction_type:
             raise serializers.ValidationError({
@@ -87,16 +155,57 @@ class TransactionSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         request = self.context.get('request')
         validated_data['user'] = request.user
+        if 'currency' not in validated_data:
+            validated_data['currency'] = self.get_base_currency()
         return super().create(validated_data)
     
     def update(self, instance, validated_data):
         request = self.context.get('request')
-        if request and request.user != instance.user:
+        if request and request.user.id != instance.user_id:
             raise serializers.ValidationError("Unauthorized")
         return super().update(instance, validated_data)
 
 
-class BudgetSerializer(serializers.ModelSerializer):
+class ProfileSerializer(serializers.ModelSerializer):
+    
+    class Meta:
+        model = Profile
+        fields = ['base_currency']
+    
+    def validate_base_currency(self, value):
+        value = validate_currency_code(value)
+        user = self.context['request'].user
+        currencies = fx.held_currencies(user)
+        if Budget.objects.filter(user=user).exists():
+            # Budgets are converted from the current base currency
+            currencies.add(fx.base_currency_of(user))
+        check_convertible(currencies, value)
+        return value
+    
+    def save(self, **kwargs):
+        user = self.context['request'].user
+        with db_transaction.atomic():
+            fx.convert_budgets(user, fx.base_currency_of(user), self.validated_data['base_currency'])
+            return super().save(**kwargs)
+
+
+def validate_currency_code(value):
+    """An upper-cased three-letter currency code"""
+    try:
+        return fx.normalize_code(value)
+    except ValueError as e:
+        raise serializers.ValidationError(str(e))
+
+
+def check_convertible(currencies, base):
+    """fx.check_convertible() raising a validation error"""
+    try:
+        fx.check_convertible(currencies, base)
+    except ValueError as e:
+        raise serializers.ValidationError(f'{e}; load them with manage.py load_exchange_rates')
+
+
+class BudgetSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     actual_expenses = serializers.SerializerMethodField()
     remaining = serializers.SerializerMethodField()
     percentage_used = serializers.SerializerMethodField()
@@ -135,7 +244,7 @@ class BudgetSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class DashboardSerializer(serializers.Serializer):
+class DashboardSerializer(TimedSerializerMixin, serializers.Serializer):
     total_income = serializers.DecimalField(max_digits=12, decimal_places=2)
     total_expenses = serializers.DecimalField(max_digits=12, decimal_places=2)
     balance = serializers.DecimalField(max_digits=12, decimal_places=2)
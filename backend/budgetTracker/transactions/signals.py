@@ -0,0 +1,125 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db.models.signals import pre_save, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from .models import Category, Transaction, Budget, Profile
+from . import rollups
+from .caching import bump_data_version
+from .authentication import forget_user
+
+ROLLUP_FIELDS = ('user_id', 'date', 'type', 'category_id', 'currency', 'amount')
+
+
+def _deleting_user(origin):
+    """True when the delete was cascaded from a User (their rollups go too)"""
+    model = getattr(origin, 'model', type(origin))
+    return issubclass(model, User)
+
+
+def _rollup_values(instance):
+    values = {field: getattr(instance, field) for field in ROLLUP_FIELDS}
+    values['amount'] = Decimal(str(values['amount']))
+    return values
+
+
+@receiver(pre_save, sender=Transaction)
+def remember_previous_transaction(sender, instance, raw=False, **kwargs):
+    """Snapshot the stored row so post_save can move it between buckets"""
+    instance._rollup_previous = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    instance._rollup_previous = (
+        Transaction.objects.filter(pk=instance.pk)
+        .values(*ROLLUP_FIELDS)
+        .first()
+    )
+
+
+@receiver(post_save, sender=Transaction)
+def update_rollup_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    current = _rollup_values(instance)
+    previous = getattr(instance, '_rollup_previous', None)
+    instance._rollup_previous = None
+
+    if previous is None:
+        rollups.add_transaction(current)
+        return
+
+    same_bucket = (
+        previous['user_id'] == current['user_id']
+        and previous['type'] == current['type']
+        and previous['category_id'] == current['category_id']
+        and previous['currency'] == current['currency']
+        and rollups.month_start(previous['date']) == rollups.month_start(current['date'])
+    )
+    if same_bucket:
+        if previous['amount'] != current['amount']:
+            rollups.apply_delta(
+                current['user_id'],
+                rollups.month_start(current['date']),
+                current['type'],
+                current['category_id'],
+                current['currency'],
+                current['amount'] - previous['amount'],
+                0
+            )
+        return
+
+    rollups.add_transaction(previous, sign=-1)
+    rollups.add_transaction(current)
+
+
+@receiver(post_delete, sender=Transaction)
+def update_rollup_on_delete(sender, instance, origin=None, **kwargs):
+    if _deleting_user(origin):
+        return
+    rollups.add_transaction(_rollup_values(instance), sign=-1)
+
+
+@receiver(pre_delete, sender=Category)
+def fold_category_rollups(sender, instance, origin=None, **kwargs):
+    """Transactions fall back to no category, so their totals must too"""
+    if _deleting_user(origin):
+        return
+    rollups.fold_category(instance)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Transaction)
+@receiver(post_save, sender=Budget)
+@receiver(post_save, sender=Profile)
+def bump_version_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    bump_data_version(instance.user_id)
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Transaction)
+@receiver(post_delete, sender=Budget)
+def bump_version_on_delete(sender, instance, origin=None, **kwargs):
+    if _deleting_user(origin):
+        return
+    bump_data_version(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def bump_version_on_profile_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """The profile endpoint's ETag is keyed on the data version too"""
+    if raw or created or update_fields == frozenset(['last_login']):
+        return
+    bump_data_version(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, raw=False, **kwargs):
+    """CachedJWTAuthentication must see deactivations and password changes"""
+    if raw:
+        return
+    forget_user(instance.pk)
@@ -0,0 +1,102 @@
+"""
+Sparse fieldsets: ?fields= and ?exclude=
+
+Both take comma-separated field names. SparseFieldsMixin trims a
+top-level serializer's output on GET requests; SparseQuerysetMixin
+lets a viewset prune its queryset to match (only the columns the kept
+fields read, no join or annotation for a dropped field), so nothing a
+client did not ask for is fetched.
+"""
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def _names(value):
+    if not value:
+        return []
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+
+def sparse_fields(request, field_names):
+    """
+    The names from `field_names` a GET request keeps, or None for all
+    Raises ValidationError for unknown names or when nothing is left
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    include = _names(request.query_params.get('fields'))
+    exclude = _names(request.query_params.get('exclude'))
+    if not include and not exclude:
+        return None
+
+    unknown = set(include + exclude) - set(field_names)
+    if unknown:
+        raise ValidationError({
+            'error': f"Unknown fields: {', '.join(sorted(unknown))}; "
+                     f"available: {', '.join(field_names)}"
+        })
+    kept = [
+        name for name in field_names
+        if (not include or name in include) and name not in exclude
+    ]
+    if not kept:
+        raise ValidationError({'error': 'fields and exclude leave no field to return'})
+    return kept
+
+
+class SparseFieldsMixin:
+    """Drops the fields ?fields= / ?exclude= leave out (top-level serializer only)"""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            return fields
+
+        kept = sparse_fields(self.context.get('request'), list(fields))
+        if kept is None:
+            return fields
+        return {name: fields[name] for name in kept}
+
+
+class SparseQuerysetMixin:
+    """
+    Queryset pruning for the fields a list or retrieve request keeps
+
+    `sparse_columns` maps a serializer field to the model columns it
+    reads (default: the field's own name); `sparse_required_columns`
+    are always loaded (ownership checks, ordering keys).
+    """
+    sparse_actions = ('list', 'retrieve')
+    sparse_columns = {}
+    sparse_required_columns = ('user',)
+
+    def get_sparse_fields(self):
+        """The serializer fields this request keeps, or None for all"""
+        if self.action not in self.sparse_actions:
+            return None
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = sparse_fields(
+                self.request, list(self.get_serializer_class().Meta.fields)
+            )
+        return self._sparse_fields
+
+    def wants_field(self, *names):
+        """True when the response includes any of these fields"""
+        fields = self.get_sparse_fields()
+        return fields is None or any(name in fields for name in names)
+
+    def only_sparse_columns(self, queryset, columns=None):
+        """queryset.only() the columns the kept fields read"""
+        fields = self.get_sparse_fields()
+        if fields is None:
+            return queryset
+        columns = columns if columns is not None else self.sparse_columns
+        needed = set(self.sparse_required_columns)
+        for name in fields:
+            needed.update(columns.get(name, (name,)))
+        return queryset.only(*needed)
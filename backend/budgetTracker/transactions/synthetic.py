@@ -0,0 +1,138 @@
+"""
+Synthetic ledgers for benchmarks and load tests
+
+generate_ledger() creates a user with categories, monthly budgets and
+transactions spread over a date range. Expense amounts follow a
+log-normal distribution (many small purchases, a few large ones),
+income arrives as a handful of larger payments per month, and a small
+share of rows is left uncategorised. Rows are written with bulk_create
+and the rollups are updated once per bucket, so a million rows take
+minutes rather than hours.
+"""
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction as db_transaction
+
+from .models import Budget, Category, Transaction
+from . import rollups
+from .caching import bump_data_version
+from .periods import add_months
+
+INCOME_CATEGORIES = ['Salary', 'Freelance', 'Investment', 'Other Income']
+EXPENSE_CATEGORIES = [
+    'Groceries', 'Rent', 'Utilities', 'Transportation', 'Entertainment',
+    'Healthcare', 'Shopping', 'Coffee', 'Streaming', 'Dining', 'Travel',
+    'Insurance', 'Education', 'Gifts', 'Pets', 'Other Expense',
+]
+
+MERCHANTS = [
+    'Grocery Mart', 'Corner Coffee', 'City Transit', 'Power & Light', 'Streamflix',
+    'Pharmacy Plus', 'Book Nook', 'Gas Station', 'Burger Barn', 'Hardware Hub',
+    'Pet Supplies', 'Cinema Town', 'Bakery Bliss', 'Online Market', 'Gym Monthly',
+]
+WORDS = [
+    'weekly', 'refund', 'subscription', 'order', 'card', 'payment', 'online',
+    'store', 'receipt', 'invoice', 'travel', 'family', 'gift', 'lunch', 'dinner',
+]
+
+INCOME_SHARE = 0.08
+UNCATEGORISED_SHARE = 0.05
+
+
+def generate_ledger(username, transactions=1000, categories=12, budgets=12,
+                    months=24, seed=None, batch_size=5000):
+    """
+    Create `username` with a synthetic ledger ending today and return it
+
+    `categories` are split roughly 1:3 between income and expense (at
+    least one of each); `budgets` covers the most recent months.
+    """
+    rng = random.Random(seed)
+    end = date.today()
+    start = add_months(end.replace(day=1), -(months - 1))
+    span = (end - start).days
+
+    with db_transaction.atomic():
+        user = User.objects.create_user(username, password=None)
+        income, expenses = _create_categories(user, categories)
+        Budget.objects.bulk_create(
+            Budget(
+                user=user,
+                month=add_months(end.replace(day=1), -offset),
+                amount=Decimal(rng.randrange(1500, 5000, 50))
+            )
+            for offset in range(budgets)
+        )
+
+        deltas = rollups.BucketDeltas()
+        batch = []
+        for index in range(transactions):
+            batch.append(_transaction(rng, user, index, income, expenses, start, span))
+            if len(batch) == batch_size:
+                _flush(batch, deltas)
+                batch = []
+        if batch:
+            _flush(batch, deltas)
+
+        deltas.apply()
+        bump_data_version(user.id)
+
+    return user
+
+
+def _create_categories(user, count):
+    income_count = max(1, min(len(INCOME_CATEGORIES), count // 4))
+    expense_count = max(1, count - income_count)
+    names = [(name, Transaction.INCOME) for name in INCOME_CATEGORIES[:income_count]]
+    for index in range(expense_count):
+        name = EXPENSE_CATEGORIES[index % len(EXPENSE_CATEGORIES)]
+        if index >= len(EXPENSE_CATEGORIES):
+            name = f'{name} {index // len(EXPENSE_CATEGORIES) + 1}'
+        names.append((name, Transaction.EXPENSE))
+
+    created = Category.objects.bulk_create(
+        Category(user=user, name=name, type=category_type)
+        for name, category_type in names
+    )
+    income = [category for category in created if category.type == Transaction.INCOME]
+    expenses = [category for category in created if category.type == Transaction.EXPENSE]
+    return income, expenses
+
+
+def _transaction(rng, user, index, income, expenses, start, span):
+    if rng.random() < INCOME_SHARE:
+        transaction_type = Transaction.INCOME
+        category = rng.choice(income)
+        amount = rng.lognormvariate(7.2, 0.6)
+    else:
+        transaction_type = Transaction.EXPENSE
+        category = rng.choice(expenses)
+        amount = rng.lognormvariate(3.2, 1.0)
+    if rng.random() < UNCATEGORISED_SHARE:
+        category = None
+
+    amount = Decimal(str(round(min(max(amount, 0.01), 99999.99), 2)))
+    return Transaction(
+        user=user,
+        category=category,
+        type=transaction_type,
+        amount=amount,
+        description=f'{rng.choice(MERCHANTS)} {rng.choice(WORDS)} {rng.choice(WORDS)} #{index}',
+        date=start + timedelta(days=rng.randint(0, span)),
+    )
+
+
+def _flush(batch, deltas):
+    Transaction.objects.bulk_create(batch)
+    for transaction in batch:
+        deltas.add({
+            'user_id': transaction.user_id,
+            'date': transaction.date,
+            'type': transaction.type,
+            'category_id': transaction.category_id,
+            'currency': transaction.currency,
+            'amount': transaction.amount,
+        })
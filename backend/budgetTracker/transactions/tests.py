@@ -1,3 +1,1498 @@
-from django.test import TestCase
+import contextvars
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.conf import settings
+from django.db import OperationalError, connection, transaction as db_transaction
+from django.db.models import Count, Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import (
+    ArchivedTransaction, Category, Transaction, Budget, MonthlyRollup, DataVersion, ExchangeRate
+)
+from .periods import filter_period
+from .benchmarks import ENDPOINTS, QueryCounter, call, endpoint_url, request_data
+from .synthetic import generate_ledger
+from .category_templates import TEMPLATES
+from .metrics import REGISTRY
+from .fastpath import ValuesRepresentation
+from .renderers import ORJSONRenderer
+from .serializers import TransactionSerializer
+from .retries import run_write
+from . import archive, fx
+from . import routers
+from . import search
+
+
+class LedgerMixin:
+    """Shared fixtures: one user with an income and an expense category"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'secret123')
+        self.salary = Category.objects.create(user=self.user, name='Salary', type='INCOME')
+        self.rent = Category.objects.create(user=self.user, name='Rent', type='EXPENSE')
+
+    def add_transaction(self, type, amount, day, category=None, **kwargs):
+        return Transaction.objects.create(
+            user=self.user,
+            type=type,
+            amount=Decimal(amount),
+            date=day,
+            category=category,
+            **kwargs
+        )
+
+
+class MonthlyRollupTests(LedgerMixin, TestCase):
+
+    def rollup(self, month, type, category):
+        return MonthlyRollup.objects.get(
+            user=self.user, month=month, type=type, category=category
+        )
+
+    def test_create_update_delete_keep_rollup_in_sync(self):
+        first = self.add_transaction('EXPENSE', '10.00', date(2024, 3, 5), self.rent)
+        self.add_transaction('EXPENSE', '5.50', date(2024, 3, 20), self.rent)
+
+        rollup = self.rollup(date(2024, 3, 1), 'EXPENSE', self.rent)
+        self.assertEqual(rollup.total, Decimal('15.50'))
+        self.assertEqual(rollup.count, 2)
+
+        first.amount = Decimal('12.00')
+        first.save()
+        self.assertEqual(self.rollup(date(2024, 3, 1), 'EXPENSE', self.rent).total, Decimal('17.50'))
+
+        first.date = date(2024, 4, 2)
+        first.save()
+        self.assertEqual(self.rollup(date(2024, 3, 1), 'EXPENSE', self.rent).total, Decimal('5.50'))
+        self.assertEqual(self.rollup(date(2024, 4, 1), 'EXPENSE', self.rent).total, Decimal('12.00'))
+
+        first.delete()
+        self.assertFalse(MonthlyRollup.objects.filter(month=date(2024, 4, 1)).exists())
+
+    def test_deleting_category_moves_totals_to_uncategorised(self):
+        self.add_transaction('EXPENSE', '10.00', date(2024, 3, 5), self.rent)
+        self.add_transaction('EXPENSE', '2.00', date(2024, 3, 6))
+
+        self.rent.delete()
+
+        rollup = self.rollup(date(2024, 3, 1), 'EXPENSE', None)
+        self.assertEqual(rollup.total, Decimal('12.00'))
+        self.assertEqual(rollup.count, 2)
+        self.assertEqual(MonthlyRollup.objects.count(), 1)
+
+    def test_deleting_user_removes_rollups(self):
+        self.add_transaction('EXPENSE', '10.00', date(2024, 3, 5), self.rent)
+        self.user.delete()
+        self.assertFalse(MonthlyRollup.objects.exists())
+
+    def test_rebuild_command_matches_incremental_rollups(self):
+        self.add_transaction('INCOME', '100.00', date(2024, 1, 1), self.salary)
+        self.add_transaction('EXPENSE', '40.00', date(2024, 1, 15), self.rent)
+        self.add_transaction('EXPENSE', '3.00', date(2024, 2, 1))
+        expected = set(MonthlyRollup.objects.values_list('month', 'type', 'category', 'total', 'count'))
+
+        MonthlyRollup.objects.all().delete()
+        call_command('rebuild_rollups', stdout=StringIO())
+
+        rebuilt = set(MonthlyRollup.objects.values_list('month', 'type', 'category', 'total', 'count'))
+        self.assertEqual(rebuilt, expected)
+
+    def test_budget_actual_expenses_reads_rollup(self):
+        self.add_transaction('EXPENSE', '40.00', date(2024, 1, 15), self.rent)
+        self.add_transaction('EXPENSE', '99.00', date(2024, 2, 1), self.rent)
+        budget = Budget.objects.create(user=self.user, month=date(2024, 1, 1), amount=Decimal('100.00'))
+        self.assertEqual(budget.get_actual_expenses(), Decimal('40.00'))
+        self.assertEqual(budget.get_remaining(), Decimal('60.00'))
+
+
+class SummaryEndpointTests(LedgerMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        self.add_transaction('INCOME', '100.00', date(2024, 1, 1), self.salary)
+        self.add_transaction('EXPENSE', '40.00', date(2024, 1, 15), self.rent)
+        self.add_transaction('EXPENSE', '3.00', date(2024, 2, 1))
+
+    def test_summary_from_rollups(self):
+        response = self.client.get(reverse('transaction-summary'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_income'], Decimal('100.00'))
+        self.assertEqual(response.data['total_expenses'], Decimal('43.00'))
+        self.assertEqual(response.data['transaction_count'], 3)
+
+    def test_by_category_with_row_level_filter(self):
+        response = self.client.get(reverse('transaction-by-category'), {'amount_min': '10'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data['expenses_by_category'],
+            [{'category__name': 'Rent', 'total': Decimal('40.00')}]
+        )
+
+    def test_dashboard_totals(self):
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['balance'], '57.00')
+        self.assertEqual(len(response.data['expenses_by_category']), 2)
+
+    def test_dashboard_budget_uses_current_month_expenses(self):
+        current_month = date.today().replace(day=1)
+        Budget.objects.create(user=self.user, month=current_month, amount=Decimal('50.00'))
+        self.add_transaction('EXPENSE', '12.50', current_month, self.rent)
+        self.add_transaction('INCOME', '20.00', current_month, self.salary)
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.data['monthly_income'], '20.00')
+        self.assertEqual(response.data['monthly_expenses'], '12.50')
+        self.assertEqual(response.data['current_month_budget'], '50.00')
+        self.assertEqual(response.data['budget_remaining'], '37.50')
+        self.assertEqual(response.data['total_expenses'], '55.50')
+
+    def test_dashboard_budget_with_empty_ledger(self):
+        Transaction.objects.all().delete()
+        Budget.objects.create(user=self.user, month=date.today().replace(day=1), amount=Decimal('50.00'))
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.data['current_month_budget'], '50.00')
+        self.assertEqual(response.data['budget_remaining'], '50.00')
+        self.assertEqual(response.data['balance'], '0.00')
+
+
+class AggregateCacheTests(LedgerMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        self.add_transaction('INCOME', '100.00', date(2024, 1, 1), self.salary)
+        self.add_transaction('EXPENSE', '40.00', date(2024, 1, 15), self.rent)
+
+    def test_cache_key_includes_filters(self):
+        url = reverse('transaction-summary')
+        self.assertEqual(self.client.get(url).data['transaction_count'], 2)
+        filtered = self.client.get(url, {'type': 'EXPENSE'}).data
+        self.assertEqual(filtered['transaction_count'], 1)
+        self.assertEqual(filtered['total_income'], Decimal('0.00'))
+
+    def test_writes_invalidate_cached_aggregates(self):
+        url = reverse('transaction-summary')
+        self.assertEqual(self.client.get(url).data['total_expenses'], Decimal('40.00'))
+
+        with self.assertNumQueries(1):
+            self.client.get(url)
+
+        self.add_transaction('EXPENSE', '2.00', date(2024, 1, 16), self.rent)
+        self.assertEqual(self.client.get(url).data['total_expenses'], Decimal('42.00'))
+
+        Budget.objects.create(user=self.user, month=date(2024, 1, 1), amount=Decimal('50.00'))
+        self.rent.delete()
+        self.assertEqual(DataVersion.objects.get(user=self.user).version, 7)
+        by_category = self.client.get(reverse('transaction-by-category')).data
+        self.assertEqual(by_category['expenses_by_category'][0]['category__name'], None)
+
+    def test_rebuild_invalidates_cached_aggregates(self):
+        url = reverse('transaction-summary')
+        MonthlyRollup.objects.filter(type='EXPENSE').update(total=Decimal('1.00'))
+        self.assertEqual(self.client.get(url).data['total_expenses'], Decimal('1.00'))
+
+        call_command('rebuild_rollups', '--user', 'alice', stdout=StringIO())
+        self.assertEqual(self.client.get(url).data['total_expenses'], Decimal('40.00'))
+
+        MonthlyRollup.objects.filter(type='EXPENSE').update(total=Decimal('1.00'))
+        cache.clear()
+        self.assertEqual(self.client.get(url).data['total_expenses'], Decimal('1.00'))
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(self.client.get(url).data['total_expenses'], Decimal('40.00'))
+
+
+class BudgetQueryCountTests(LedgerMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def add_budgets(self, year, months):
+        for month in months:
+            Budget.objects.create(user=self.user, month=date(year, month, 1), amount=Decimal('100.00'))
+            self.add_transaction('EXPENSE', '25.00', date(year, month, 10), self.rent)
+
+    def test_list_query_count_does_not_grow_with_page_size(self):
+        # Each count includes the data-version read behind the ETag
+        url = reverse('budget-list')
+        self.add_budgets(2023, range(1, 3))
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 2)
+
+        self.add_budgets(2024, range(1, 13))
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertEqual(response.data['results'][0]['actual_expenses'], 25.0)
+        self.assertEqual(response.data['results'][0]['remaining'], 75.0)
+        self.assertEqual(response.data['results'][0]['percentage_used'], 25.0)
+
+    def test_set_current_returns_annotated_budget(self):
+        today = date.today()
+        self.add_transaction('EXPENSE', '30.00', today, self.rent)
+        response = self.client.post(reverse('budget-set-current'), {'amount': '120.00'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['remaining'], 90.0)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('budget-current'))
+        self.assertEqual(response.data['actual_expenses'], 30.0)
+
+    def test_moving_budget_to_another_month_recomputes_expenses(self):
+        self.add_budgets(2024, [1])
+        budget = Budget.objects.get(user=self.user)
+        url = reverse('budget-detail', args=[budget.pk])
+
+        response = self.client.patch(url, {'month': '2024-02-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['actual_expenses'], 0.0)
+        self.assertEqual(response.data['remaining'], 100.0)
+        self.assertEqual(self.client.get(url).data['actual_expenses'], 0.0)
+
+
+    def test_year_report_is_one_query(self):
+        self.add_budgets(2024, range(1, 7))
+        self.add_transaction('EXPENSE', '150.00', date(2024, 2, 11), self.rent)
+        self.add_transaction('EXPENSE', '60.00', date(2024, 8, 1))
+        Budget.objects.create(user=self.user, month=date(2024, 9, 1), amount=Decimal('50.00'))
+
+        # The data-version read and the report itself
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('budget-report'), {'year': 2024})
+        self.assertEqual(response.status_code, 200)
+        months = response.data['months']
+        self.assertEqual(len(months), 12)
+
+        self.assertEqual((months[0]['actual_expenses'], months[0]['remaining'], months[0]['over_budget']), (25.0, 75.0, False))
+        self.assertEqual((months[1]['percentage_used'], months[1]['over_budget']), (175.0, True))
+        self.assertEqual((months[7]['amount'], months[7]['actual_expenses'], months[7]['over_budget']), (None, 60.0, None))
+        self.assertEqual((months[8]['amount'], months[8]['actual_expenses']), ('50.00', 0.0))
+        self.assertEqual(response.data['totals']['months_over'], 1)
+        self.assertEqual(response.data['totals']['months_under'], 6)
+        self.assertEqual(response.data['totals']['remaining'], 350.0)
+        self.assertEqual(response.data['totals']['amount'], '650.00')
+
+        ranged = self.client.get(reverse('budget-report'), {'start': '2024-02', 'end': '2024-03'}).data
+        self.assertEqual([month['month'] for month in ranged['months']], [date(2024, 2, 1), date(2024, 3, 1)])
+        self.assertEqual(self.client.get(reverse('budget-report'), {'start': '2024-13'}).status_code, 400)
+        self.assertEqual(
+            self.client.get(reverse('budget-report'), {'start': '2024-03', 'end': '2024-01'}).status_code, 400
+        )
+
+
+class CategoryQueryCountTests(LedgerMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        for day in range(1, 8):
+            self.add_transaction('EXPENSE', '5.00', date(2024, 5, day), self.rent)
+            self.add_transaction('INCOME', '9.00', date(2024, 5, day), self.salary)
+
+    def test_transaction_list_has_no_per_row_queries(self):
+        # Each count includes the data-version read behind the ETag
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('transaction-list'))
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertEqual(
+            set(response.data['results'][0]['category_details']),
+            {'id', 'name', 'type'}
+        )
+
+    def test_expand_category_prefetches_counts(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('transaction-list'), {'expand': 'category'})
+        self.assertEqual(response.data['results'][0]['category_details']['transaction_count'], 7)
+
+    def test_category_list_annotates_counts(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('category-list'))
+        counts = {item['name']: item['transaction_count'] for item in response.data['results']}
+        self.assertEqual(counts, {'Rent': 7, 'Salary': 7})
+
+    def test_dashboard_recent_transactions_constant_queries(self):
+        # Data version, one rollup aggregation, recent transactions
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(len(response.data['recent_transactions']), 5)
+
+
+@override_settings(JWT_USER_CACHE_TIMEOUT=60)
+class CachedJWTAuthenticationTests(LedgerMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_detail_request_reads_neither_the_token_user_nor_the_owner(self):
+        url = reverse('category-detail', args=[self.rent.pk])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        # Version read and the category itself
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_deactivation_and_deletion_apply_immediately(self):
+        url = reverse('user-profile')
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        # 403 rather than 401: SessionAuthentication comes first
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.user.is_active = True
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        self.user.delete()
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    @override_settings(JWT_USER_CACHE_TIMEOUT=0)
+    def test_zero_timeout_reads_the_user_on_every_request(self):
+        url = reverse('category-detail', args=[self.rent.pk])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        # The token user, the version read and the category
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class CategoryTemplateTests(APITestCase):
+
+    def register(self, **extra):
+        return self.client.post('/api/auth/register/', {
+            'username': 'carol', 'email': 'carol@example.com', 'password': 'secret123', **extra
+        }, format='json')
+
+    def test_registration_seeds_the_chosen_template_in_bulk(self):
+        # Uniqueness checks, the user, one category INSERT and the
+        # version bump, plus savepoints
+        with self.assertNumQueries(13):
+            response = self.register(category_template='student')
+        self.assertEqual(response.status_code, 201)
+
+        user = User.objects.get(username='carol')
+        names = set(user.categories.values_list('name', 'type'))
+        self.assertEqual(len(names), 13)
+        self.assertIn(('Tuition', 'EXPENSE'), names)
+        self.assertEqual(DataVersion.objects.get(user=user).version, 1)
+
+    def test_unknown_template_is_rejected(self):
+        self.assertEqual(self.register(category_template='pirate').status_code, 400)
+        self.assertEqual(self.register(category_template=['student']).status_code, 400)
+        self.assertFalse(User.objects.filter(username='carol').exists())
+
+    def test_malformed_template_entries_are_rejected(self):
+        user = User.objects.create_user('dave', 'dave@example.com', 'secret123')
+        self.client.force_authenticate(user)
+        for categories in ([(['Rent'], 'EXPENSE')], [('Rent', {'type': 'EXPENSE'})], [('Rent',)]):
+            with self.subTest(categories=categories), \
+                    patch.dict(TEMPLATES, {'broken': {'label': 'Broken', 'categories': categories}}):
+                response = self.client.post(reverse('category-create-defaults'), {'template': 'broken'})
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(Category.objects.filter(user=user).exists())
+
+    def test_create_defaults_only_adds_missing_categories(self):
+        user = User.objects.create_user('dave', 'dave@example.com', 'secret123')
+        Category.objects.create(user=user, name='Rent', type='EXPENSE')
+        self.client.force_authenticate(user)
+        url = reverse('category-create-defaults')
+
+        response = self.client.post(url)
+        self.assertEqual(response.data['message'], 'Created 11 default categories')
+        self.assertEqual(len(response.data['categories']), 12)
+
+        response = self.client.post(url, {'template': 'freelancer'})
+        self.assertEqual(response.data['message'], 'Created 7 default categories')
+        self.assertEqual(self.client.post(url, {'template': 'pirate'}).status_code, 400)
+        self.assertEqual(self.client.post(url, {'template': ['student']}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(url, {'template': {'name': 'x'}}, format='json').status_code, 400)
+
+        templates = self.client.get(reverse('category-templates')).data
+        self.assertIn('family', [template['name'] for template in templates])
+
+
+class CursorPaginationTests(LedgerMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        for index in range(25):
+            self.add_transaction('EXPENSE', '1.00', date(2024, 1, 1 + index % 5), self.rent)
+
+    def walk(self, params, insert_after_first_page=False):
+        ids = []
+        response = self.client.get(reverse('transaction-list'), params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids.extend(item['id'] for item in response.data['results'])
+            if insert_after_first_page:
+                self.add_transaction('EXPENSE', '1.00', date(2024, 1, 3), self.rent)
+                insert_after_first_page = False
+            if not response.data['next']:
+                return ids, response
+            response = self.client.get(response.data['next'])
+
+    def test_walks_every_row_once_in_order(self):
+        ids, _ = self.walk({'pagination': 'cursor', 'page_size': 7})
+        expected = list(
+            Transaction.objects.filter(user=self.user)
+            .order_by('-date', '-created_at', '-id')
+            .values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+    def test_concurrent_insert_does_not_duplicate_rows(self):
+        ids, _ = self.walk({'pagination': 'cursor', 'page_size': 10}, insert_after_first_page=True)
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertGreaterEqual(len(ids), 25)
+
+    def test_previous_link_returns_previous_page(self):
+        first = self.client.get(reverse('transaction-list'), {'pagination': 'cursor'})
+        second = self.client.get(first.data['next'])
+        with self.assertNumQueries(2):
+            back = self.client.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('transaction-list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_ordering_other_than_the_keyset_is_rejected(self):
+        for ordering in ['amount', '-date,amount', 'date']:
+            response = self.client.get(
+                reverse('transaction-list'), {'pagination': 'cursor', 'ordering': ordering}
+            )
+            self.assertEqual(response.status_code, 400, ordering)
+            self.assertIn('error', response.data)
+
+        ids, _ = self.walk({'pagination': 'cursor', 'page_size': 7, 'ordering': '-date'})
+        default, _ = self.walk({'pagination': 'cursor', 'page_size': 7})
+        self.assertEqual(ids, default)
+
+        response = self.client.get(reverse('transaction-list'), {'ordering': 'amount'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_page_number_mode_is_default(self):
+        response = self.client.get(reverse('transaction-list'), {'page': 3})
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['results']), 5)
+
+
+class ImportTests(LedgerMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, name, content, **data):
+        return self.client.post(
+            reverse('transaction-import'),
+            {'file': SimpleUploadedFile(name, content.encode()), **data},
+            format='multipart'
+        )
+
+    def test_csv_import_with_mapping_and_errors(self):
+        content = (
+            "Posted,Amount,Memo,Category\n"
+            "2024-03-01,-12.50,Coffee,Rent\n"
+            "2024-03-02,2000,Payday,Salary\n"
+            "2024-03-03,abc,Broken,\n"
+            "2024-03-04,-7,Snacks,Food\n"
+        )
+        mapping = '{"date": "Posted", "description": "Memo"}'
+        response = self.upload('statement.csv', content, mapping=mapping)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(response.data['errors'], [{'line': 4, 'errors': {'amount': 'A valid number is required.'}}])
+        self.assertTrue(Category.objects.filter(user=self.user, name='Food', type='EXPENSE').exists())
+
+        rent = Transaction.objects.get(description='Coffee')
+        self.assertEqual((rent.type, rent.amount, rent.category), ('EXPENSE', Decimal('12.50'), self.rent))
+
+        summary = self.client.get(reverse('transaction-summary')).data
+        self.assertEqual(summary['total_expenses'], Decimal('19.50'))
+        self.assertEqual(summary['total_income'], Decimal('2000.00'))
+
+    def test_malformed_csv_is_rejected(self):
+        # An unterminated quote swallows the rest of the file into one field
+        content = 'date,amount\n2024-03-01,-5\n"2024-03-02,' + 'x' * 200000 + '\n'
+        response = self.upload('statement.csv', content)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('field larger than field limit', response.data['error'])
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_non_finite_amounts_are_row_errors(self):
+        content = (
+            "date,amount\n"
+            "2024-03-01,NaN\n"
+            "2024-03-02,-Infinity\n"
+            "2024-03-03,sNaN\n"
+            "2024-03-04,1e999999\n"
+            "2024-03-05,-8\n"
+        )
+        response = self.upload('statement.csv', content)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(
+            response.data['errors'],
+            [{'line': line, 'errors': {'amount': 'A valid number is required.'}} for line in range(2, 6)]
+        )
+
+    def test_decimal_comma_amounts_are_row_errors(self):
+        content = (
+            "date,amount\n"
+            "2024-03-01,\"1.234,56\"\n"
+            "2024-03-02,\"12,50\"\n"
+            "2024-03-03,\"-1,234.56\"\n"
+            "2024-03-04,\"($2,000)\"\n"
+        )
+        response = self.upload('statement.csv', content)
+
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(
+            response.data['errors'],
+            [{'line': line, 'errors': {'amount': 'A valid number is required.'}} for line in (2, 3)]
+        )
+        self.assertEqual(
+            sorted(Transaction.objects.values_list('amount', flat=True)),
+            [Decimal('1234.56'), Decimal('2000.00')]
+        )
+
+    def test_ofx_import(self):
+        content = (
+            "OFXHEADER:100\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n"
+            "<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240105120000<TRNAMT>-42.10<NAME>Grocer\n"
+            "</STMTTRN>\n"
+            "<STMTTRN>\n<TRNTYPE>CREDIT</TRNTYPE>\n<DTPOSTED>20240106</DTPOSTED>\n"
+            "<TRNAMT>100.00</TRNAMT>\n<NAME>Refund</NAME>\n<MEMO>Store</MEMO>\n</STMTTRN>\n"
+            "</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n"
+        )
+        response = self.upload('bank.ofx', content)
+        self.assertEqual(response.data, {'created': 2, 'error_count': 0, 'errors': []})
+        self.assertEqual(
+            set(Transaction.objects.values_list('type', 'amount', 'date', 'description')),
+            {
+                ('EXPENSE', Decimal('42.10'), date(2024, 1, 5), 'Grocer'),
+                ('INCOME', Decimal('100.00'), date(2024, 1, 6), 'Refund - Store'),
+            }
+        )
+
+    def test_ofx_transaction_types_follow_the_amount_sign(self):
+        records = [
+            ('POS', '-3.20'), ('ATM', '-60.00'), ('XFER', '250.00'), ('DIRECTDEP', '1500.00'),
+            ('DIRECTDEBIT', '-45.00'), ('INT', '0.12'), ('FEE', '-2.50'), ('OTHER', '-1.00'),
+        ]
+        content = "<OFX><BANKTRANLIST>\n" + ''.join(
+            f"<STMTTRN><TRNTYPE>{trntype}<DTPOSTED>20240201<TRNAMT>{amount}<NAME>{trntype}</STMTTRN>\n"
+            for trntype, amount in records
+        ) + "</BANKTRANLIST></OFX>\n"
+        response = self.upload('bank.ofx', content)
+
+        self.assertEqual(response.data, {'created': 8, 'error_count': 0, 'errors': []})
+        self.assertEqual(
+            dict(Transaction.objects.values_list('description', 'type')),
+            {
+                trntype: 'EXPENSE' if amount.startswith('-') else 'INCOME'
+                for trntype, amount in records
+            }
+        )
+
+    def test_qif_import_command_without_creating_categories(self):
+        content = (
+            "!Type:Bank\nD01/15/2024\nT-1,250.00\nPLandlord\nLRent\n^\n"
+            "D01/16'24\nT-5.00\nPKiosk\nLUnknown\n^\n"
+        )
+        path = self.tmp_file('ledger.qif', content)
+        out, err = StringIO(), StringIO()
+        call_command(
+            'import_transactions', path, user='alice', no_create_categories=True,
+            stdout=out, stderr=err
+        )
+        self.assertIn('Imported 1 transactions (1 rows rejected)', out.getvalue())
+        self.assertIn("Unknown category 'Unknown'", err.getvalue())
+        self.assertEqual(Transaction.objects.get().category, self.rent)
+
+    def tmp_file(self, name, content):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, name)
+        with open(path, 'w') as handle:
+            handle.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+
+class BatchWriteTests(LedgerMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        self.coffee = self.add_transaction('EXPENSE', '4.50', date(2024, 3, 2), self.rent, description='Coffee')
+        self.lunch = self.add_transaction('EXPENSE', '12.00', date(2024, 3, 3), self.rent, description='Lunch')
+
+    def batch(self, operations):
+        return self.client.post(reverse('transaction-batch'), {'operations': operations}, format='json')
+
+    def rollup_totals(self):
+        return sorted(MonthlyRollup.objects.filter(user=self.user).values_list(
+            'month', 'type', 'category_id', 'total', 'count'
+        ))
+
+    def test_mixed_operations_apply_in_one_transaction(self):
+        creates = [
+            {'op': 'create', 'data': {
+                'type': 'EXPENSE', 'amount': f'{index + 1}.00', 'date': '2024-04-01',
+                'description': f'Item {index}', 'category': self.rent.pk
+            }}
+            for index in range(20)
+        ]
+        operations = creates + [
+            {'op': 'update', 'id': self.coffee.pk, 'data': {'amount': '5.00', 'date': '2024-04-02'}},
+            {'op': 'delete', 'id': self.lunch.pk},
+        ]
+        # Categories, targets, the base currency, one INSERT, UPDATE and
+        # DELETE, the two touched rollup buckets and the version bump,
+        # whatever the size (plus savepoints)
+        with self.assertNumQueries(17):
+            response = self.batch(operations)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['deleted']), (20, 1, 1))
+        self.assertEqual(response.data['results'][0]['data']['category_name'], 'Rent')
+        self.assertEqual(response.data['results'][20]['status'], 'updated')
+        self.assertFalse(Transaction.objects.filter(pk=self.lunch.pk).exists())
+        self.coffee.refresh_from_db()
+        self.assertEqual((self.coffee.amount, self.coffee.date), (Decimal('5.00'), date(2024, 4, 2)))
+
+        expected = self.rollup_totals()
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(self.rollup_totals(), expected)
+        summary = self.client.get(reverse('transaction-summary')).data
+        self.assertEqual(summary['total_expenses'], Decimal('215.00'))
+
+    def test_invalid_operation_rolls_back_the_whole_batch(self):
+        other = User.objects.create_user('bob', 'bob@example.com', 'secret123')
+        foreign = Category.objects.create(user=other, name='Bob', type='EXPENSE')
+        response = self.batch([
+            {'op': 'create', 'data': {'type': 'EXPENSE', 'amount': '1.00', 'date': '2024-03-05'}},
+            {'op': 'create', 'data': {
+                'type': 'EXPENSE', 'amount': '1.00', 'date': '2024-03-05', 'category': foreign.pk
+            }},
+            {'op': 'update', 'id': self.coffee.pk, 'data': {'category': self.salary.pk}},
+            {'op': 'delete', 'id': self.lunch.pk},
+            {'op': 'delete', 'id': self.lunch.pk},
+            {'op': 'rename'},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.data['applied'])
+        statuses = [item['status'] for item in response.data['results']]
+        self.assertEqual(statuses, ['valid', 'invalid', 'invalid', 'valid', 'invalid', 'invalid'])
+        self.assertEqual(response.data['results'][1]['errors']['category'], ['Invalid category'])
+        self.assertIn('category', response.data['results'][2]['errors'])
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 2)
+
+        self.assertEqual(self.batch([]).status_code, 400)
+
+
+class ExportTests(LedgerMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        self.add_transaction('INCOME', '100.00', date(2024, 1, 1), self.salary, description='Pay, January')
+        self.add_transaction('EXPENSE', '40.00', date(2024, 1, 15), self.rent)
+        self.add_transaction('EXPENSE', '3.00', date(2024, 2, 1))
+
+    def test_csv_export_honours_filters(self):
+        response = self.client.get(reverse('transaction-export'), {'date_to': '2024-01-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,date,type,amount,currency,category,description,created_at')
+        self.assertEqual(len(lines), 3)
+        self.assertIn('2024-01-01,INCOME,100.00,USD,Salary,"Pay, January"', lines[2])
+
+    def test_ndjson_export(self):
+        response = self.client.get(reverse('transaction-export'), {'output': 'ndjson', 'type': 'EXPENSE'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['amount'] for row in rows], ['3.00', '40.00'])
+        self.assertEqual(rows[0]['category'], None)
+
+    def test_unknown_output(self):
+        response = self.client.get(reverse('transaction-export'), {'output': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+
+class FullTextSearchTests(LedgerMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        self.coffee = self.add_transaction('EXPENSE', '4.00', date(2024, 1, 3), description='Coffee beans, café Olé')
+        self.add_transaction('EXPENSE', '9.00', date(2024, 1, 4), description='Coffee coffee coffee')
+        self.add_transaction('EXPENSE', '800.00', date(2024, 1, 1), self.rent, description='January')
+        self.add_transaction('INCOME', '50.00', date(2024, 1, 2), description='Refund for beans')
+
+    def search(self, term, **params):
+        response = self.client.get(reverse('transaction-list'), {'search': term, **params})
+        self.assertEqual(response.status_code, 200)
+        return [item['description'] for item in response.data['results']]
+
+    def test_index_is_installed(self):
+        from . import search
+        self.assertTrue(search.is_available())
+
+    def test_prefix_and_multi_term_matching(self):
+        self.assertEqual(set(self.search('cof')), {'Coffee beans, café Olé', 'Coffee coffee coffee'})
+        self.assertEqual(self.search('coffee bea'), ['Coffee beans, café Olé'])
+        self.assertEqual(self.search('cafe'), ['Coffee beans, café Olé'])
+        self.assertEqual(self.search('"'), self.search(''))
+
+    def test_category_name_matches(self):
+        self.assertEqual(self.search('ren'), ['January'])
+
+    def test_ranked_unless_ordering_given(self):
+        self.assertEqual(self.search('coffee')[0], 'Coffee coffee coffee')
+        self.assertEqual(
+            self.search('coffee', ordering='amount'),
+            ['Coffee beans, café Olé', 'Coffee coffee coffee']
+        )
+
+    def test_category_rename_is_searchable(self):
+        self.rent.name = 'Housing'
+        self.rent.save()
+        self.assertEqual(self.search('hous'), ['January'])
+        self.assertEqual(self.search('rent'), [])
+
+    def test_other_users_rows_are_not_matched(self):
+        other = User.objects.create_user('bob', 'bob@example.com', 'secret123')
+        Transaction.objects.create(user=other, type='EXPENSE', amount=1, date=date(2024, 1, 1), description='Coffee')
+        self.assertEqual(len(self.search('coffee')), 2)
+
+    def test_index_follows_updates_and_deletes(self):
+        self.coffee.description = 'Tea leaves'
+        self.coffee.save()
+        self.assertEqual(self.search('tea'), ['Tea leaves'])
+        self.assertEqual(self.search('beans'), ['Refund for beans'])
+        self.coffee.delete()
+        self.assertEqual(self.search('tea'), [])
+
+
+class PeriodFilterTests(LedgerMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        self.add_transaction('EXPENSE', '1.00', date(2023, 12, 31), self.rent)
+        self.add_transaction('EXPENSE', '2.00', date(2024, 1, 1), self.rent)
+        self.add_transaction('EXPENSE', '4.00', date(2024, 1, 31), self.rent)
+        self.add_transaction('EXPENSE', '8.00', date(2024, 2, 1), self.rent)
+        self.add_transaction('EXPENSE', '16.00', date(2025, 1, 15), self.rent)
+
+    def expenses(self, **params):
+        response = self.client.get(reverse('transaction-summary'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['total_expenses']
+
+    def test_month_and_year_boundaries(self):
+        self.assertEqual(self.expenses(month=1, year=2024), Decimal('6.00'))
+        self.assertEqual(self.expenses(year=2024), Decimal('14.00'))
+        self.assertEqual(self.expenses(month=1), Decimal('22.00'))
+        # Row-level path (amount filter) applies the same ranges
+        self.assertEqual(self.expenses(month=1, year=2024, amount_min='0.01'), Decimal('6.00'))
+        self.assertEqual(self.expenses(month=12, year=2023, amount_min='0.01'), Decimal('1.00'))
+
+    def test_list_filters_by_period(self):
+        response = self.client.get(reverse('transaction-list'), {'month': 1, 'year': 2024})
+        self.assertEqual(
+            [row['date'] for row in response.data['results']],
+            ['2024-01-31', '2024-01-01']
+        )
+
+    def test_invalid_period_is_rejected(self):
+        for params in ({'month': 13}, {'month': 'jan'}, {'year': 0}):
+            response = self.client.get(reverse('transaction-list'), params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_invalid_filters_are_rejected(self):
+        invalid = (
+            {'category': 'abc'}, {'date_from': 'x'}, {'date_to': '2024-02-30'},
+            {'amount_min': 'x'}, {'amount_max': 'NaN'},
+        )
+        for name in ('transaction-list', 'transaction-summary', 'transaction-by-category'):
+            for params in invalid:
+                response = self.client.get(reverse(name), params)
+                self.assertEqual(response.status_code, 400, (name, params))
+
+
+class TimeSeriesTests(LedgerMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        self.add_transaction('INCOME', '1000.00', date(2024, 1, 1), self.salary)
+        self.add_transaction('EXPENSE', '40.00', date(2024, 1, 15), self.rent)
+        self.add_transaction('EXPENSE', '10.00', date(2024, 3, 2), self.rent)
+        self.add_transaction('EXPENSE', '5.00', date(2024, 3, 3))
+        self.url = reverse('transaction-timeseries')
+
+    def test_monthly_series_from_rollups_is_zero_filled(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'date_from': '2023-12-01', 'date_to': '2024-03-31'})
+        self.assertEqual(response.status_code, 200)
+        series = response.data['series']
+        self.assertEqual([point['period'] for point in series], [
+            date(2023, 12, 1), date(2024, 1, 1), date(2024, 2, 1), date(2024, 3, 1)
+        ])
+        self.assertEqual(series[1]['net'], Decimal('960.00'))
+        self.assertEqual((series[2]['expenses'], series[2]['count']), (Decimal('0.00'), 0))
+        self.assertEqual((series[3]['expenses'], series[3]['count']), (Decimal('15.00'), 2))
+
+    def test_rows_and_rollups_agree(self):
+        from_rollups = self.client.get(self.url, {'year': 2024, 'split': 'category'}).data
+        # A mid-month start needs the transactions themselves
+        from_rows = self.client.get(self.url, {
+            'date_from': '2024-01-01', 'date_to': '2024-12-31', 'amount_min': '0.01', 'split': 'category'
+        }).data
+        self.assertEqual(from_rollups['series'], from_rows['series'])
+        self.assertEqual(from_rollups['categories'], from_rows['categories'])
+        self.assertEqual(len(from_rollups['series']), 12)
+        uncategorised = [c for c in from_rollups['categories'] if c['category'] is None]
+        self.assertEqual(uncategorised[0]['points'], [{'period': date(2024, 3, 1), 'total': Decimal('5.00'), 'count': 1}])
+
+    def test_day_and_week_intervals(self):
+        weeks = self.client.get(self.url, {'interval': 'week', 'date_from': '2024-02-26', 'date_to': '2024-03-10'}).data
+        self.assertEqual([point['period'] for point in weeks['series']], [date(2024, 2, 26), date(2024, 3, 4)])
+        self.assertEqual(weeks['series'][0]['expenses'], Decimal('15.00'))
+
+        days = self.client.get(self.url, {'interval': 'day', 'type': 'EXPENSE'}).data['series']
+        self.assertEqual((days[0]['period'], days[-1]['period'], len(days)), (date(2024, 1, 15), date(2024, 3, 3), 49))
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get(self.url, {'interval': 'hour'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'date_from': 'yesterday'}).status_code, 400)
+        too_long = {'interval': 'day', 'date_from': '2000-01-01', 'date_to': '2024-01-01'}
+        self.assertEqual(self.client.get(self.url, too_long).status_code, 400)
+
+
+@override_settings(ARCHIVE_AFTER_MONTHS=12)
+class ArchiveTests(LedgerMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        self.today = date.today()
+        self.old_rent = self.add_transaction('EXPENSE', '40.00', date(2020, 1, 15), self.rent)
+        self.add_transaction('INCOME', '1000.00', date(2020, 1, 1), self.salary)
+        self.add_transaction('EXPENSE', '7.00', date(2020, 2, 3))
+        self.add_transaction('EXPENSE', '25.00', self.today, self.rent)
+        self.add_transaction('INCOME', '300.00', self.today, self.salary)
+
+    def archive(self, *args):
+        call_command('archive_transactions', '--batch-size', '2', *args, stdout=StringIO())
+
+    def snapshot(self):
+        row_level = {'date_from': '2019-12-01', 'amount_min': '0.01'}
+        return [
+            self.client.get(reverse('transaction-summary')).data,
+            self.client.get(reverse('transaction-summary'), row_level).data,
+            self.client.get(reverse('transaction-by-category')).data,
+            self.client.get(reverse('transaction-by-category'), row_level).data,
+            self.client.get(reverse('transaction-timeseries'), {**row_level, 'split': 'category'}).data,
+            self.client.get(reverse('dashboard')).data['balance'],
+        ]
+
+    def test_archiving_keeps_every_total(self):
+        before = self.snapshot()
+        self.archive()
+
+        self.assertEqual(Transaction.objects.count(), 2)
+        archived = ArchivedTransaction.objects.get(pk=self.old_rent.pk)
+        self.assertEqual(
+            (archived.amount, archived.category, archived.created_at),
+            (self.old_rent.amount, self.rent, self.old_rent.created_at)
+        )
+        self.assertEqual(self.snapshot(), before)
+
+        call_command('rebuild_rollups', stdout=StringIO())
+        cache.clear()
+        self.assertEqual(self.snapshot(), before)
+
+    def test_recent_ranges_skip_the_archive(self):
+        self.archive()
+        url = reverse('transaction-summary')
+        with CaptureQueriesContext(connection) as recent:
+            response = self.client.get(url, {'date_from': self.today.replace(day=1).isoformat(), 'amount_min': '1'})
+        self.assertEqual(response.data['transaction_count'], 2)
+        self.assertFalse(any('UNION' in query['sql'] for query in recent.captured_queries))
+
+        response = self.client.get(url, {'date_to': '2020-01-31', 'amount_min': '1'})
+        self.assertEqual(response.data['total_expenses'], Decimal('40.00'))
+        self.assertEqual(response.data['total_income'], Decimal('1000.00'))
+
+    def test_browse_and_restore(self):
+        self.archive()
+        response = self.client.get(reverse('transaction-list'), {'archived': 'true', 'search': 'rent'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data['results']], [self.old_rent.pk])
+
+        with override_settings(ARCHIVE_AFTER_MONTHS=1200):
+            self.archive('--restore')
+        self.assertFalse(ArchivedTransaction.objects.exists())
+        restored = Transaction.objects.get(pk=self.old_rent.pk)
+        self.assertEqual(restored.created_at, self.old_rent.created_at)
+        self.assertEqual(self.client.get(reverse('transaction-summary')).data['transaction_count'], 5)
+
+
+    def test_archived_rows_are_reachable_and_counted(self):
+        self.archive()
+        response = self.client.get(reverse('transaction-list'))
+        self.assertEqual(response['X-Archive-Horizon'], archive.horizon().isoformat())
+        self.assertEqual(response.data['count'], 2)
+        self.assertNotIn('X-Archive-Horizon', self.client.get(reverse('transaction-list'), {'archived': 'true'}))
+
+        detail = reverse('transaction-detail', args=[self.old_rent.pk])
+        response = self.client.get(detail)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['amount'], '40.00')
+        # Read-only until restored
+        self.assertEqual(self.client.patch(detail, {'amount': '1.00'}).status_code, 404)
+        self.assertEqual(self.client.delete(detail).status_code, 404)
+
+        categories = self.client.get(reverse('category-list')).data['results']
+        self.assertEqual({row['name']: row['transaction_count'] for row in categories}, {'Rent': 2, 'Salary': 2})
+        response = self.client.get(reverse('category-detail', args=[self.rent.pk]), {'fields': 'id,transaction_count'})
+        self.assertEqual(response.data['transaction_count'], 2)
+
+
+class FastListTests(LedgerMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        self.add_transaction('EXPENSE', '3.50', date(2024, 1, 2), self.rent, description='Coffee \u2028 beans')
+        self.add_transaction('EXPENSE', '1200', date(2024, 1, 1), description='Coffee without category')
+        self.add_transaction('INCOME', '0.10', date(2024, 1, 3), self.salary, description='Interest')
+
+    def serialized(self, results):
+        instances = Transaction.objects.in_bulk([item['id'] for item in results])
+        data = TransactionSerializer([instances[item['id']] for item in results], many=True).data
+        return json.loads(JSONRenderer().render(data))
+
+    def test_values_rows_match_the_serializer(self):
+        self.assertIn('category__name', ValuesRepresentation(TransactionSerializer()).paths)
+        for params in ({}, {'search': 'coffee'}, {'ordering': 'amount'}, {'pagination': 'cursor', 'page_size': 2}):
+            response = self.client.get(reverse('transaction-list'), params)
+            results = json.loads(response.content)['results']
+            self.assertTrue(results)
+            self.assertEqual(results, self.serialized(results), params)
+        uncategorised = Transaction.objects.get(category=None).pk
+        results = self.client.get(reverse('transaction-list')).data['results']
+        self.assertNotIn('category_name', next(item for item in results if item['id'] == uncategorised))
+
+    def test_expand_uses_the_serializer(self):
+        response = self.client.get(reverse('transaction-list'), {'expand': 'category', 'type': 'INCOME'})
+        self.assertEqual(response.data['results'][0]['category_details']['transaction_count'], 1)
+
+    def test_orjson_renderer_matches_json_renderer(self):
+        data = {
+            'amount': Decimal('12.30'),
+            'day': date(2024, 2, 29),
+            'at': timezone.now(),
+            'label': gettext_lazy('Income'),
+            'by_id': {1: ['a\u2028b', None, 1.5, True]},
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class SparseFieldsTests(LedgerMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        self.coffee = self.add_transaction('EXPENSE', '3.50', date(2024, 1, 2), self.rent, description='Coffee')
+        Budget.objects.create(user=self.user, month=date(2024, 1, 1), amount=Decimal('100.00'))
+
+    def get(self, url_name, params, *args):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(url_name, args=args), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data, ' '.join(query['sql'] for query in queries.captured_queries)
+
+    def test_transaction_fields(self):
+        data, sql = self.get('transaction-list', {'fields': 'id,amount,date'})
+        self.assertEqual(data['results'], [{'id': self.coffee.pk, 'amount': '3.50', 'date': '2024-01-02'}])
+        self.assertNotIn('description', sql)
+        self.assertNotIn('JOIN', sql)
+
+        data, sql = self.get('transaction-detail', {'exclude': 'category_details,category_name'}, self.coffee.pk)
+        self.assertEqual(data['description'], 'Coffee')
+        self.assertNotIn('category_details', data)
+        self.assertNotIn('JOIN', sql)
+
+        data, _ = self.get('transaction-list', {'fields': 'id,category_details', 'expand': 'category'})
+        self.assertEqual(data['results'][0]['category_details']['transaction_count'], 1)
+
+    def test_category_and_budget_skip_annotations(self):
+        data, sql = self.get('category-list', {'exclude': 'transaction_count,created_at'})
+        self.assertEqual(data['results'][0], {'id': self.rent.pk, 'name': 'Rent', 'type': 'EXPENSE'})
+        self.assertNotIn('COUNT(', sql.replace('COUNT(*)', ''))
+
+        data, sql = self.get('budget-list', {'fields': 'month,amount'})
+        self.assertEqual(data['results'], [{'month': '2024-01-01', 'amount': '100.00'}])
+        self.assertNotIn('transactions_monthlyrollup', sql)
+
+        data, _ = self.get('budget-list', {'fields': 'month,remaining'})
+        self.assertEqual(data['results'], [{'month': '2024-01-01', 'remaining': 96.5}])
+
+    def test_invalid_names_and_writes(self):
+        response = self.client.get(reverse('transaction-list'), {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', response.data['error'])
+        self.assertEqual(self.client.get(reverse('category-list'), {'exclude': 'id,name,type,created_at,transaction_count'}).status_code, 400)
+
+        response = self.client.post(
+            reverse('category-list') + '?fields=id',
+            {'name': 'Travel', 'type': 'EXPENSE'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['name'], 'Travel')
+
+
+class CurrencyTests(LedgerMixin, APITestCase):
+
+    RATES = (
+        'date,currency,rate\n'
+        '2024-01-05,USD,1.10\n'
+        '2024-01-20,USD,1.30\n'
+        '2024-02-10,USD,1.25\n'
+        '2024-01-10,GBP,0.80\n'
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        self.load_rates(self.RATES)
+        self.add_transaction('INCOME', '120.00', date(2024, 1, 1), self.salary)
+        self.add_transaction('EXPENSE', '36.00', date(2024, 1, 5), self.rent)
+        self.add_transaction('EXPENSE', '12.00', date(2024, 1, 15), self.rent, currency='EUR')
+        # No February GBP rate: January's is used
+        self.add_transaction('EXPENSE', '8.00', date(2024, 2, 1), currency='GBP')
+
+    def load_rates(self, content, *args):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as stream:
+            stream.write(content)
+        self.addCleanup(os.remove, stream.name)
+        call_command('load_exchange_rates', stream.name, *args, stdout=StringIO())
+
+    def summary(self, **params):
+        return self.client.get(reverse('transaction-summary'), params).data
+
+    def test_monthly_average_rates_are_stored(self):
+        self.assertAlmostEqual(ExchangeRate.objects.get(currency='USD', month=date(2024, 1, 1)).rate, 1.2)
+        self.assertEqual(ExchangeRate.objects.get(currency='EUR', month=date(2024, 2, 1)).rate, 1.0)
+        rates = fx.read_rates(StringIO('Date,USD,JPY,\n2024-03-01,1.08,N/A,\n'), 'EUR')
+        self.assertEqual(rates, {('USD', date(2024, 3, 1)): 1.08, ('EUR', date(2024, 3, 1)): 1.0})
+
+    def test_totals_are_converted_to_the_base_currency(self):
+        # 12 EUR at 1.20 and 8 GBP at 1.25 / 0.80
+        expected = Decimal('36.00') + Decimal('14.40') + Decimal('12.50')
+        self.assertEqual(self.summary()['total_expenses'], expected)
+        self.assertEqual(self.summary(amount_min='0.01')['total_expenses'], expected)
+
+        by_category = self.client.get(reverse('transaction-by-category')).data
+        self.assertEqual(
+            [(row['category__name'], row['total']) for row in by_category['expenses_by_category']],
+            [('Rent', Decimal('50.40')), (None, Decimal('12.50'))]
+        )
+        self.assertEqual(self.client.get(reverse('dashboard')).data['total_expenses'], '62.90')
+
+    def test_changing_the_base_currency(self):
+        Budget.objects.create(user=self.user, month=date(2024, 1, 1), amount=Decimal('50.00'))
+        Budget.objects.create(user=self.user, month=date(2024, 2, 1), amount=Decimal('50.00'))
+        self.summary()
+
+        response = self.client.put(reverse('user-currency'), {'base_currency': 'eur'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'base_currency': 'EUR', 'currencies': ['EUR', 'GBP', 'USD']})
+
+        summary = self.summary()
+        self.assertEqual(summary['total_income'], Decimal('100.00'))
+        self.assertEqual(summary['total_expenses'], Decimal('52.00'))
+        # Budgets are converted too: 50 USD at 1.20 and at 1.25
+        february, january = self.client.get(reverse('budget-list')).data['results']
+        self.assertEqual((january['amount'], january['actual_expenses']), ('41.67', 42.0))
+        self.assertEqual(february['amount'], '40.00')
+
+        response = self.client.post(reverse('transaction-list'), {
+            'type': 'EXPENSE', 'amount': '5.00', 'date': '2024-01-02'
+        })
+        self.assertEqual(response.data['currency'], 'EUR')
+
+    def test_conversion_happens_in_the_aggregate_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.summary()
+        aggregates = [query['sql'] for query in queries if 'transactions_monthlyrollup' in query['sql']]
+        self.assertEqual(len(aggregates), 1)
+        self.assertIn('transactions_exchangerate', aggregates[0])
+        # Base-currency amounts are summed as they are, not as floats
+        self.assertIn('SUM("transactions_monthlyrollup"."total")', aggregates[0])
+
+    def test_currency_changes_move_rollup_buckets(self):
+        transaction = Transaction.objects.get(currency='GBP')
+        transaction.currency = 'EUR'
+        transaction.save()
+        expected = list(MonthlyRollup.objects.values_list('month', 'type', 'category', 'currency', 'total', 'count'))
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertCountEqual(
+            MonthlyRollup.objects.values_list('month', 'type', 'category', 'currency', 'total', 'count'),
+            expected
+        )
+        self.assertEqual(self.summary()['total_expenses'], Decimal('60.40'))
+
+    def test_unknown_currencies_are_rejected(self):
+        response = self.client.post(reverse('transaction-list'), {
+            'type': 'EXPENSE', 'amount': '5.00', 'date': '2024-01-02', 'currency': 'JPY'
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('currency', response.data)
+        self.assertEqual(self.client.put(reverse('user-currency'), {'base_currency': 'EURO'}).status_code, 400)
+
+    def test_rates_against_another_reference_need_replace(self):
+        usd_rates = 'date,currency,rate\n2024-01-05,EUR,0.90\n'
+        with self.assertRaises(CommandError):
+            self.load_rates(usd_rates, '--reference', 'USD')
+        # The GBP transaction would no longer convert
+        with self.assertRaises(CommandError):
+            self.load_rates(usd_rates, '--reference', 'USD', '--replace')
+        self.load_rates(usd_rates + '2024-01-05,GBP,0.72\n', '--reference', 'USD', '--replace')
+        self.assertEqual(ExchangeRate.objects.count(), 3)
+
+    def test_base_currency_needs_rates_to_convert(self):
+        # Totals would silently drop amounts whose rate is NULL
+        ExchangeRate.objects.filter(currency='USD').delete()
+        response = self.client.post(reverse('transaction-list'), {
+            'type': 'EXPENSE', 'amount': '5.00', 'date': '2024-01-02', 'currency': 'EUR'
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('USD', str(response.data['currency']))
+        self.assertEqual(self.client.put(reverse('user-currency'), {'base_currency': 'EUR'}).status_code, 400)
+
+        response = self.client.post(reverse('transaction-list'), {
+            'type': 'EXPENSE', 'amount': '5.00', 'date': '2024-01-02', 'currency': 'USD'
+        })
+        self.assertEqual(response.status_code, 201)
+
+
+class AggregateIndexTests(LedgerMixin, TestCase):
+    """The row-level aggregates must be answered from the covering index"""
+
+    def explain(self, queryset):
+        with db_transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Tiny test tables are cheaper to scan; ask whether the
+                # index is usable at all
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            return queryset.explain()
+
+    def assertUsesIndex(self, queryset):
+        plan = self.explain(queryset)
+        if connection.vendor == 'sqlite':
+            self.assertIn('USING COVERING INDEX transaction_user_date_cov_idx', plan)
+            self.assertNotIn('SCAN transactions_transaction', plan)
+        elif connection.vendor == 'postgresql':
+            self.assertRegex(plan, r'Index (Only )?Scan using transaction_user_date_cov_idx')
+        else:
+            self.skipTest(f'No plan expectations for {connection.vendor}')
+
+    def test_summary_by_month(self):
+        transactions = filter_period(Transaction.objects.filter(user=self.user), 'date', 3, 2024)
+        self.assertUsesIndex(
+            transactions.values('type').annotate(total=Sum('amount'), count=Count('id')).order_by('type')
+        )
+
+    def test_expenses_by_category_for_year(self):
+        transactions = filter_period(Transaction.objects.filter(user=self.user), 'date', None, 2024)
+        self.assertUsesIndex(
+            transactions.filter(type='EXPENSE').values('category_id').annotate(total=Sum('amount')).order_by()
+        )
+
+
+class ConditionalGetTests(LedgerMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        self.add_transaction('EXPENSE', '40.00', date(2024, 1, 15), self.rent)
+
+    def test_matching_etag_returns_304_before_any_work(self):
+        url = reverse('transaction-list')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+        with self.assertNumQueries(1):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+        self.assertEqual(cached['ETag'], response['ETag'])
+
+    def test_etag_changes_with_data_and_params(self):
+        url = reverse('transaction-summary')
+        etag = self.client.get(url)['ETag']
+        self.assertNotEqual(self.client.get(url, {'year': 2024})['ETag'], etag)
+
+        self.add_transaction('EXPENSE', '1.00', date(2024, 1, 16), self.rent)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_expenses'], Decimal('41.00'))
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_function_views(self):
+        Budget.objects.create(user=self.user, month=date.today().replace(day=1), amount=Decimal('10.00'))
+        for name in ('dashboard', 'user-profile', 'category-list', 'budget-current'):
+            response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, 200, name)
+            again = self.client.get(reverse(name), HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(again.status_code, 304, name)
+
+    def test_if_modified_since_is_ignored(self):
+        # A one-second HTTP date cannot tell apart writes within that second
+        url = reverse('transaction-summary')
+        self.client.get(url)
+        self.add_transaction('EXPENSE', '1.00', date(2024, 1, 16), self.rent)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_expenses'], Decimal('41.00'))
+
+    def test_profile_change_invalidates_etag(self):
+        url = reverse('user-profile')
+        etag = self.client.get(url)['ETag']
+        self.user.first_name = 'Alice'
+        self.user.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['first_name'], 'Alice')
+
+    def test_writes_are_not_conditional(self):
+        response = self.client.post(reverse('category-list'), {'name': 'Food', 'type': 'EXPENSE'})
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('ETag', response)
+
+
+class ReplicaRouterTests(TestCase):
+
+    def route(self, updated_at, model=Transaction):
+        """Routing decision for a request whose user last wrote at `updated_at`"""
+        def decide():
+            routers.route_reads(updated_at)
+            router = routers.ReplicaRouter()
+            return router.db_for_read(model), router.db_for_write(model)
+        return contextvars.copy_context().run(decide)
+
+    def test_without_a_replica_everything_uses_default(self):
+        self.assertEqual(self.route(None), ('default', 'default'))
+
+    def test_safe_reads_go_to_the_replica_unless_recently_written(self):
+        replica = {**settings.DATABASES, 'replica': settings.DATABASES['default']}
+        with self.settings(DATABASES=replica, REPLICA_PIN_SECONDS=10):
+            self.assertEqual(self.route(None), ('replica', 'default'))
+            self.assertEqual(self.route(timezone.now() - timedelta(minutes=1)), ('replica', 'default'))
+            self.assertEqual(self.route(timezone.now()), ('default', 'default'))
+            self.assertEqual(self.route(None, DataVersion), ('default', 'default'))
+        self.assertFalse(routers.reading_from_replica())
+
+
+class WriteRetryTests(APITransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('erin', 'erin@example.com', 'secret123')
+        self.attempts = 0
+
+    def write(self, error):
+        self.attempts += 1
+        Category.objects.create(user=self.user, name=f'Attempt {self.attempts}', type='EXPENSE')
+        if self.attempts == 1:
+            raise OperationalError(error)
+        return self.attempts
+
+    @override_settings(SQLITE_WRITE_RETRIES=2)
+    def test_locked_writes_are_rolled_back_and_retried(self):
+        self.assertEqual(run_write(self.write, 'database is locked'), 2)
+        self.assertEqual(list(self.user.categories.values_list('name', flat=True)), ['Attempt 2'])
+
+    @override_settings(SQLITE_WRITE_RETRIES=2)
+    def test_locked_import_is_replayed_from_the_start_of_the_upload(self):
+        def lock_first_insert(execute, sql, params, many, context):
+            if sql.startswith('INSERT INTO "transactions_transaction"') and not self.attempts:
+                self.attempts += 1
+                raise OperationalError('database is locked')
+            return execute(sql, params, many, context)
+
+        self.client.force_authenticate(self.user)
+        upload = SimpleUploadedFile('statement.csv', b'date,amount\n2024-01-02,-5.00\n2024-01-03,-7.50\n')
+        with connection.execute_wrapper(lock_first_insert):
+            response = self.client.post(reverse('transaction-import'), {'file': upload}, format='multipart')
+        self.assertEqual(self.attempts, 1)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(self.user.transactions.count(), 2)
+
+    def test_other_errors_are_not_retried(self):
+        with self.assertRaises(OperationalError):
+            run_write(self.write, 'no such table: transactions_category')
+        self.assertEqual(self.attempts, 1)
+        self.assertFalse(self.user.categories.exists())
+
+
+class AsyncAggregateViewTests(LedgerMixin, APITransactionTestCase):
+    """
+    The async views query from their own pool threads, which only see
+    committed rows, hence a transaction test case
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        current_month = date.today().replace(day=1)
+        Budget.objects.create(user=self.user, month=current_month, amount=Decimal('80.00'))
+        self.add_transaction('INCOME', '100.00', current_month, self.salary)
+        self.add_transaction('EXPENSE', '30.00', current_month, self.rent)
+        self.add_transaction('EXPENSE', '5.00', date(2024, 1, 1))
+
+    def get_both(self, sync_name, async_name, params=None):
+        expected = self.client.get(reverse(sync_name), params)
+        cache.clear()
+        response = self.client.get(reverse(async_name), params)
+        self.assertEqual(response.status_code, 200)
+        return expected, response
+
+    def test_dashboard_matches_sync_view(self):
+        expected, response = self.get_both('dashboard', 'dashboard-async')
+        self.assertEqual(response.json(), expected.json())
+        self.assertEqual(response.json()['budget_remaining'], '50.00')
+
+    def test_by_category_matches_sync_view(self):
+        for params in ({}, {'year': 2024}, {'amount_min': '10'}):
+            expected, response = self.get_both(
+                'transaction-by-category', 'transaction-by-category-async', params
+            )
+            self.assertEqual(response.json(), expected.json(), params)
+
+    def test_conditional_get_and_errors(self):
+        url = reverse('dashboard-async')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.post(url).status_code, 405)
+
+        response = self.client.get(reverse('transaction-by-category-async'), {'month': 13})
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_authenticate(None)
+        self.assertEqual(
+            self.client.get(url).status_code,
+            self.client.get(reverse('dashboard')).status_code
+        )
+
+
+class QueryBudgetTests(APITransactionTestCase):
+    """Every endpoint in transactions/urls.py stays within its query budget"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = generate_ledger('budgets', transactions=300, categories=12, budgets=3, seed=7)
+        self.client.force_authenticate(self.user)
+        search.is_available()
+
+    def test_endpoints_within_query_budget(self):
+        for endpoint in ENDPOINTS:
+            with self.subTest(endpoint.name):
+                cache.clear()
+                url = endpoint_url(endpoint, self.user)
+                data = request_data(endpoint, self.user)
+                with QueryCounter() as counter:
+                    response = call(self.client, endpoint, url, data)
+                self.assertLess(response.status_code, 300)
+                self.assertLessEqual(counter.count, endpoint.max_queries)
+
+    def test_generated_ledger(self):
+        self.assertEqual(self.user.transactions.count(), 300)
+        self.assertEqual(self.user.budgets.count(), 3)
+        self.assertEqual(self.user.categories.count(), 12)
+        rollup_total = MonthlyRollup.objects.filter(user=self.user).aggregate(total=Sum('count'))
+        self.assertEqual(rollup_total['total'], 300)
+
+
+class MetricsTests(LedgerMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        REGISTRY.clear()
+        self.add_transaction('EXPENSE', '40.00', date(2024, 1, 15), self.rent)
+        self.staff = User.objects.create_user('ops', 'ops@example.com', 'secret123', is_staff=True)
+
+    def scrape(self, **headers):
+        self.client.force_authenticate(None)
+        return self.client.get(reverse('metrics'), **headers)
+
+    def test_records_routes_queries_and_cache_results(self):
+        self.client.force_authenticate(self.user)
+        self.client.get(reverse('transaction-list'))
+        self.client.get(reverse('transaction-summary'))
+        self.client.get(reverse('transaction-summary'))
+
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+
+        self.assertIn(
+            'budgettracker_http_request_duration_seconds_count'
+            '{route="transaction-list",method="GET",status="200"} 1', body
+        )
+        self.assertIn('budgettracker_http_request_db_queries_sum{route="transaction-list",method="GET"} 3', body)
+        self.assertIn('budgettracker_http_request_serializer_seconds_count{route="transaction-list",method="GET"} 1', body)
+        self.assertIn('budgettracker_aggregate_cache_requests_total{prefix="transaction_summary",result="hit"} 1', body)
+        self.assertIn('budgettracker_aggregate_cache_requests_total{prefix="transaction_summary",result="miss"} 1', body)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_requires_staff_or_token(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(self.scrape().status_code, 401)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer scrape-secret').status_code, 200)
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=0.001)
+    def test_logs_slow_requests_with_their_sql(self):
+        self.client.force_authenticate(self.user)
+        with self.assertLogs('transactions.metrics', 'WARNING') as logs:
+            self.client.get(reverse('transaction-list'))
+        self.assertIn('Slow request GET /api/transactions/', logs.output[0])
+        self.assertIn('transactions_transaction', logs.output[0])
@@ -5,7 +5,11 @@ from .views import (
     TransactionViewSet,
     BudgetViewSet,
     dashboard_view,
-    user_profile_view
+    dashboard_async_view,
+    by_category_async_view,
+    user_profile_view,
+    currency_view,
+    metrics_view
 )
 
 router = DefaultRouter()
@@ -14,9 +18,14 @@ router.register(r'transactions', TransactionViewSet, basename='transaction')
 router.register(r'budgets', BudgetViewSet, basename='budget')
 
 urlpatterns = [
+    # Async variants (ASGI)
+    path('transactions/by_category/async/', by_category_async_view, name='transaction-by-category-async'),
+    path('dashboard/async/', dashboard_async_view, name='dashboard-async'),
     # Default
     path('', include(router.urls)),
     # Custom
     path('dashboard/', dashboard_view, name='dashboard'),
     path('user/', user_profile_view, name='user-profile'),
+    path('user/currency/', currency_view, name='user-currency'),
+    path('metrics/', metrics_view, name='metrics'),
 ]
\ No newline at end of file
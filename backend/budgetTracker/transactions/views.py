@@ -1,26 +1,70 @@
 from rest_framework import viewsets, status, filters
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import action, api_view, authentication_classes, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Sum, Q
-from django.core.cache import cache
-from datetime import date
-from decimal import Decimal
+from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.exceptions import ValidationError
+from rest_framework.views import APIView
+from rest_framework.settings import api_settings
+from rest_framework.renderers import BrowsableAPIRenderer
+from asgiref.sync import sync_to_async
+from django.db.models import Sum, Count, Q, Prefetch, Subquery
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_safe
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+from functools import partial
+import io
+import json
 
-from .models import Category, Transaction, Budget
+from .models import ArchivedTransaction, Category, Transaction, Budget, MonthlyRollup, Profile
 from .serializers import (
     CategorySerializer, TransactionSerializer,
-    BudgetSerializer, UserSerializer, DashboardSerializer
+    BudgetSerializer, UserSerializer, DashboardSerializer,
+    ProfileSerializer, expand_category
 )
-from .permissions import IsOwner
+from .permissions import IsMetricsScraper, IsOwner
+from .filters import FullTextSearchFilter
+from .pagination import TransactionCursorPagination
+from .importers import ImportFileError, TransactionImporter, guess_format, parse
+from .batch import BatchError, TransactionBatch
+from .category_templates import DEFAULT_TEMPLATE, describe_templates, seed_categories
+from .exporters import EXPORT_FORMATS, EXPORT_FIELDS, stream_export
+from .caching import aget_or_set, get_or_set, normalize_params
+from .concurrency import run_concurrently
+from .conditional import ConditionalGetMixin, conditional_get
+from .retries import WriteRetryMixin
+from .fastpath import ValuesListMixin
+from .sparse import SparseQuerysetMixin
+from .renderers import ORJSONRenderer
+from .periods import INTERVALS, filter_period, parse_month, parse_period, period_range
+from . import analytics, archive, fx
+from .metrics import REGISTRY, MetricsTokenAuthentication
 
+# Query params understood by TransactionViewSet.get_queryset
+TRANSACTION_FILTERS = [
+    'type', 'category', 'date_from', 'date_to',
+    'amount_min', 'amount_max', 'month', 'year'
+]
 
-class CategoryViewSet(viewsets.ModelViewSet):
+# Extra query params of the timeseries action
+TIMESERIES_PARAMS = ['interval', 'split']
+
+# Rows fetched per database round trip when streaming exports
+EXPORT_CHUNK_SIZE = 2000
+
+# Query params that cannot be answered from monthly rollups
+ROW_LEVEL_FILTERS = ['date_from', 'date_to', 'amount_min', 'amount_max']
+
+
+class CategoryViewSet(WriteRetryMixin, ConditionalGetMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing categories
     Provides: list, create, retrieve, update, destroy
     """
     serializer_class = CategorySerializer
+    sparse_columns = {'transaction_count': ()}
     permission_classes = [IsAuthenticated, IsOwner]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name']
@@ -28,8 +72,11 @@ class CategoryViewSet(viewsets.ModelViewSet):
     ordering = ['name']
     
     def get_queryset(self):
-        """Return categories for current user only"""
-        return Category.objects.filter(user=self.request.user)
+        """Return categories for current user only, with transaction counts"""
+        queryset = Category.objects.filter(user=self.request.user)
+        if self.wants_field('transaction_count'):
+            queryset = queryset.with_transaction_count()
+        return self.only_sparse_columns(queryset)
     
     def perform_create(self, serializer):
         """Save category with current user"""
@@ -37,69 +84,123 @@ class CategoryViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['post'])
     def create_defaults(self, request):
-        default_categories = [
-            {'name': 'Salary', 'type': 'INCOME'},
-            {'name': 'Freelance', 'type': 'INCOME'},
-            {'name': 'Investment', 'type': 'INCOME'},
-            {'name': 'Other Income', 'type': 'INCOME'},
-            {'name': 'Groceries', 'type': 'EXPENSE'},
-            {'name': 'Rent', 'type': 'EXPENSE'},
-            {'name': 'Utilities', 'type': 'EXPENSE'},
-            {'name': 'Transportation', 'type': 'EXPENSE'},
-            {'name': 'Entertainment', 'type': 'EXPENSE'},
-            {'name': 'Healthcare', 'type': 'EXPENSE'},
-            {'name': 'Shopping', 'type': 'EXPENSE'},
-            {'name': 'Other Expense', 'type': 'EXPENSE'},
-        ]
-        
-        created_categories = []
-        for cat_data in default_categories:
-            category, created = Category.objects.get_or_create(
-                user=request.user,
-                name=cat_data['name'],
-                defaults={'type': cat_data['type']}
+        """Add the missing categories of a template (?template= or body, default 'default')"""
+        template = request.data.get('template') or request.query_params.get('template')
+        try:
+            created = seed_categories(request.user, template or DEFAULT_TEMPLATE)
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            if created:
-                created_categories.append(category)
         
-        all_categories = Category.objects.filter(user=request.user)
+        all_categories = self.get_queryset()
         serializer = self.get_serializer(all_categories, many=True)
         return Response({
-            'message': f'Created {len(created_categories)} default categories',
+            'message': f'Created {created} default categories',
             'categories': serializer.data
         })
+    
+    @action(detail=False, methods=['get'])
+    def templates(self, request):
+        """Category templates selectable at registration and in create_defaults"""
+        return Response(describe_templates())
 
 
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(WriteRetryMixin, ConditionalGetMixin, SparseQuerysetMixin, ValuesListMixin,
+                         viewsets.ModelViewSet):
     """
     ViewSet for managing transactions
+    Lists are built from .values() rows (fastpath) unless ?expand= asks
+    for fields only the serializer can produce
+
+    Lists, exports and writes cover the live table only. Transactions
+    moved to the archive (dated before the X-Archive-Horizon header of
+    list and export responses) are listed with ?archived=true, can still
+    be retrieved by id and are read-only until restored; every total
+    includes them.
     """
     serializer_class = TransactionSerializer
+    renderer_classes = [ORJSONRenderer, BrowsableAPIRenderer]
     permission_classes = [IsAuthenticated, IsOwner]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    # Search runs last so it can order by relevance when ?ordering= is absent
+    filter_backends = [filters.OrderingFilter, FullTextSearchFilter]
     search_fields = ['description', 'category__name']
     ordering_fields = ['date', 'amount', 'created_at']
-    ordering = ['-date', '-created_at']
+    ordering = ['-date', '-created_at', '-id']
+    cursor_pagination_class = TransactionCursorPagination
+    # Ordering and cursor keys are always loaded
+    sparse_required_columns = ('user', 'date', 'created_at')
+    sparse_columns = {
+        'category_name': ('category', 'category__name'),
+        'category_details': ('category', 'category__name', 'category__type'),
+    }
+    
+    @property
+    def paginator(self):
+        """
+        Keyset pagination for ?pagination=cursor (or a ?cursor= link),
+        page-number pagination otherwise
+        """
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if params.get('pagination') == 'cursor' or params.get('cursor'):
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+    
+    def get_object(self):
+        """A live transaction, or an archived one for a plain retrieve"""
+        try:
+            return super().get_object()
+        except Http404:
+            if self.action != 'retrieve':
+                raise
+        transaction = get_object_or_404(
+            ArchivedTransaction.objects.filter(user=self.request.user).select_related('category'),
+            pk=self.kwargs['pk']
+        )
+        self.check_object_permissions(self.request, transaction)
+        return transaction
+    
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.action in ('list', 'export') and not self.browsing_archive():
+            response['X-Archive-Horizon'] = archive.horizon().isoformat()
+        return response
     
     def get_queryset(self):
         """Return transactions for current user with custom filtering"""
-        queryset = Transaction.objects.filter(
+        model = ArchivedTransaction if self.browsing_archive() else Transaction
+        queryset = model.objects.filter(
             user=self.request.user
-        ).select_related('category', 'user').order_by('-date', '-created_at')
+        ).order_by('-date', '-created_at', '-id')
+        
+        columns = self.sparse_columns
+        if expand_category(self.request) and self.wants_field('category_details'):
+            queryset = queryset.prefetch_related(Prefetch(
+                'category',
+                queryset=Category.objects.with_transaction_count()
+            ))
+            columns = dict.fromkeys(columns, ('category',))
+        elif self.wants_field('category_name', 'category_details'):
+            queryset = queryset.select_related('category')
         
+        return self.filter_transactions(self.only_sparse_columns(queryset, columns))
+    
+    def filter_transactions(self, queryset):
+        """Apply the list filters to a Transaction or ArchivedTransaction queryset"""
         transaction_type = self.request.query_params.get('type', None)
-        category_id = self.request.query_params.get('category', None)
-        date_from = self.request.query_params.get('date_from', None)
-        date_to = self.request.query_params.get('date_to', None)
-        amount_min = self.request.query_params.get('amount_min', None)
-        amount_max = self.request.query_params.get('amount_max', None)
-        month = self.request.query_params.get('month', None)
-        year = self.request.query_params.get('year', None)
+        category_id = self.get_category_id()
+        date_from, date_to = self.get_date_bounds()
+        amount_min, amount_max = self.get_amount_bounds()
+        month, year = self.get_period()
         
         if transaction_type:
             queryset = queryset.filter(type=transaction_type)
         
-        if category_id:
+        if category_id is not None:
             queryset = queryset.filter(category_id=category_id)
         
         if date_from:
@@ -108,19 +209,111 @@ class TransactionViewSet(viewsets.ModelViewSet):
         if date_to:
             queryset = queryset.filter(date__lte=date_to)
         
-        if amount_min:
+        if amount_min is not None:
             queryset = queryset.filter(amount__gte=amount_min)
         
-        if amount_max:
+        if amount_max is not None:
             queryset = queryset.filter(amount__lte=amount_max)
         
-        if month:
-            queryset = queryset.filter(date__month=month)
+        return filter_period(queryset, 'date', month, year)
+    
+    def browsing_archive(self):
+        """?archived=true lists (or exports) the archived transactions instead"""
+        return (
+            self.action in ('list', 'export')
+            and self.request.query_params.get('archived', '').lower() in ('1', 'true', 'yes')
+        )
+    
+    def get_archive_queryset(self):
+        """
+        Return the user's archived transactions with the request filters
+        applied, or None when the requested range starts after the
+        archive horizon and so cannot include any
+        """
+        start, _ = self.get_date_range()
+        if not archive.reaches_archive(start):
+            return None
+        return self.filter_transactions(
+            ArchivedTransaction.objects.filter(user=self.request.user)
+        )
+    
+    def combine_archive(self, group):
+        """
+        `group` (a function turning a queryset into grouped values)
+        applied to the filtered transactions, UNION ALL the same over the
+        archived ones when the range reaches into the archive
+        """
+        hot = group(self.get_queryset().select_related(None).prefetch_related(None))
+        archived = self.get_archive_queryset()
+        return archive.combine(hot, None if archived is None else group(archived))
+    
+    def get_period(self):
+        """The validated ?month= / ?year= params as ints (or None)"""
+        params = self.request.query_params
+        try:
+            return parse_period(params.get('month'), params.get('year'))
+        except ValueError as e:
+            raise ValidationError({'error': str(e)})
+    
+    def get_category_id(self):
+        """The validated ?category= param as an int (or None)"""
+        value = self.request.query_params.get('category')
+        if not value:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError({'error': 'category must be a category id'})
+    
+    def get_date_bounds(self):
+        """The validated ?date_from= / ?date_to= params as dates (or None)"""
+        params = self.request.query_params
+        try:
+            return tuple(
+                date.fromisoformat(params[name]) if params.get(name) else None
+                for name in ('date_from', 'date_to')
+            )
+        except ValueError:
+            raise ValidationError({'error': 'date_from and date_to must be YYYY-MM-DD dates'})
+    
+    def get_amount_bounds(self):
+        """The validated ?amount_min= / ?amount_max= params as Decimals (or None)"""
+        params = self.request.query_params
+        bounds = []
+        for name in ('amount_min', 'amount_max'):
+            value = None
+            if params.get(name):
+                try:
+                    value = Decimal(params[name])
+                except InvalidOperation:
+                    pass
+                if value is None or not value.is_finite():
+                    raise ValidationError({'error': f'{name} must be a number'})
+            bounds.append(value)
+        return tuple(bounds)
+    
+    def get_rollup_queryset(self):
+        """
+        Return the user's monthly rollups with the request filters applied,
+        or None when a filter needs row-level data (exact dates, amounts)
+        """
+        params = self.request.query_params
+        if any(params.get(param) for param in ROW_LEVEL_FILTERS):
+            return None
         
-        if year:
-            queryset = queryset.filter(date__year=year)
+        queryset = MonthlyRollup.objects.filter(user=self.request.user)
         
-        return queryset
+        transaction_type = params.get('type', None)
+        category_id = self.get_category_id()
+        month, year = self.get_period()
+        
+        if transaction_type:
+            queryset = queryset.filter(type=transaction_type)
+        
+        if category_id is not None:
+            queryset = queryset.filter(category_id=category_id)
+        
+        return filter_period(queryset, 'month', month, year)
     
     def perform_create(self, serializer):
         """Save transaction with current user"""
@@ -129,76 +322,324 @@ class TransactionViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def summary(self, request):
         """Get transaction summary statistics"""
-        user_id = request.user.id
-        cache_key = f'transaction_summary_{user_id}'
-        
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            return Response(cached_data)
-            
-        queryset = self.get_queryset()
-        
-        totals = queryset.values('type').annotate(
-            total=Sum('amount')
-        ).order_by('type')
+        data = get_or_set(
+            'transaction_summary',
+            request.user.id,
+            normalize_params(request.query_params, TRANSACTION_FILTERS),
+            self._compute_summary,
+            version=request.data_version
+        )
+        return Response(data)
+    
+    def _compute_summary(self):
+        base_currency = fx.request_base_currency(self.request)
+        rollups = self.get_rollup_queryset()
+        if rollups is not None:
+            totals = rollups.values('type').annotate(
+                total=fx.converted_sum('total', 'month', base_currency),
+                count=Sum('count')
+            ).order_by('type')
+        else:
+            totals = self.combine_archive(lambda queryset: queryset.values('type').annotate(
+                total=fx.converted_sum('amount', 'date', base_currency),
+                count=Count('id')
+            ))
         
         income_total = Decimal('0.00')
         expense_total = Decimal('0.00')
+        transaction_count = 0
         
         for total in totals:
+            transaction_count += total['count'] or 0
             if total['type'] == 'INCOME':
-                income_total = total['total'] or Decimal('0.00')
+                income_total += total['total'] or Decimal('0.00')
             elif total['type'] == 'EXPENSE':
-                expense_total = total['total'] or Decimal('0.00')
+                expense_total += total['total'] or Decimal('0.00')
         
-        response_data = {
+        return {
             'total_income': income_total,
             'total_expenses': expense_total,
             'balance': income_total - expense_total,
-            'transaction_count': queryset.count()
+            'transaction_count': transaction_count
         }
-        
-        cache.set(cache_key, response_data, 300)
-        
-        return Response(response_data)
     
     @action(detail=False, methods=['get'])
     def by_category(self, request):
         """Get transactions grouped by category"""
-        queryset = self.get_queryset()
+        data = get_or_set(
+            'transaction_by_category',
+            request.user.id,
+            normalize_params(request.query_params, TRANSACTION_FILTERS),
+            self._compute_by_category,
+            version=request.data_version
+        )
+        return Response(data)
+    
+    def _compute_by_category(self):
+        income_by_cat, expense_by_cat = self._by_category_querysets()
+        return {
+            'income_by_category': archive.merge_totals(income_by_cat, 'category__name'),
+            'expenses_by_category': archive.merge_totals(expense_by_cat, 'category__name')
+        }
+    
+    def _by_category_querysets(self):
+        """
+        Unevaluated (income, expense) per-category totals; row-level ones
+        may hold a category twice (live and archived), so read them
+        through archive.merge_totals()
+        """
+        base_currency = fx.request_base_currency(self.request)
+        queryset = self.get_rollup_queryset()
+        if queryset is not None:
+            income_by_cat = queryset.filter(type='INCOME').values(
+                'category__name'
+            ).annotate(total=fx.converted_sum('total', 'month', base_currency)).order_by('-total')
+            
+            expense_by_cat = queryset.filter(type='EXPENSE').values(
+                'category__name'
+            ).annotate(total=fx.converted_sum('total', 'month', base_currency)).order_by('-total')
+            
+            return income_by_cat, expense_by_cat
         
-        income_by_cat = queryset.filter(type='INCOME').values(
-            'category__name'
-        ).annotate(total=Sum('amount')).order_by('-total')
+        income_by_cat = self.combine_archive(lambda queryset: queryset.filter(
+            type='INCOME'
+        ).values('category__name').annotate(total=fx.converted_sum('amount', 'date', base_currency)))
         
-        expense_by_cat = queryset.filter(type='EXPENSE').values(
-            'category__name'
-        ).annotate(total=Sum('amount')).order_by('-total')
+        expense_by_cat = self.combine_archive(lambda queryset: queryset.filter(
+            type='EXPENSE'
+        ).values('category__name').annotate(total=fx.converted_sum('amount', 'date', base_currency)))
         
-        return Response({
-            'income_by_category': list(income_by_cat),
-            'expenses_by_category': list(expense_by_cat)
-        })
+        return income_by_cat, expense_by_cat
+    
+    @action(detail=False, methods=['get'])
+    def timeseries(self, request):
+        """
+        Income and expense totals per ?interval=day|week|month|year
+        (default month); ?split=category adds a series per category.
+        All list filters apply and empty periods are zero-filled
+        """
+        interval = request.query_params.get('interval', 'month')
+        if interval not in INTERVALS:
+            return Response(
+                {'error': f"interval must be one of: {', '.join(INTERVALS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        split = request.query_params.get('split') == 'category'
+        
+        data = get_or_set(
+            'transaction_timeseries',
+            request.user.id,
+            normalize_params(request.query_params, TRANSACTION_FILTERS + TIMESERIES_PARAMS),
+            partial(self._compute_timeseries, interval, split),
+            version=request.data_version
+        )
+        return Response(data)
+    
+    def _compute_timeseries(self, interval, split):
+        start, end = self.get_date_range()
+        if start is not None and end is not None:
+            try:
+                analytics.check_length(start, end, interval)
+            except ValueError as e:
+                raise ValidationError({'error': str(e)})
+        
+        base_currency = fx.request_base_currency(self.request)
+        rollups = self.get_timeseries_rollups(interval, start, end)
+        if rollups is not None:
+            rows = analytics.grouped_rollups(rollups, interval, base_currency, split)
+        else:
+            rows = self.combine_archive(
+                lambda queryset: analytics.grouped_transactions(queryset, interval, base_currency, split)
+            )
+        
+        try:
+            return analytics.build_series(rows, interval, start, end, split)
+        except ValueError as e:
+            raise ValidationError({'error': str(e)})
+    
+    def get_date_range(self):
+        """
+        The inclusive (start, end) dates the request covers, combining
+        ?date_from= / ?date_to= with ?month= / ?year=; either may be None
+        """
+        start, end = self.get_date_bounds()
+        bounds = period_range(*self.get_period())
+        if bounds is not None:
+            start = max(start, bounds[0]) if start else bounds[0]
+            last = bounds[1] - timedelta(days=1)
+            end = min(end, last) if end else last
+        return start, end
+    
+    def get_timeseries_rollups(self, interval, start, end):
+        """
+        Monthly rollups for month/year series over whole months, or None
+        when the series needs row-level data
+        """
+        params = self.request.query_params
+        if interval not in ('month', 'year'):
+            return None
+        if params.get('amount_min') or params.get('amount_max'):
+            return None
+        if start is not None and start.day != 1:
+            return None
+        if end is not None and (end + timedelta(days=1)).day != 1:
+            return None
+        
+        queryset = MonthlyRollup.objects.filter(user=self.request.user)
+        if params.get('type'):
+            queryset = queryset.filter(type=params['type'])
+        category_id = self.get_category_id()
+        if category_id is not None:
+            queryset = queryset.filter(category_id=category_id)
+        month, year = self.get_period()
+        if start is not None:
+            queryset = queryset.filter(month__gte=start)
+        if end is not None:
+            queryset = queryset.filter(month__lte=end)
+        return filter_period(queryset, 'month', month, year)
+    
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='import',
+        url_name='import',
+        parser_classes=[MultiPartParser, FormParser]
+    )
+    def import_file(self, request):
+        """
+        Import a CSV, OFX or QIF bank statement
+        Form fields: file, format (optional), mapping (JSON, CSV only),
+        date_format (optional), create_categories (default true)
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {'error': 'A file is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            file_format = request.data.get('format') or guess_format(upload.name)
+            mapping = json.loads(request.data.get('mapping') or '{}')
+            if not isinstance(mapping, dict):
+                raise ImportFileError('Mapping must be a JSON object')
+            importer = TransactionImporter(
+                request.user,
+                date_format=request.data.get('date_format') or None,
+                create_categories=str(
+                    request.data.get('create_categories', 'true')
+                ).lower() not in ('0', 'false', 'no')
+            )
+            # The handler is rerun when the database is locked: read the
+            # upload from the start each time and leave it open afterwards
+            upload.file.seek(0)
+            stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+            try:
+                result = importer.run(parse(stream, file_format.lower(), mapping))
+            finally:
+                stream.detach()
+        except (ImportFileError, ValueError) as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if result.created:
+            response_status = status.HTTP_201_CREATED
+        elif result.error_count:
+            response_status = status.HTTP_400_BAD_REQUEST
+        else:
+            response_status = status.HTTP_200_OK
+        return Response(result.as_dict(), status=response_status)
+    
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        Create, update and delete many transactions in one request
+        Body: {"operations": [{"op": "create", "data": {...}},
+        {"op": "update", "id": 1, "data": {...}}, {"op": "delete", "id": 2}]}
+        Nothing is written unless every operation is valid
+        """
+        operations = request.data
+        if isinstance(operations, dict):
+            operations = operations.get('operations')
+        
+        try:
+            result = TransactionBatch(request.user, self.get_serializer_context()).run(operations)
+        except BatchError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        response_status = status.HTTP_200_OK if result.applied else status.HTTP_400_BAD_REQUEST
+        return Response(result.as_dict(), status=response_status)
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream the filtered transactions as CSV (default) or NDJSON
+        Use ?output=ndjson; all list filters, search and ordering apply
+        """
+        output = request.query_params.get('output', 'csv').lower()
+        if output not in EXPORT_FORMATS:
+            return Response(
+                {'error': f"Unsupported output '{output}'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = (
+            queryset
+            .select_related(None)
+            .prefetch_related(None)
+            .values_list(*EXPORT_FIELDS)
+            .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        )
+        
+        content_type, extension = EXPORT_FORMATS[output]
+        response = StreamingHttpResponse(
+            stream_export(rows, output),
+            content_type=content_type
+        )
+        filename = f'transactions-{date.today():%Y%m%d}.{extension}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
 
 
-class BudgetViewSet(viewsets.ModelViewSet):
+class BudgetViewSet(WriteRetryMixin, ConditionalGetMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing budgets
     """
     serializer_class = BudgetSerializer
+    sparse_columns = {
+        'actual_expenses': ('month',),
+        'remaining': ('month', 'amount'),
+        'percentage_used': ('month', 'amount'),
+    }
     permission_classes = [IsAuthenticated, IsOwner]
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ['month', 'amount']
     ordering = ['-month']
     
     def get_queryset(self):
-        """Return budgets for current user only"""
-        return Budget.objects.filter(user=self.request.user)
+        """Return budgets for current user only, with their actual expenses"""
+        queryset = Budget.objects.filter(user=self.request.user)
+        if self.wants_field('actual_expenses', 'remaining', 'percentage_used'):
+            queryset = queryset.with_actual_expenses(fx.request_base_currency(self.request))
+        return self.only_sparse_columns(queryset)
     
     def perform_create(self, serializer):
         """Save budget with current user"""
         serializer.save(user=self.request.user)
     
+    def perform_update(self, serializer):
+        """Save budget, re-reading its actual expenses if the month moved"""
+        month = serializer.instance.month
+        budget = serializer.save()
+        if budget.month != month:
+            serializer.instance = self.get_queryset().get(pk=budget.pk)
+    
     @action(detail=False, methods=['get'])
     def current(self, request):
         """Get current month's budget"""
@@ -206,10 +647,7 @@ class BudgetViewSet(viewsets.ModelViewSet):
         current_month = date(today.year, today.month, 1)
         
         try:
-            budget = Budget.objects.get(
-                user=request.user,
-                month=current_month
-            )
+            budget = self.get_queryset().get(month=current_month)
             serializer = self.get_serializer(budget)
             return Response(serializer.data)
         except Budget.DoesNotExist:
@@ -218,6 +656,45 @@ class BudgetViewSet(viewsets.ModelViewSet):
                 'month': current_month
             }, status=status.HTTP_404_NOT_FOUND)
     
+    @action(detail=False, methods=['get'])
+    def report(self, request):
+        """
+        Budget, actual expenses, remaining and over/under flags per month
+        Range: ?start=YYYY-MM&end=YYYY-MM (inclusive) or ?year=, default
+        the current year
+        """
+        params = request.query_params
+        try:
+            if params.get('start') or params.get('end'):
+                start = parse_month('start', params.get('start'))
+                end = parse_month('end', params.get('end'))
+            else:
+                year = parse_period(year=params.get('year'))[1] or date.today().year
+                start, end = date(year, 1, 1), date(year, 12, 1)
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            data = get_or_set(
+                'budget_report',
+                request.user.id,
+                [('start', start.isoformat()), ('end', end.isoformat())],
+                partial(
+                    analytics.budget_report, request.user, start, end,
+                    fx.request_base_currency(request)
+                ),
+                version=request.data_version
+            )
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(data)
+    
     @action(detail=False, methods=['post'])
     def set_current(self, request):
         """Set or update current month's budget"""
@@ -237,6 +714,7 @@ class BudgetViewSet(viewsets.ModelViewSet):
             defaults={'amount': amount}
         )
         
+        budget = self.get_queryset().get(pk=budget.pk)
         serializer = self.get_serializer(budget)
         return Response(
             serializer.data,
@@ -246,109 +724,238 @@ class BudgetViewSet(viewsets.ModelViewSet):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_get
 def dashboard_view(request):
     """
     Get comprehensive dashboard data
     """
-    user = request.user
     today = date.today()
     current_month = date(today.year, today.month, 1)
     
-    all_transactions = (
-        Transaction.objects.filter(user=user)
-        .select_related('category')
-        .only('id', 'amount', 'type', 'date', 'category__name')
+    data = get_or_set(
+        'dashboard',
+        request.user.id,
+        [('month', current_month.isoformat())],
+        lambda: _build_dashboard(request.user, current_month, request.base_currency),
+        version=request.data_version
     )
-    
-    month_transactions = all_transactions.filter(
-        date__year=today.year,
-        date__month=today.month
+    return Response(data)
+
+
+def _build_dashboard(user, current_month, base_currency):
+    """
+    Dashboard figures from two queries: one conditional aggregation over
+    the rollups (per-category lifetime and current-month sums, with the
+    month's budget as a scalar subquery) and one for the recent rows
+    """
+    return _serialize_dashboard(
+        _dashboard_totals(user, current_month, base_currency),
+        _recent_transactions(user)
     )
+
+
+def _dashboard_totals(user, current_month, base_currency):
+    current_budget = Budget.objects.filter(
+        user=user,
+        month=current_month
+    ).order_by().values_list('amount', flat=True)
     
-    transaction_totals = all_transactions.values('type').annotate(
-        total=Sum('amount')
-    ).order_by('type')
-    
-    monthly_totals = month_transactions.values('type').annotate(
-        total=Sum('amount')
-    ).order_by('type')
-    
-    total_income = Decimal('0.00')
-    total_expenses = Decimal('0.00')
-    monthly_income = Decimal('0.00')
-    monthly_expenses = Decimal('0.00')
-    
-    for total in transaction_totals:
-        if total['type'] == 'INCOME':
-            total_income = total['total'] or Decimal('0.00')
-        elif total['type'] == 'EXPENSE':
-            total_expenses = total['total'] or Decimal('0.00')
-            
-    for total in monthly_totals:
-        if total['type'] == 'INCOME':
-            monthly_income = total['total'] or Decimal('0.00')
-        elif total['type'] == 'EXPENSE':
-            monthly_expenses = total['total'] or Decimal('0.00')
-    
-    category_totals = (
-        all_transactions
+    category_totals = list(
+        MonthlyRollup.objects.filter(user=user)
         .values('type', 'category__name')
-        .annotate(total=Sum('amount'))
-        .order_by('type', '-total')
+        .annotate(
+            lifetime=fx.converted_sum('total', 'month', base_currency),
+            monthly=fx.converted_sum('total', 'month', base_currency, filter=Q(month=current_month)),
+            budget=Subquery(current_budget[:1])
+        )
+        .order_by('type', '-lifetime')
     )
     
+    if category_totals:
+        budget = category_totals[0]['budget']
+    else:
+        # Empty ledger: the aggregation had no row to carry the budget
+        budget = current_budget.first()
+    
+    totals = {Transaction.INCOME: Decimal('0.00'), Transaction.EXPENSE: Decimal('0.00')}
+    monthly = {Transaction.INCOME: Decimal('0.00'), Transaction.EXPENSE: Decimal('0.00')}
+    for item in category_totals:
+        totals[item['type']] += item['lifetime'] or Decimal('0.00')
+        monthly[item['type']] += item['monthly'] or Decimal('0.00')
+    
     income_by_category = [
-        {'category__name': item['category__name'], 'total': item['total']}
+        {'category__name': item['category__name'], 'total': item['lifetime']}
         for item in category_totals
-        if item['type'] == 'INCOME'
+        if item['type'] == Transaction.INCOME
     ]
     
     expenses_by_category = [
-        {'category__name': item['category__name'], 'total': item['total']}
+        {'category__name': item['category__name'], 'total': item['lifetime']}
         for item in category_totals
-        if item['type'] == 'EXPENSE'
+        if item['type'] == Transaction.EXPENSE
     ]
     
-    current_budget = None
-    budget_remaining = None
-    try:
-        budget = Budget.objects.select_related('user').get(
-            user=user,
-            month=current_month
-        )
-        current_budget = budget.amount
-        try:
-            budget_remaining = budget.get_remaining()
-        except Exception as e:
-            print(f"Error calculating budget remaining: {str(e)}")
-            budget_remaining = current_budget
-    except Budget.DoesNotExist:
-        pass
-    except Exception as e:
-        print(f"Error fetching budget: {str(e)}")
-    
-    recent_transactions = all_transactions.order_by('-date', '-created_at')[:5]
-    
-    data = {
-        'total_income': total_income,
-        'total_expenses': total_expenses,
-        'balance': total_income - total_expenses,
-        'monthly_income': monthly_income,
-        'monthly_expenses': monthly_expenses,
-        'current_month_budget': current_budget,
-        'budget_remaining': budget_remaining,
+    return {
+        'total_income': totals[Transaction.INCOME],
+        'total_expenses': totals[Transaction.EXPENSE],
+        'balance': totals[Transaction.INCOME] - totals[Transaction.EXPENSE],
+        'monthly_income': monthly[Transaction.INCOME],
+        'monthly_expenses': monthly[Transaction.EXPENSE],
+        'current_month_budget': budget,
+        'budget_remaining': None if budget is None else budget - monthly[Transaction.EXPENSE],
         'income_by_category': income_by_category,
-        'expenses_by_category': expenses_by_category,
-        'recent_transactions': recent_transactions
+        'expenses_by_category': expenses_by_category
     }
+
+
+def _recent_transactions(user):
+    return list(
+        Transaction.objects.filter(user=user)
+        .select_related('category')
+        .order_by('-date', '-created_at', '-id')[:5]
+    )
+
+
+def _serialize_dashboard(totals, recent_transactions):
+    serializer = DashboardSerializer({
+        **totals,
+        'recent_transactions': recent_transactions
+    })
+    return serializer.data
+
+
+class AsyncGateView(ConditionalGetMixin, APIView):
+    """
+    DRF request handling without a handler: the async views below run
+    authentication, permissions and conditional GET through it
+    """
+    permission_classes = [IsAuthenticated]
+
+
+def _begin_async(view, request, prepare=None):
+    """
+    The sync half of APIView.dispatch before the handler is called
+    Returns (request, prepare() result, error response or None)
+    """
+    view.args, view.kwargs = (), {}
+    request = view.initialize_request(request)
+    view.request = request
+    view.headers = view.default_response_headers
+    try:
+        view.initial(request)
+        prepared = prepare() if prepare else None
+    except Exception as exc:
+        return request, None, view.handle_exception(exc)
+    return request, prepared, None
+
+
+def _finish_async(view, request, response):
+    return view.finalize_response(request, response).render()
+
+
+@require_safe
+async def dashboard_async_view(request):
+    """
+    dashboard_view for ASGI deployments: the rollup aggregation and the
+    recent transactions are fetched concurrently
+    """
+    view = AsyncGateView()
+    request, _, response = await sync_to_async(_begin_async)(view, request)
     
-    serializer = DashboardSerializer(data)
-    return Response(serializer.data)
+    if response is None:
+        user = request.user
+        today = date.today()
+        current_month = date(today.year, today.month, 1)
+        
+        async def compute():
+            totals, recent_transactions = await run_concurrently(
+                partial(_dashboard_totals, user, current_month, request.base_currency),
+                partial(_recent_transactions, user)
+            )
+            return _serialize_dashboard(totals, recent_transactions)
+        
+        data = await aget_or_set(
+            'dashboard',
+            user.id,
+            [('month', current_month.isoformat())],
+            compute,
+            version=request.data_version
+        )
+        response = Response(data)
+    
+    return await sync_to_async(_finish_async)(view, request, response)
+
+
+@require_safe
+async def by_category_async_view(request):
+    """
+    TransactionViewSet.by_category for ASGI deployments: the income and
+    expense breakdowns are queried concurrently
+    """
+    view = TransactionViewSet(action_map={'get': 'by_category'})
+    request, querysets, response = await sync_to_async(_begin_async)(
+        view, request, prepare=lambda: view._by_category_querysets()
+    )
+    
+    if response is None:
+        income_by_cat, expense_by_cat = querysets
+        
+        async def compute():
+            income, expenses = await run_concurrently(
+                partial(archive.merge_totals, income_by_cat, 'category__name'),
+                partial(archive.merge_totals, expense_by_cat, 'category__name')
+            )
+            return {
+                'income_by_category': income,
+                'expenses_by_category': expenses
+            }
+        
+        data = await aget_or_set(
+            'transaction_by_category',
+            request.user.id,
+            normalize_params(request.query_params, TRANSACTION_FILTERS),
+            compute,
+            version=request.data_version
+        )
+        response = Response(data)
+    
+    return await sync_to_async(_finish_async)(view, request, response)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_get
 def user_profile_view(request):
     """Get current user profile"""
     serializer = UserSerializer(request.user)
-    return Response(serializer.data)
\ No newline at end of file
+    return Response(serializer.data)
+
+
+@api_view(['GET', 'PUT'])
+@permission_classes([IsAuthenticated])
+def currency_view(request):
+    """
+    Get or set (PUT {"base_currency": "EUR"}) the currency totals and
+    budgets are reported in, with the currencies that have rates
+    """
+    if request.method == 'PUT':
+        profile = Profile.objects.filter(user=request.user).first() or Profile(user=request.user)
+        serializer = ProfileSerializer(profile, data=request.data, context={'request': request})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        base_currency = serializer.save().base_currency
+    else:
+        base_currency = fx.base_currency_of(request.user)
+    
+    return Response({
+        'base_currency': base_currency,
+        'currencies': fx.known_currencies()
+    })
+
+
+@api_view(['GET'])
+@authentication_classes([MetricsTokenAuthentication, *api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+@permission_classes([IsMetricsScraper])
+def metrics_view(request):
+    """Request metrics of this process in the Prometheus text format"""
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')